@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Async Supabase client for pipelined writes
+Talks to PostgREST directly with httpx, keeps a bounded number of batch
+inserts in flight and sizes batches from observed latency and payload size,
+so multi-month ingestion is limited by bandwidth rather than round trips
+"""
+
+import asyncio
+import functools
+import json
+import os
+import time
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from supabase_client import SupabaseClient, record_to_row
+
+# Concurrent batch requests per client
+DEFAULT_MAX_IN_FLIGHT = 4
+
+# Attempts per request (see _request for what is retried)
+MAX_RETRIES = 3
+
+
+class BatchSizer:
+    """
+    Picks the number of rows per insert from how the last batches went
+
+    Grows the batch while requests finish well under the target latency,
+    halves it when they run over, and never lets a batch's JSON body get
+    larger than max_bytes.
+    """
+
+    def __init__(
+        self,
+        initial: int = 1000,
+        minimum: int = 100,
+        maximum: int = 10000,
+        target_seconds: float = 1.0,
+        max_bytes: int = 4 * 1024 * 1024
+    ):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.bytes_per_row: Optional[float] = None
+
+    def next_size(self) -> int:
+        """Rows to put in the next batch"""
+        size = self.size
+        if self.bytes_per_row:
+            size = min(size, int(self.max_bytes / self.bytes_per_row))
+        return max(size, self.minimum)
+
+    def observe(self, rows: int, payload_bytes: int, seconds: float) -> None:
+        """Record how long a batch of `rows` rows and `payload_bytes` bytes took"""
+        if rows <= 0:
+            return
+        row_bytes = payload_bytes / rows
+        # Smooth the row size so one odd batch doesn't swing the limit
+        self.bytes_per_row = row_bytes if self.bytes_per_row is None else 0.8 * self.bytes_per_row + 0.2 * row_bytes
+
+        if seconds > self.target_seconds:
+            self.size = max(self.minimum, self.size // 2)
+        elif seconds < self.target_seconds / 2 and rows >= self.size:
+            self.size = min(self.maximum, int(self.size * 1.5))
+
+
+class PostgrestError(Exception):
+    """Error response from PostgREST"""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"PostgREST error {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class AsyncSupabaseClient:
+    """
+    Async counterpart of SupabaseClient for the ingest pipeline
+
+    Writes and the reads used by the ingest pipeline go straight to
+    PostgREST over one pooled httpx connection set. A few more reads run
+    a synchronous SupabaseClient (sync_db) in a worker thread; only the
+    coroutines defined here are available. Use as an async context manager:
+
+        async with AsyncSupabaseClient() as db:
+            snapshot_id = await db.save_snapshot(records, month)
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, batch_sizer: Optional[BatchSizer] = None):
+        """
+        Read credentials from environment variables
+
+        Args:
+            max_in_flight: Batch requests allowed in flight at once
+            batch_sizer: Batch size controller (default: BatchSizer())
+        """
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        supabase_url = os.getenv('SUPABASE_URL')
+        supabase_key = os.getenv('SUPABASE_SECRET_KEY')  # Use secret key for backend operations
+
+        if not supabase_url or not supabase_key:
+            raise ValueError(
+                "Missing Supabase credentials. Please set SUPABASE_URL and SUPABASE_SECRET_KEY in .env file"
+            )
+
+        self.rest_url = supabase_url.rstrip('/') + '/rest/v1'
+        self.api_key = supabase_key
+        self.max_in_flight = max_in_flight
+        self.sizer = batch_sizer or BatchSizer()
+        self._http = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._sync_db: Optional[SupabaseClient] = None
+
+    @property
+    def sync_db(self) -> SupabaseClient:
+        """Synchronous client behind the threaded fallbacks, created on first use"""
+        if self._sync_db is None:
+            self._sync_db = SupabaseClient()
+        return self._sync_db
+
+    async def __aenter__(self):
+        import httpx
+
+        self._http = httpx.AsyncClient(
+            base_url=self.rest_url,
+            headers={
+                'apikey': self.api_key,
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json',
+            },
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(max_connections=self.max_in_flight + 2),
+        )
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict] = None,
+        content: Optional[bytes] = None,
+        headers: Optional[Dict] = None,
+        idempotent: Optional[bool] = None
+    ):
+        """
+        Send one request, retrying failures with backoff
+
+        Idempotent requests are retried on any transport error, 429 and 5xx.
+        A plain POST insert may have been committed when a timeout or 5xx
+        comes back, and sending it again would duplicate its rows, so it is
+        only retried when the server cannot have run it: connection
+        failures, 429 and the PGRST205 schema cache error.
+
+        Args:
+            idempotent: Whether the request can safely be sent twice
+                (default: every method but POST)
+        """
+        import httpx
+
+        if self._http is None:
+            raise RuntimeError("AsyncSupabaseClient must be used inside 'async with'")
+        if idempotent is None:
+            idempotent = method != 'POST'
+
+        for attempt in range(MAX_RETRIES):
+            try:
+                response = await self._http.request(method, path, params=params, content=content, headers=headers)
+            except httpx.TransportError as e:
+                # Never sent: no connection, or none free in the pool
+                unsent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+                if not (idempotent or unsent) or attempt == MAX_RETRIES - 1:
+                    raise
+            else:
+                if response.status_code < 400:
+                    return response
+                body = response.text
+                retryable = (
+                    response.status_code == 429
+                    or (idempotent and response.status_code >= 500)
+                    # Same schema cache hiccup SupabaseClient.save_snapshot retries
+                    or 'PGRST205' in body
+                )
+                if not retryable or attempt == MAX_RETRIES - 1:
+                    raise PostgrestError(response.status_code, body)
+            await asyncio.sleep((attempt + 1) * 2)  # 2, 4 seconds
+
+    async def _send_batch(self, table: str, rows: List[Dict], params: Optional[Dict], prefer: str) -> None:
+        """POST one batch and feed its timing to the batch sizer"""
+        payload = json.dumps(rows, ensure_ascii=False, default=str).encode('utf-8')
+        started = time.monotonic()
+        # Upserts and ignore-duplicates inserts can be resent; plain inserts cannot
+        idempotent = 'resolution=' in prefer
+        await self._request(
+            'POST', f'/{table}', params=params, content=payload,
+            headers={'Prefer': prefer}, idempotent=idempotent
+        )
+        self.sizer.observe(len(rows), len(payload), time.monotonic() - started)
+
+    async def _insert_pipelined(
+        self,
+        table: str,
+        items: List,
+        to_row: Optional[Callable[[object], Dict]] = None,
+        params: Optional[Dict] = None,
+        prefer: str = 'return=minimal'
+    ) -> None:
+        """
+        Insert rows in adaptively sized batches with bounded concurrency
+
+        Rows are built per batch right before it is sent, so at most
+        max_in_flight batches of row dictionaries exist at a time.
+
+        Args:
+            table: Table name
+            items: Rows, or objects turned into rows by to_row
+            to_row: Optional converter applied to each item
+            params: Extra query parameters (e.g. on_conflict)
+            prefer: PostgREST Prefer header
+        """
+        tasks = []
+        i = 0
+        try:
+            while i < len(items):
+                # Waiting here is the back-pressure: the next batch is only
+                # built once a slot is free
+                await self._slots.acquire()
+                size = self.sizer.next_size()
+                chunk = items[i:i + size]
+                i += size
+                rows = [to_row(item) for item in chunk] if to_row else list(chunk)
+                task = asyncio.create_task(self._send_batch(table, rows, params, prefer))
+                # Frees the slot however the task ends, even if cancelled before it started
+                task.add_done_callback(lambda _: self._slots.release())
+                tasks.append(task)
+                # Surface a failed batch instead of sending the rest
+                for task in tasks:
+                    if task.done() and not task.cancelled() and task.exception():
+                        raise task.exception()
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _select(self, path: str, params: Dict) -> List[Dict]:
+        response = await self._request('GET', path, params=params)
+        return response.json()
+
+    async def _fetch_pages(self, path: str, params: Dict, page_size: int = 1000) -> AsyncIterator[Dict]:
+        """Async version of SupabaseClient._fetch_all using limit/offset"""
+        offset = 0
+        while True:
+            rows = await self._select(path, dict(params, limit=page_size, offset=offset))
+            for row in rows:
+                yield row
+            if len(rows) < page_size:
+                break
+            offset += page_size
+
+    async def save_snapshot(self, records: List[Dict], month: str) -> str:
+        """
+        Save a new snapshot and all its records to the database
+
+        Args:
+            records: List of records (VisaRecord or dictionaries)
+            month: Month in YYYY-MM format
+
+        Returns:
+            snapshot_id: UUID of the created snapshot
+        """
+        snapshot_data = {
+            'month': month,
+            'total_records': len(records),
+            'scrape_date': datetime.utcnow().isoformat()
+        }
+        response = await self._request(
+            'POST', '/snapshots',
+            content=json.dumps(snapshot_data).encode('utf-8'),
+            headers={'Prefer': 'return=representation'}
+        )
+        snapshot_id = response.json()[0]['id']
+
+        await self._insert_pipelined(
+            'records', records,
+            to_row=lambda record: record_to_row(record, snapshot_id, month)
+        )
+        return snapshot_id
+
+    async def save_changes(self, changes: List[Dict]) -> None:
+        """Save detected changes to the database (see SupabaseClient.save_changes)"""
+        if changes:
+            await self._insert_pipelined('changes', changes)
+
+    async def save_case_events(self, events: List[Dict]) -> None:
+        """Append case timeline events, ignoring ones that already exist"""
+        if events:
+            await self._insert_pipelined(
+                'case_events', events,
+                params={'on_conflict': 'casenum,event_type,event_at,status'},
+                prefer='resolution=ignore-duplicates,return=minimal'
+            )
+
+    async def save_case_notes(self, rows: List[Dict]) -> None:
+        """Insert or update rows of the note search index"""
+        if rows:
+            await self._insert_pipelined(
+                'case_notes', rows,
+                params={'on_conflict': 'casenum'},
+                prefer='resolution=merge-duplicates,return=minimal'
+            )
+
+    async def update_case_index(self, snapshot_id: str) -> int:
+        """Fold a saved snapshot into the cross-month case index"""
+        response = await self._request(
+            'POST', '/rpc/update_case_index',
+            content=json.dumps({'p_snapshot_id': snapshot_id}).encode('utf-8'),
+            idempotent=True
+        )
+        return response.json() or 0
+
+    async def save_waiting_sketches(self, month: str, snapshot_id: str, sketches: Dict) -> None:
+        """Replace the waiting-day sketches of a month"""
+        rows = [
+            {
+                'month': month,
+                'consulate': consulate,
+                'visa_type': visa_type,
+                'snapshot_id': snapshot_id,
+                'count': sketch.count,
+                'sketch': sketch.to_dict()
+            }
+            for (consulate, visa_type), sketch in sketches.items()
+        ]
+
+        await self._request('DELETE', '/waiting_sketches', params={'month': f'eq.{month}'})
+        if rows:
+            await self._insert_pipelined('waiting_sketches', rows)
+
+    async def get_latest_snapshot(self, month: Optional[str] = None) -> Optional[Dict]:
+        """Get the most recent snapshot for a given month (or overall if month is None)"""
+        params = {'select': '*', 'order': 'scrape_date.desc', 'limit': 1}
+        if month:
+            params['month'] = f'eq.{month}'
+        rows = await self._select('/snapshots', params)
+        return rows[0] if rows else None
+
+    async def get_records_by_snapshot(self, snapshot_id: str, month: Optional[str] = None) -> List[Dict]:
+        """Get all records for a specific snapshot (from its month's partition when month is given)"""
+        params = {'select': '*', 'snapshot_id': f'eq.{snapshot_id}', 'order': 'id'}
+        if month:
+            params['month'] = f'eq.{month}'
+        return [row async for row in self._fetch_pages('/records', params)]
+
+    async def iter_latest_records(self, columns: Optional[List[str]] = None, page_size: int = 1000) -> AsyncIterator[Dict]:
+        """Iterate over the records of the latest snapshot of every month"""
+        select = ','.join(columns) if columns else '*'
+        snapshots = await self._select('/latest_snapshot_per_month', {'select': 'id,month'})
+
+        for snapshot in snapshots:
+            params = {
+                'select': select,
+                'snapshot_id': f"eq.{snapshot['id']}",
+                'month': f"eq.{snapshot['month']}",
+                'order': 'id',
+            }
+            async for row in self._fetch_pages('/records', params, page_size):
+                yield row
+
+    async def refresh_monthly_rollup(self, months: Optional[List[str]] = None) -> int:
+        """Recompute monthly_rollup for the given months (all months if None)"""
+        response = await self._request(
+            'POST', '/rpc/refresh_monthly_rollup',
+            content=json.dumps({'p_months': months}).encode('utf-8'),
+            idempotent=True
+        )
+        return response.json() or 0
+
+    async def get_month_refresh_stats(self, window_days: int = 30) -> List[Dict]:
+        """Per-month signals for the adaptive refresh scheduler"""
+        response = await self._request(
+            'POST', '/rpc/month_refresh_stats',
+            content=json.dumps({'p_window_days': window_days}).encode('utf-8'),
+            idempotent=True
+        )
+        return response.json() or []
+
+
+def _threaded(name: str):
+    """Async wrapper running a SupabaseClient method in a worker thread"""
+    sync_method = getattr(SupabaseClient, name)
+
+    @functools.wraps(sync_method)
+    async def method(self, *args, **kwargs):
+        # A plain SupabaseClient, so its internal calls stay synchronous
+        return await asyncio.to_thread(getattr(self.sync_db, name), *args, **kwargs)
+
+    return method
+
+
+# Calls not on the ingest path keep their PostgREST query logic in one place
+for _name in (
+    'get_records_by_casenum',
+    'get_records_as_of',
+    'get_changes',
+    'get_changes_page',
+    'get_changes_after',
+    'get_change_offset',
+    'commit_change_offset',
+    'get_removed_casenums',
+    'get_case_index',
+    'get_case_events',
+    'get_monthly_rollup',
+    'get_waiting_sketches',
+    'get_statistics',
+    'search_notes',
+):
+    setattr(AsyncSupabaseClient, _name, _threaded(_name))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: structured details parser vs get_text on every element
+Parses sample personal_detail.php pages (generated by mock_checkee.py,
+optionally wrapped in extra layout tables and with extra experience
+paragraphs) with parse_details_html and with the BeautifulSoup walk
+parse_details_page used before it, and reports pages/s and how much of the
+old output was repeated text
+"""
+
+import argparse
+import time
+
+from details_parser import parse_details_html
+from mock_checkee import MockCheckee, NOTES
+
+
+def legacy_details_text(html):
+    """The previous parse_details_page: get_text() on every table, div, p and td"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    notes = []
+    for element in soup.find_all(['table', 'div', 'p', 'td']):
+        text = element.get_text(strip=True)
+        if text and len(text) > 30 and not any(skip in text.lower() for skip in ['home', 'add your case', 'tracker', 'update', 'id', 'visa type']):
+            notes.append(text)
+    note_sections = soup.find_all(['div', 'td'], class_=lambda x: x and ('note' in x.lower() or 'comment' in x.lower() or 'experience' in x.lower()))
+    for section in note_sections:
+        text = section.get_text(strip=True)
+        if text:
+            notes.append(text)
+    return ' | '.join(notes[:5])
+
+
+def sample_pages(count, depth=0, experiences=1, seed=0):
+    """Details pages of the mock site, each wrapped in `depth` extra layout tables"""
+    site = MockCheckee(months=1, rows=count, latest_month='2025-06', seed=seed)
+    pages = []
+    for i, record in enumerate(site.month_records(site.latest_month)):
+        page = site.details_page(record['casenum'])
+        extra = ''.join(f'<p>{NOTES[(i + j) % len(NOTES)]}</p>' for j in range(experiences - 1))
+        page = page.replace('</div>', extra + '</div>', 1)
+        head, body = page.split('<body>', 1)
+        page = head + '<body>' + '<table><tr><td>' * depth + body.replace('</body>', '</td></tr></table>' * depth + '</body>')
+        pages.append(page)
+    return pages
+
+
+def timed(label, function, pages):
+    started = time.perf_counter()
+    results = [function(page) for page in pages]
+    elapsed = time.perf_counter() - started
+    size = sum(len(page) for page in pages)
+    print(f"  {label:<22} {elapsed:7.3f}s ({len(pages) / elapsed:9,.0f} pages/s, {size / elapsed / 1e6:6.1f} MB/s)")
+    return elapsed, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time details page parsing')
+    parser.add_argument('--pages', type=int, default=2000, help='Number of sample pages (default: 2000)')
+    parser.add_argument('--depth', type=int, default=4,
+                        help='Extra layout tables around each page (default: 4)')
+    parser.add_argument('--experiences', type=int, default=3,
+                        help='Experience paragraphs per page (default: 3)')
+    args = parser.parse_args()
+
+    pages = sample_pages(args.pages, args.depth, args.experiences)
+    print(f"Pages: {args.pages} ({sum(len(page) for page in pages) / args.pages / 1024:.1f} KB each, "
+          f"{args.depth} extra layout tables, {args.experiences} experiences)")
+    legacy, legacy_texts = timed('get_text per element:', legacy_details_text, pages)
+    structured, details = timed('parse_details_html:', parse_details_html, pages)
+    print(f"  speedup:               {legacy / structured:7.1f}x")
+
+    # Share of the old output that repeated text already in the same string
+    repeated = total = 0
+    for text in legacy_texts:
+        parts = text.split(' | ') if text else []
+        total += len(parts)
+        repeated += len(parts) - len(set(parts))
+    notes = sum(len(case.notes) for case in details)
+    print(f"  old output:            {total} texts, {100 * repeated / max(total, 1):.1f}% exact repeats "
+          f"(plus blobs that contain other texts)")
+    print(f"  structured output:     {notes} distinct notes, "
+          f"{sum(1 for case in details if case.status)} of {len(details)} pages with typed metadata")
+
+
+if __name__ == '__main__':
+    main()
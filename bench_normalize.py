@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: typed normalization vs per-field re-parsing
+Times normalize_record over synthetic scraper rows against the work the
+pipeline did before it (strptime per date field, int() and a casenum regex
+per row), and reports the date memo cache hit rate
+"""
+
+import argparse
+import re
+import time
+from datetime import datetime
+
+from bench_records import synthetic_rows
+from normalize import _parse_date_text, normalize_record
+from visa_record import VisaRecord
+
+
+def legacy_parse(record):
+    """Per-row parsing as SupabaseClient and ChangeDetector used to repeat it"""
+    values = {}
+    for name in ('check_date', 'complete_date'):
+        value = record.get(name)
+        if not value or value == '0000-00-00':
+            values[name] = None
+            continue
+        try:
+            values[name] = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            values[name] = None
+    try:
+        values['waiting_days'] = int(record.get('waiting_days'))
+    except (ValueError, TypeError):
+        values['waiting_days'] = None
+    match = re.search(r'casenum=(\d+)', record.get('details_link') or '')
+    values['casenum'] = match.group(1) if match else ''
+    return values
+
+
+def timed(label, function, records):
+    started = time.perf_counter()
+    for record in records:
+        function(record)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<22} {elapsed:7.3f}s ({len(records) / elapsed:12,.0f} rows/s)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time typed record normalization')
+    parser.add_argument('--rows', type=int, default=200000, help='Number of synthetic rows (default: 200000)')
+    args = parser.parse_args()
+
+    rows = list(synthetic_rows(args.rows))
+    legacy_records = [VisaRecord(**row) for row in rows]
+    typed_records = [VisaRecord(**row) for row in rows]
+
+    print(f"Rows: {args.rows}")
+    legacy = timed('strptime/int/regex:', legacy_parse, legacy_records)
+    _parse_date_text.cache_clear()
+    typed = timed('normalize_record:', normalize_record, typed_records)
+    print(f"  speedup:               {legacy / typed:7.1f}x")
+
+    info = _parse_date_text.cache_info()
+    print(f"  date cache:            {info.currsize} distinct strings, "
+          f"{100 * info.hits / max(info.hits + info.misses, 1):.1f}% hits")
+
+
+if __name__ == '__main__':
+    main()
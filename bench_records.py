@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: plain dict records vs compact VisaRecord
+Builds synthetic rows shaped like parse_monthly_page output and measures the
+heap they occupy with tracemalloc
+"""
+
+import argparse
+import gc
+import random
+import tracemalloc
+
+from visa_record import VisaRecord
+
+VISA_TYPES = ['H1', 'F1', 'B1', 'J1', 'L1', 'O1']
+ENTRIES = ['New', 'Renewal']
+CONSULATES = ['BeiJing', 'ShangHai', 'GuangZhou', 'ShenYang', 'Vancouver', 'Toronto', 'Ottawa']
+MAJORS = ['Computer Science', 'Electrical Engineering', 'Physics', 'Biology', 'Chemistry', 'Mathematics']
+STATUSES = ['Clear', 'Pending', 'Reject']
+
+
+def fresh(text):
+    """Return an equal but distinct string object, like get_text() produces per cell"""
+    return ''.join(list(text))
+
+
+def synthetic_rows(count, seed=0):
+    """Yield scraper-style field values with realistic repetition"""
+    rng = random.Random(seed)
+    for i in range(count):
+        day = 1 + rng.randrange(28)
+        status = rng.choice(STATUSES)
+        yield {
+            'month': fresh('2025-06'),
+            'id': fresh(f'user{rng.randrange(100000)}'),
+            'visa_type': fresh(rng.choice(VISA_TYPES)),
+            'visa_entry': fresh(rng.choice(ENTRIES)),
+            'consulate': fresh(rng.choice(CONSULATES)),
+            'major': fresh(rng.choice(MAJORS)),
+            'status': fresh(status),
+            'check_date': fresh(f'2025-06-{day:02d}'),
+            'complete_date': fresh('0000-00-00' if status == 'Pending' else f'2025-07-{day:02d}'),
+            'waiting_days': fresh(str(rng.randrange(200))),
+            'details_link': fresh(f'https://www.checkee.info/personal_detail.php?casenum={900000 + i}'),
+            'has_notes': rng.random() < 0.2,
+        }
+
+
+def measure(build):
+    """Return (bytes, result) for the objects allocated by build()"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare memory of dict records vs VisaRecord')
+    parser.add_argument('--rows', type=int, default=200000, help='Number of synthetic rows (default: 200000)')
+    args = parser.parse_args()
+
+    dict_bytes, dict_rows = measure(lambda: list(synthetic_rows(args.rows)))
+    del dict_rows
+    record_bytes, records = measure(lambda: [VisaRecord(**row) for row in synthetic_rows(args.rows)])
+    del records
+
+    print(f"Rows: {args.rows}")
+    print(f"  dict records:  {dict_bytes / 1e6:8.1f} MB ({dict_bytes / args.rows:6.0f} B/row)")
+    print(f"  VisaRecord:    {record_bytes / 1e6:8.1f} MB ({record_bytes / args.rows:6.0f} B/row)")
+    print(f"  reduction:     {100 * (1 - record_bytes / dict_bytes):8.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the command-line entry points
+Runs each entry point's --help in a fresh interpreter, reports wall time and
+the slowest imports from -X importtime, and checks them against a target
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (label, interpreter arguments); scrape_month.py has no --help and goes
+# straight to the network, so its imports are measured directly
+ENTRY_POINTS = [
+    ('update_and_detect.py --help', ['update_and_detect.py', '--help']),
+    ('run_scraper.py --help', ['run_scraper.py', '--help']),
+    ('import scraper, supabase_client, change_detector', ['-c', 'import scraper, supabase_client, change_detector']),
+]
+
+# Time to first useful work (argument parsing done) we aim for
+TARGET_MS = 100.0
+
+# Modules that must not be imported just to start up
+HEAVY_MODULES = ('requests', 'bs4', 'supabase', 'dotenv', 'pandas', 'httpx')
+
+
+def time_startup(argv, runs):
+    """Median wall time in ms of `python *argv` over several runs"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable] + argv,
+            cwd=HERE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def import_profile(argv):
+    """
+    Parse -X importtime output of one run
+
+    Returns:
+        List of (cumulative_us, module) tuples; nested modules are indented
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + argv,
+        cwd=HERE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports keep their indentation so callers can tell levels apart
+        imports.append((int(cumulative_us), name[1:].rstrip()))
+    return imports
+
+
+def heavy_imports(imports):
+    """
+    HEAVY_MODULES found in an import profile, at any nesting level
+
+    Args:
+        imports: import_profile() output
+
+    Returns:
+        Sorted names of the heavy packages that were imported
+    """
+    loaded = {name.strip().split('.')[0] for _, name in imports}
+    return sorted(m for m in HEAVY_MODULES if m in loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure startup time of the CLI entry points')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per entry point (default: 5)')
+    parser.add_argument('--top', type=int, default=5, help='Slowest imports to show per entry point (default: 5)')
+    parser.add_argument('--target-ms', type=float, default=TARGET_MS,
+                        help=f'Startup target in ms (default: {TARGET_MS:.0f})')
+
+    args = parser.parse_args()
+
+    baseline = time_startup(['-c', 'pass'], args.runs)
+    print(f"Bare interpreter: {baseline:.1f} ms\n")
+
+    failed = False
+    for label, argv in ENTRY_POINTS:
+        wall = time_startup(argv, args.runs)
+        imports = import_profile(argv)
+        heavy = heavy_imports(imports)
+        ok = wall <= args.target_ms and not heavy
+        failed = failed or not ok
+
+        print(f"{'✓' if ok else '✗'} {label}: {wall:.1f} ms")
+        top_level = [(us, name) for us, name in imports if not name.startswith(' ')]
+        for us, name in sorted(top_level, reverse=True)[:args.top]:
+            print(f"    {us / 1000:6.1f} ms  {name}")
+        if heavy:
+            print(f"    heavy modules imported at startup: {', '.join(heavy)}")
+
+    print(f"\nTarget: {args.target_ms:.0f} ms per entry point, no {', '.join(HEAVY_MODULES)} at startup")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
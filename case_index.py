@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Cross-month case identity
+A case's month is the check-date listing it appears under, so the same
+casenum can move from one month page to another between scrapes. Months
+are diffed one at a time, which turns a move into a new record in the
+month it joined and a removal from the month it left.
+
+CaseIndex resolves those pairs with the case_index table (migration 013:
+casenum -> current month, first/last seen, status), which ingestion keeps
+up to date after every saved snapshot. Only the cases a diff reports as
+new or removed are looked up, each key fetched once and then held in
+memory, so classifying a move is a dict lookup and no other month's
+snapshot is read.
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from visa_record import case_key
+
+# Whole-case changes whose key may belong to a case listed under another month
+ARRIVAL_TYPES = frozenset({'new_record', 'reappeared'})
+
+# Change type of a case that now appears under another month page
+MOVED = 'case_moved'
+
+# Keys per lookup request (they end up in the URL of an in.() filter)
+LOOKUP_BATCH = 200
+
+
+class CaseIndex:
+    """In-memory view of case_index for one detector"""
+
+    def __init__(self, db_client=None, keep_entries: bool = False):
+        """
+        Args:
+            db_client: SupabaseClient to read case_index from (None: only
+                what this process scraped and saved is known)
+            keep_entries: Keep entries between runs; only right when this
+                process is the only writer (daemon mode), since other
+                workers' snapshots would make them stale
+        """
+        self.db = db_client
+        self.keep_entries = keep_entries
+        # casenum -> {'month', 'status', 'first_seen', 'last_seen'}, or None
+        # when the index has no row for it
+        self._entries: Dict[str, Optional[Dict]] = {}
+        # This run's month pages: casenum -> month listing it (a tuple of
+        # months for the rare case listed on several), and the months scraped
+        self._listed: Dict[str, object] = {}
+        self._run_months: Set[str] = set()
+
+    def begin_run(self, pages: Iterable[Tuple[str, List[Dict]]]) -> None:
+        """
+        Note where every case of this run's month pages is listed
+
+        With all pages known before detection, a case that left a month for
+        another page scraped in the same run is not reported as removed,
+        whichever of the two months is diffed first.
+
+        Args:
+            pages: (month, records) of every month scraped in this run
+        """
+        if not self.keep_entries:
+            self._entries = {}
+        self._listed = {}
+        self._run_months = set()
+        for month, records in pages:
+            self._run_months.add(month)
+            for record in records:
+                key = case_key(record)
+                if not key:
+                    continue
+                listed = self._listed.get(key)
+                if listed is None:
+                    self._listed[key] = month
+                elif listed != month and month not in _as_tuple(listed):
+                    self._listed[key] = _as_tuple(listed) + (month,)
+
+    def lookup(self, casenum: str) -> Optional[Dict]:
+        """Index entry of a case (None if it was never indexed); fetched once per key"""
+        if casenum not in self._entries:
+            self.prefetch([casenum])
+        return self._entries.get(casenum)
+
+    def prefetch(self, casenums: Iterable[str]) -> None:
+        """Read the entries of the given keys that are not held in memory yet"""
+        missing = [key for key in dict.fromkeys(casenums) if key not in self._entries]
+        if not missing:
+            return
+        found = {}
+        if self.db is not None:
+            for i in range(0, len(missing), LOOKUP_BATCH):
+                found.update(self.db.get_case_index(missing[i:i + LOOKUP_BATCH]))
+        for key in missing:
+            self._entries[key] = found.get(key)
+
+    def record(self, month: str, records: List[Dict], seen_at: str) -> None:
+        """
+        Apply a saved snapshot to the entries held in memory (what
+        update_case_index does to the table)
+
+        Args:
+            month: Month the snapshot was saved for
+            records: The saved records
+            seen_at: ISO timestamp of the scrape
+        """
+        for record in records:
+            key = case_key(record)
+            if not key:
+                continue
+            entry = self._entries.get(key)
+            self._entries[key] = {
+                'month': month,
+                'status': record.get('status') or '',
+                'first_seen': entry['first_seen'] if entry else seen_at,
+                'last_seen': seen_at,
+            }
+
+    def resolve_moves(self, changes: List[Dict], month: str) -> List[Dict]:
+        """
+        Reclassify the whole-case changes of one month's diff that are moves
+
+        - A new or reappeared case the index places under another month
+          becomes a case_moved change (old_value: that month, new_value:
+          this one), unless this run also finds it still listed there.
+        - A removed case is dropped when it is listed under another month
+          in this run, or the index already moved it to a month not scraped
+          in this run: the move is (or was) recorded in the month it joined.
+
+        Args:
+            changes: Changes of one month, in diff order
+            month: Month in YYYY-MM format
+
+        Returns:
+            The changes, with moves reclassified and moved-out cases removed
+        """
+        keys = [
+            change['casenum'] for change in changes
+            if change['change_type'] in ARRIVAL_TYPES or change['change_type'] == 'removed'
+        ]
+        if not keys:
+            return changes
+        self.prefetch(keys)
+
+        resolved = []
+        for change in changes:
+            change_type = change['change_type']
+            if change_type in ARRIVAL_TYPES:
+                previous = self._moved_from(change['casenum'], month)
+                if previous:
+                    change = dict(
+                        change,
+                        change_type=MOVED,
+                        field_name='month',
+                        old_value=previous,
+                        new_value=month
+                    )
+            elif change_type == 'removed' and self._moved_to(change['casenum'], month):
+                continue
+            resolved.append(change)
+        return resolved
+
+    def _moved_from(self, casenum: str, month: str) -> Optional[str]:
+        """The month a case arriving in `month` was listed under before, if it moved"""
+        entry = self._entries.get(casenum)
+        if entry is None or entry['month'] == month:
+            return None
+        previous = entry['month']
+        if previous in self._run_months and previous in _as_tuple(self._listed.get(casenum)):
+            # Listed on both pages: a duplicate listing, not a move
+            return None
+        return previous
+
+    def _moved_to(self, casenum: str, month: str) -> bool:
+        """Whether a case missing from `month` is listed under another month now"""
+        listed = self._listed.get(casenum)
+        if listed is not None:
+            return any(other != month for other in _as_tuple(listed))
+        entry = self._entries.get(casenum)
+        return (
+            entry is not None
+            and entry['month'] != month
+            and entry['month'] not in self._run_months
+        )
+
+    def __len__(self) -> int:
+        """Number of keys held in memory"""
+        return len(self._entries)
+
+
+def _as_tuple(listed) -> Tuple[str, ...]:
+    if listed is None:
+        return ()
+    return listed if isinstance(listed, tuple) else (listed,)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Per-case timeline
+Builds compact case_events (status transitions only) from detected changes
+and summarizes how long a case spent in each status
+"""
+
+from typing import List, Dict, Optional
+from datetime import datetime, timezone
+from normalize import parse_date
+from visa_record import case_key
+
+# Statuses after which a case no longer accumulates time
+TERMINAL_STATUSES = {'Clear', 'Reject'}
+
+
+def build_case_events(
+    changes: List[Dict],
+    records: List[Dict],
+    month: str,
+    snapshot_id: str,
+    detected_at: Optional[str] = None
+) -> List[Dict]:
+    """
+    Build case_events rows for the changes detected in one snapshot
+
+    Only new_record and status_change produce events; everything else
+    (waiting days ticking up, notes) is not a state transition.
+
+    Args:
+        changes: Changes returned by ChangeDetector.detect_changes
+        records: Scraped records of the same snapshot
+        month: Month in YYYY-MM format
+        snapshot_id: UUID of the snapshot the changes belong to
+        detected_at: ISO timestamp of the scrape (default: now)
+
+    Returns:
+        List of case event dictionaries ready to be saved
+    """
+    if detected_at is None:
+        detected_at = datetime.now(timezone.utc).isoformat()
+
+    records_by_casenum = {}
+    for record in records:
+        casenum = case_key(record)
+        if casenum:
+            records_by_casenum[casenum] = record
+
+    events = []
+    for change in changes:
+        change_type = change.get('change_type')
+        casenum = change.get('casenum')
+        record = records_by_casenum.get(casenum)
+
+        if change_type == 'new_record' and record is not None:
+            events.extend(_first_seen_events(casenum, record, month, snapshot_id, detected_at))
+        elif change_type == 'status_change':
+            status = change.get('new_value') or ''
+            event_at = detected_at
+            if status in TERMINAL_STATUSES and record is not None:
+                event_at = _date_to_timestamp(record.get('complete_date')) or detected_at
+            events.append(_event(casenum, month, 'status_change', status, event_at, snapshot_id))
+
+    return events
+
+
+def status_durations(events: List[Dict], now: Optional[datetime] = None) -> Dict[str, float]:
+    """
+    Compute how many days a case spent in each status
+
+    The last status keeps accumulating until now unless it is terminal
+    (Clear/Reject).
+
+    Args:
+        events: case_events rows of one case (any order)
+        now: Reference time for the open-ended last status (default: now)
+
+    Returns:
+        Dictionary mapping status to days spent in it
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+
+    ordered = sorted(events, key=lambda e: _to_datetime(e['event_at']))
+    durations: Dict[str, float] = {}
+
+    for i, event in enumerate(ordered):
+        status = event.get('status') or 'Unknown'
+        start = _to_datetime(event['event_at'])
+        if i + 1 < len(ordered):
+            end = _to_datetime(ordered[i + 1]['event_at'])
+        elif status in TERMINAL_STATUSES:
+            durations.setdefault(status, 0.0)
+            continue
+        else:
+            end = now
+        days = max((end - start).total_seconds(), 0) / 86400
+        durations[status] = durations.get(status, 0.0) + days
+
+    return durations
+
+
+def _first_seen_events(
+    casenum: str,
+    record: Dict,
+    month: str,
+    snapshot_id: str,
+    detected_at: str
+) -> List[Dict]:
+    """Events for a case seen for the first time (mirrors the 004 backfill)"""
+    status = record.get('status') or ''
+    check_at = _date_to_timestamp(record.get('check_date'))
+    complete_at = _date_to_timestamp(record.get('complete_date'))
+
+    if status in TERMINAL_STATUSES and check_at and complete_at:
+        return [
+            _event(casenum, month, 'first_seen', 'Pending', check_at, snapshot_id),
+            _event(casenum, month, 'status_change', status, complete_at, snapshot_id),
+        ]
+    return [_event(casenum, month, 'first_seen', status, check_at or detected_at, snapshot_id)]
+
+
+def _event(casenum: str, month: str, event_type: str, status: str, event_at: str, snapshot_id: str) -> Dict:
+    return {
+        'casenum': casenum,
+        'month': month,
+        'event_type': event_type,
+        'status': status,
+        'event_at': event_at,
+        'snapshot_id': snapshot_id
+    }
+
+
+def _date_to_timestamp(value) -> Optional[str]:
+    """Turn a YYYY-MM-DD date into a UTC midnight ISO timestamp (None if invalid)"""
+    day = parse_date(value)
+    if day is None:
+        return None
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).isoformat()
+
+
+def _to_datetime(value) -> datetime:
+    """Parse an ISO timestamp as returned by PostgREST into an aware datetime"""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
@@ -4,93 +4,197 @@ Change detection module
 Compares new scraped data with previous snapshots to detect changes
 """
 
-import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set, Tuple
 from datetime import datetime
 from supabase_client import SupabaseClient
+from case_index import CaseIndex
+from case_timeline import status_durations
+from normalize import normalize_row
+from visa_record import VisaRecord, as_record, case_key, extract_casenum
+
+# Value prefix of whole-case changes (e.g. "New record: user123")
+CASE_CHANGE_LABELS = {
+    'new_record': 'New record',
+    'reappeared': 'Reappeared record',
+    'removed': 'Removed record',
+}
 
 
 class ChangeDetector:
-    def __init__(self, supabase_client: SupabaseClient):
+    def __init__(self, supabase_client: SupabaseClient, cache_baselines: bool = False):
         """
         Initialize change detector with Supabase client
         
         Args:
             supabase_client: Initialized SupabaseClient instance
+            cache_baselines: Keep each month's latest snapshot records in memory
+                so repeated runs in one process don't download them again
+                (the case index entries it looked up are kept too)
         """
         self.db = supabase_client
+        self.cache_baselines = cache_baselines
+        self._baselines: Dict[str, Tuple[str, List[VisaRecord]]] = {}
+        # Where each case is listed across months, to tell moves from new/removed cases
+        self.case_index = CaseIndex(supabase_client, keep_entries=cache_baselines)
     
     def detect_changes(self, new_records: List[Dict], month: str) -> List[Dict]:
         """
         Compare new records with the last snapshot and detect changes
         
+        New and removed cases are checked against the case index: a case
+        that moved here from another month is reported as case_moved, and
+        one that moved to another month is not reported as removed.
+        
         Args:
-            new_records: List of new record dictionaries from scraper
+            new_records: Typed records from the scraper (see normalize.normalize_record)
             month: Month in YYYY-MM format
             
         Returns:
             List of change dictionaries ready to be saved
         """
-        changes = []
-        
         # Get the latest snapshot for this month
         latest_snapshot = self.db.get_latest_snapshot(month)
         
         if not latest_snapshot:
-            # No previous snapshot - all records are new
+            # No previous snapshot - all records are new (or moved here)
+            changes = self.diff_records(None, new_records, None)
+            return self._set_month(self.case_index.resolve_moves(changes, month), month)
+        
+        # Get records from latest snapshot
+        old_records = self._load_baseline(month, latest_snapshot['id'])
+        
+        # Cases that dropped off the page earlier and may come back now
+        removed_keys = self.db.get_removed_casenums(month)
+        
+        changes = self.diff_records(old_records, new_records, latest_snapshot['id'], removed_keys)
+        return self._set_month(self.case_index.resolve_moves(changes, month), month)
+    
+    def diff_records(
+        self,
+        old_records: Optional[List[Dict]],
+        new_records: List[Dict],
+        snapshot_id_old: Optional[str],
+        removed_keys: Optional[Set[str]] = None
+    ) -> List[Dict]:
+        """
+        Diff two versions of a month's records
+        
+        Both sides are typed records (normalize.normalize_record), so
+        fields are compared as dates and ints without re-parsing.
+        
+        Records are matched on case_key(): the casenum, or a synthetic key
+        for rows without a details link. Each key is computed once per
+        record and the join is a hash lookup, so the diff is linear in the
+        number of records.
+        
+        Changes are ordered: new and reappeared cases (page order), field
+        changes of cases seen before (page order), then removed cases (old
+        page order).
+        
+        Args:
+            old_records: Typed records of the previous snapshot (None if there is none)
+            new_records: Newly scraped typed records
+            snapshot_id_old: ID of the previous snapshot
+            removed_keys: Keys of cases currently marked removed in this month;
+                they are reported as reappeared instead of new
+            
+        Returns:
+            List of change dictionaries (without month and snapshot_id_new)
+        """
+        changes = []
+        
+        if old_records is None:
             for record in new_records:
-                casenum = self._extract_casenum(record.get('details_link', ''))
+                casenum = case_key(record)
                 if casenum:
-                    changes.append({
-                        'casenum': casenum,
-                        'snapshot_id_old': None,
-                        'snapshot_id_new': None,  # Will be set after snapshot is created
-                        'change_type': 'new_record',
-                        'field_name': None,
-                        'old_value': None,
-                        'new_value': f"New record: {record.get('id', 'Unknown')}"
-                    })
+                    changes.append(self._case_change(casenum, None, 'new_record', record))
             return changes
         
-        # Get records from latest snapshot
-        old_records = self.db.get_records_by_snapshot(latest_snapshot['id'])
+        removed_keys = removed_keys or set()
         
         # Create lookup dictionaries
-        old_records_by_casenum = {
-            self._extract_casenum(r.get('details_link', '')): r
-            for r in old_records
-            if self._extract_casenum(r.get('details_link', ''))
-        }
+        old_records_by_casenum = {}
+        for record in old_records:
+            casenum = case_key(record)
+            if casenum:
+                old_records_by_casenum[casenum] = record
         
-        new_records_by_casenum = {
-            self._extract_casenum(r.get('details_link', '')): r
-            for r in new_records
-            if self._extract_casenum(r.get('details_link', ''))
-        }
+        new_records_by_casenum = {}
+        for record in new_records:
+            casenum = case_key(record)
+            if casenum:
+                new_records_by_casenum[casenum] = record
         
-        # Find new records
-        new_casenums = set(new_records_by_casenum.keys()) - set(old_records_by_casenum.keys())
-        for casenum in new_casenums:
-            record = new_records_by_casenum[casenum]
-            changes.append({
-                'casenum': casenum,
-                'snapshot_id_old': latest_snapshot['id'],
-                'snapshot_id_new': None,  # Will be set after snapshot is created
-                'change_type': 'new_record',
-                'field_name': None,
-                'old_value': None,
-                'new_value': f"New record: {record.get('id', 'Unknown')}"
-            })
+        # Find new and reappeared records
+        for casenum, record in new_records_by_casenum.items():
+            if casenum in old_records_by_casenum:
+                continue
+            change_type = 'reappeared' if casenum in removed_keys else 'new_record'
+            changes.append(self._case_change(casenum, snapshot_id_old, change_type, record))
         
         # Find changed records
-        common_casenums = set(new_records_by_casenum.keys()) & set(old_records_by_casenum.keys())
-        for casenum in common_casenums:
-            old_record = old_records_by_casenum[casenum]
-            new_record = new_records_by_casenum[casenum]
+        for casenum, new_record in new_records_by_casenum.items():
+            old_record = old_records_by_casenum.get(casenum)
+            if old_record is None:
+                continue
             
-            record_changes = self._compare_records(old_record, new_record, casenum, latest_snapshot['id'])
+            record_changes = self._compare_records(old_record, new_record, casenum, snapshot_id_old)
             changes.extend(record_changes)
         
+        # Find records that are no longer on the page
+        for casenum, record in old_records_by_casenum.items():
+            if casenum not in new_records_by_casenum:
+                changes.append(self._case_change(casenum, snapshot_id_old, 'removed', record))
+        
+        return changes
+    
+    def _case_change(self, casenum: str, snapshot_id_old: Optional[str], change_type: str, record: Dict) -> Dict:
+        """A whole-case change: new_record, reappeared or removed"""
+        label = CASE_CHANGE_LABELS[change_type]
+        value = f"{label}: {record.get('id', 'Unknown')}"
+        return {
+            'casenum': casenum,
+            'snapshot_id_old': snapshot_id_old,
+            'snapshot_id_new': None,  # Will be set after snapshot is created
+            'change_type': change_type,
+            'field_name': None,
+            'old_value': value if change_type == 'removed' else None,
+            'new_value': None if change_type == 'removed' else value
+        }
+    
+    def _load_baseline(self, month: str, snapshot_id: str) -> List[VisaRecord]:
+        """Records of a snapshot, from the in-memory cache when it is still the latest"""
+        cached = self._baselines.get(month)
+        if cached and cached[0] == snapshot_id:
+            return cached[1]
+        
+        # Rows become compact typed records here
+        records = [normalize_row(row) for row in self.db.get_records_by_snapshot(snapshot_id, month)]
+        if self.cache_baselines:
+            self._baselines[month] = (snapshot_id, records)
+        return records
+    
+    def remember_baseline(self, month: str, snapshot_id: str, records: List[Dict]) -> None:
+        """
+        Use just-saved records as the next baseline for a month (when caching)
+        
+        Args:
+            month: Month in YYYY-MM format
+            snapshot_id: UUID of the snapshot the records were saved as
+            records: The saved records
+        """
+        if self.cache_baselines:
+            self._baselines[month] = (snapshot_id, [as_record(r) for r in records])
+    
+    @property
+    def cached_baselines(self) -> int:
+        """Number of months whose baseline is held in memory"""
+        return len(self._baselines)
+    
+    def _set_month(self, changes: List[Dict], month: str) -> List[Dict]:
+        """Stamp the month on each change so it can be filtered in SQL"""
+        for change in changes:
+            change['month'] = month
         return changes
     
     def _compare_records(
@@ -128,12 +232,7 @@ class ChangeDetector:
             
             # Handle special cases
             if field_name == 'complete_date':
-                # Treat '0000-00-00' as None/empty
-                if old_value == '0000-00-00' or old_value is None:
-                    old_value = None
-                if new_value == '0000-00-00' or new_value is None:
-                    new_value = None
-                
+                # Typed dates: '0000-00-00' was normalized to None
                 # If date changed from None to a date, it's a completion
                 if old_value is None and new_value is not None:
                     changes.append({
@@ -169,21 +268,19 @@ class ChangeDetector:
                     })
             
             elif field_name == 'waiting_days':
-                try:
-                    old_days = int(old_value) if old_value else 0
-                    new_days = int(new_value) if new_value else 0
-                    if new_days > old_days:
-                        changes.append({
-                            'casenum': casenum,
-                            'snapshot_id_old': snapshot_id_old,
-                            'snapshot_id_new': None,
-                            'change_type': 'waiting_days_update',
-                            'field_name': 'waiting_days',
-                            'old_value': str(old_days),
-                            'new_value': str(new_days)
-                        })
-                except (ValueError, TypeError):
-                    pass
+                # Typed ints; a missing or non-numeric count (None) counts as 0
+                old_days = old_value or 0
+                new_days = new_value or 0
+                if new_days > old_days:
+                    changes.append({
+                        'casenum': casenum,
+                        'snapshot_id_old': snapshot_id_old,
+                        'snapshot_id_new': None,
+                        'change_type': 'waiting_days_update',
+                        'field_name': 'waiting_days',
+                        'old_value': str(old_days),
+                        'new_value': str(new_days)
+                    })
             
             elif field_name == 'note':
                 # Check if note was added or updated
@@ -212,18 +309,23 @@ class ChangeDetector:
                         'old_value': old_note[:200],
                         'new_value': new_note[:200]
                     })
+                elif old_note and not new_note:
+                    # Note was cleared
+                    changes.append({
+                        'casenum': casenum,
+                        'snapshot_id_old': snapshot_id_old,
+                        'snapshot_id_new': None,
+                        'change_type': 'note_removed',
+                        'field_name': 'note',
+                        'old_value': old_note[:200],
+                        'new_value': ''
+                    })
         
         return changes
     
     def _extract_casenum(self, details_link: str) -> str:
         """Extract casenum from details_link URL"""
-        if not details_link:
-            return ''
-        
-        match = re.search(r'casenum=(\d+)', details_link)
-        if match:
-            return match.group(1)
-        return ''
+        return extract_casenum(details_link)
     
     def get_record_history(self, casenum: str) -> List[Dict]:
         """
@@ -236,3 +338,27 @@ class ChangeDetector:
             List of records ordered chronologically
         """
         return self.db.get_records_by_casenum(casenum)
+    
+    def get_case_timeline(self, casenum: str) -> List[Dict]:
+        """
+        Get the status transitions of a record (compact alternative to get_record_history)
+        
+        Args:
+            casenum: Case number identifier
+            
+        Returns:
+            List of case events ordered chronologically
+        """
+        return self.db.get_case_events(casenum)
+    
+    def get_status_durations(self, casenum: str) -> Dict[str, float]:
+        """
+        Get how many days a record spent in each status
+        
+        Args:
+            casenum: Case number identifier
+            
+        Returns:
+            Dictionary mapping status to days
+        """
+        return status_durations(self.get_case_timeline(casenum))
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Change feed consumers
+Every change gets a sequence number that increases in commit order
+(migration 010). A consumer stores the seq of the last change it processed
+and each read asks for "seq > offset", so alerting jobs and exports see
+every change once instead of polling overlapping get_changes windows.
+
+Followers either poll, or with --listen wait on Postgres LISTEN/NOTIFY
+(needs psycopg and a direct DATABASE_URL). FileChangeFeed is the offline
+equivalent: update_and_detect.py --feed-file appends saved changes to a
+JSON Lines file and consumers tail it from a stored byte offset.
+
+Usage:
+    python change_feed.py --consumer alerts                 # print new changes once
+    python change_feed.py --consumer alerts --follow        # keep printing as they arrive
+    python change_feed.py --consumer alerts --file changes_feed.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_BATCH_SIZE = 500
+
+# Seconds a follower waits for new changes before asking again
+DEFAULT_POLL_INTERVAL = 30
+
+NOTIFY_CHANNEL = 'changes_feed'
+
+
+class DbChangeFeed:
+    """The changes table read by seq, with offsets in change_feed_offsets"""
+
+    def __init__(self, db_client, listen_dsn: Optional[str] = None):
+        """
+        Args:
+            db_client: SupabaseClient
+            listen_dsn: Postgres connection string for LISTEN/NOTIFY (None to poll)
+        """
+        self.db = db_client
+        self._listener = None
+        if listen_dsn:
+            try:
+                import psycopg
+            except ImportError:
+                print("Warning: psycopg is not installed, polling instead of LISTEN/NOTIFY")
+            else:
+                self._listener = psycopg.connect(listen_dsn, autocommit=True)
+                self._listener.execute(f'LISTEN {NOTIFY_CHANNEL}')
+
+    def read(self, after_seq: int, limit: int) -> List[Dict]:
+        return self.db.get_changes_after(after_seq, limit)
+
+    def get_offset(self, consumer: str) -> int:
+        return self.db.get_change_offset(consumer)
+
+    def commit_offset(self, consumer: str, seq: int) -> None:
+        self.db.commit_change_offset(consumer, seq)
+
+    def wait(self, timeout: float, stop_event: threading.Event) -> None:
+        """Block until new changes are announced, the timeout passes or stop is set"""
+        if self._listener is None:
+            stop_event.wait(timeout)
+            return
+        # A notification arrives when an insert into changes commits
+        for _ in self._listener.notifies(timeout=timeout, stop_after=1):
+            pass
+
+
+class FileChangeFeed:
+    """
+    Changes in a local JSON Lines file, one per line with its own seq
+
+    Offsets live next to the feed in <path>.offsets.json and hold the byte
+    position after the consumer's last change, so a read seeks straight to
+    the new lines instead of scanning the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets_path = path + '.offsets.json'
+        # seq -> byte position right after that change's line
+        self._positions: Dict[int, int] = {}
+
+    def append(self, changes: List[Dict]) -> int:
+        """
+        Append changes with consecutive seqs (safe across processes)
+
+        Returns:
+            seq of the last appended change
+        """
+        import fcntl
+
+        detected_at = datetime.now(timezone.utc).isoformat()
+        with open(self.path, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                seq = self._last_seq(f)
+                lines = []
+                if f.tell() and not self._ends_with_newline(f):
+                    # Close off a line a crashed writer left half written
+                    lines.append('\n')
+                for change in changes:
+                    seq += 1
+                    entry = dict(change, seq=seq)
+                    entry.setdefault('detected_at', detected_at)
+                    lines.append(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+                f.write(''.join(lines).encode('utf-8'))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return seq
+
+    def _ends_with_newline(self, f) -> bool:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+    def _last_seq(self, f) -> int:
+        """seq of the last complete line of an open feed file (0 when empty)"""
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        tail = b''
+        step = 4096
+        while size and tail.count(b'\n') < 2 and len(tail) < size:
+            start = max(size - len(tail) - step, 0)
+            f.seek(start)
+            tail = f.read(size - start)
+        for line in reversed(tail.splitlines()):
+            try:
+                return int(json.loads(line)['seq'])
+            except (ValueError, KeyError):
+                continue
+        return 0
+
+    def read(self, after_seq: int, limit: int) -> List[Dict]:
+        if not os.path.exists(self.path):
+            return []
+        changes = []
+        position = None
+        with open(self.path, 'rb') as f:
+            f.seek(self._positions.get(after_seq, 0))
+            while len(changes) < limit:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break  # end of file, or a line still being written
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    continue  # a half-written line from a crashed writer
+                if change['seq'] > after_seq:
+                    changes.append(change)
+                    position = f.tell()
+        if changes:
+            # Only the latest position is needed: reads go forward
+            self._positions = {changes[-1]['seq']: position}
+        return changes
+
+    def _load_offsets(self) -> Dict:
+        try:
+            with open(self.offsets_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get_offset(self, consumer: str) -> int:
+        offset = self._load_offsets().get(consumer)
+        if not offset:
+            return 0
+        if offset.get('position') is not None:
+            self._positions[offset['seq']] = offset['position']
+        return offset['seq']
+
+    def commit_offset(self, consumer: str, seq: int) -> None:
+        import fcntl
+
+        # The lock file keeps consumers sharing the offsets file from losing updates
+        with open(self.offsets_path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            offsets = self._load_offsets()
+            if offsets.get(consumer, {}).get('seq', 0) >= seq:
+                return
+            offsets[consumer] = {'seq': seq, 'position': self._positions.get(seq)}
+            tmp_path = self.offsets_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(offsets, f, indent=2)
+            os.replace(tmp_path, self.offsets_path)
+
+    def wait(self, timeout: float, stop_event: threading.Event) -> None:
+        stop_event.wait(timeout)
+
+
+class ChangeFeedConsumer:
+    """A named reader of a change feed that remembers how far it got"""
+
+    def __init__(self, feed, name: str, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Args:
+            feed: DbChangeFeed or FileChangeFeed
+            name: Consumer name; each name has its own stored offset
+            batch_size: Changes handed to the handler at a time
+        """
+        self.feed = feed
+        self.name = name
+        self.batch_size = batch_size
+        self.offset = feed.get_offset(name)
+
+    def poll(self) -> List[Dict]:
+        """The next batch after the current offset (empty when caught up)"""
+        return self.feed.read(self.offset, self.batch_size)
+
+    def commit(self, seq: int) -> None:
+        """Mark every change up to seq as processed"""
+        self.feed.commit_offset(self.name, seq)
+        self.offset = max(self.offset, seq)
+
+    def run(
+        self,
+        handler: Callable[[List[Dict]], None],
+        follow: bool = False,
+        interval: float = DEFAULT_POLL_INTERVAL,
+        stop_event: Optional[threading.Event] = None
+    ) -> int:
+        """
+        Hand every new change to handler, batch by batch
+
+        The offset is committed after each batch the handler returns from,
+        so a consumer that crashes mid-batch gets that batch again on
+        restart and never skips a change.
+
+        Args:
+            handler: Called with each batch (list of changes in seq order)
+            follow: Keep waiting for new changes instead of returning when caught up
+            interval: Seconds between checks when following without LISTEN/NOTIFY
+            stop_event: Set to stop following
+
+        Returns:
+            Number of changes handled
+        """
+        stop_event = stop_event or threading.Event()
+        handled = 0
+        while not stop_event.is_set():
+            batch = self.poll()
+            if batch:
+                handler(batch)
+                self.commit(batch[-1]['seq'])
+                handled += len(batch)
+                if len(batch) == self.batch_size:
+                    continue
+            if not follow:
+                break
+            self.feed.wait(interval, stop_event)
+        return handled
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print new changes for a consumer, each exactly once')
+    parser.add_argument('--consumer', required=True, help='Consumer name (its offset is stored)')
+    parser.add_argument('--file', type=str, help='Read the offline JSON Lines feed instead of Supabase')
+    parser.add_argument('--follow', action='store_true', help='Keep running and print changes as they arrive')
+    parser.add_argument('--interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f'Seconds between checks when following (default: {DEFAULT_POLL_INTERVAL})')
+    parser.add_argument('--listen', action='store_true',
+                        help='Wait on LISTEN/NOTIFY when following (needs psycopg and DATABASE_URL)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Changes per read (default: {DEFAULT_BATCH_SIZE})')
+    args = parser.parse_args()
+
+    if args.file:
+        feed = FileChangeFeed(args.file)
+    else:
+        from supabase_client import SupabaseClient
+        listen_dsn = os.getenv('DATABASE_URL') if args.listen else None
+        if args.listen and not listen_dsn:
+            parser.error('--listen needs DATABASE_URL (a direct Postgres connection string)')
+        feed = DbChangeFeed(SupabaseClient(), listen_dsn)
+
+    consumer = ChangeFeedConsumer(feed, args.consumer, args.batch_size)
+
+    def handler(batch):
+        for change in batch:
+            print(json.dumps(change, ensure_ascii=False, default=str))
+        sys.stdout.flush()
+
+    try:
+        consumer.run(handler, follow=args.follow, interval=args.interval)
+    except KeyboardInterrupt:
+        pass
+    print(f"{args.consumer}: at seq {consumer.offset}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
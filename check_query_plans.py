@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Query plan checks for the hot database queries
+Loads the migrations and synthetic data into a scratch schema of a local
+Postgres and verifies with EXPLAIN that each query is served by an index
+and, for queries filtered by month, reads only that month's partition
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+SCHEMA = 'plan_check'
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'supabase', 'migrations')
+
+# Scan node types that count as "served by an index"
+INDEX_SCANS = {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan'}
+
+SYNTHETIC_DATA_SQL = """
+INSERT INTO snapshots (id, scrape_date, month, total_records, created_at)
+SELECT gen_random_uuid(),
+       now() - (s || ' days')::interval,
+       to_char(date '2020-01-01' + (m || ' months')::interval, 'YYYY-MM'),
+       {records_per_snapshot},
+       now() - (s || ' days')::interval
+FROM generate_series(0, {months} - 1) AS m,
+     generate_series(0, {snapshots_per_month} - 1) AS s;
+
+SELECT ensure_month_partitions(ARRAY(SELECT DISTINCT month FROM snapshots));
+
+INSERT INTO records (snapshot_id, casenum, user_id, visa_type, visa_entry, consulate,
+                     major, status, check_date, complete_date, waiting_days,
+                     details_link, has_notes, note, month, created_at)
+SELECT sn.id,
+       (100000 + (substr(sn.month, 1, 4)::int - 2020) * 12000
+               + substr(sn.month, 6, 2)::int * 1000 + r)::text,
+       'user' || r,
+       (ARRAY['H1', 'F1', 'B1', 'J1', 'L1'])[1 + r % 5],
+       (ARRAY['New', 'Renewal'])[1 + r % 2],
+       (ARRAY['BeiJing', 'ShangHai', 'GuangZhou', 'ShenYang', 'Vancouver', 'Toronto'])[1 + r % 6],
+       'Major ' || (r % 40),
+       (ARRAY['Pending', 'Clear', 'Clear', 'Reject'])[1 + r % 4],
+       date '2020-01-01' + r,
+       CASE WHEN r % 4 = 0 THEN NULL ELSE date '2020-01-01' + r + 30 END,
+       r % 200,
+       'https://www.checkee.info/personal_detail.php?casenum=' || r,
+       r % 3 = 0,
+       CASE WHEN r % 3 = 0 THEN 'note ' || r ELSE '' END,
+       sn.month,
+       sn.scrape_date
+FROM snapshots sn,
+     generate_series(1, {records_per_snapshot}) AS r;
+
+INSERT INTO changes (casenum, snapshot_id_old, snapshot_id_new, change_type,
+                     field_name, old_value, new_value, detected_at, month)
+SELECT rec.casenum,
+       NULL,
+       rec.snapshot_id,
+       (ARRAY['status_change', 'date_update', 'waiting_days_update', 'note_added', 'new_record'])[1 + rec.waiting_days % 5],
+       'status',
+       'Pending',
+       rec.status,
+       rec.created_at + (rec.waiting_days || ' seconds')::interval,
+       rec.month
+FROM records rec
+WHERE rec.waiting_days % 2 = 0;
+
+ANALYZE;
+"""
+
+# Each check names the table, the query (with {placeholders} filled from
+# sample values) and the indexes that are allowed to serve it. Indexes on
+# month partitions count as the parent index they were cloned from;
+# 'partitions' is the most partitions of the table the plan may scan.
+QUERY_CHECKS: List[Dict] = [
+    {
+        'name': 'records by snapshot with dashboard filters (/api/records)',
+        'table': 'records',
+        'sql': (
+            "SELECT * FROM records WHERE snapshot_id = '{snapshot_id}' AND month = '{month}' "
+            "AND consulate = 'BeiJing' AND visa_type = 'H1' AND status = 'Pending' LIMIT 100"
+        ),
+        'indexes': {'idx_records_snapshot_filters'},
+        'partitions': 1,
+    },
+    {
+        'name': 'records by snapshot and status',
+        'table': 'records',
+        'sql': (
+            "SELECT * FROM records WHERE snapshot_id = '{snapshot_id}' AND month = '{month}' "
+            "AND status = 'Clear' LIMIT 100"
+        ),
+        'indexes': {'idx_records_snapshot_status', 'idx_records_snapshot_filters'},
+        'partitions': 1,
+    },
+    {
+        'name': 'records by snapshot (get_records_by_snapshot, get_statistics)',
+        'table': 'records',
+        'sql': "SELECT * FROM records WHERE snapshot_id = '{snapshot_id}' AND month = '{month}' ORDER BY id",
+        'indexes': {'idx_records_snapshot_status', 'idx_records_snapshot_filters'},
+        'partitions': 1,
+    },
+    {
+        'name': 'stored rows of a case (get_record_history)',
+        'table': 'records',
+        'sql': "SELECT * FROM records WHERE casenum = '{casenum}' ORDER BY created_at",
+        'indexes': {'idx_records_casenum_created_at'},
+    },
+    {
+        'name': 'latest snapshot of a month (get_latest_snapshot)',
+        'table': 'snapshots',
+        'sql': "SELECT * FROM snapshots WHERE month = '{month}' ORDER BY scrape_date DESC LIMIT 1",
+        'indexes': {'idx_snapshots_month_scrape_date'},
+    },
+    {
+        'name': 'latest snapshot id of a month (/api/records)',
+        'table': 'snapshots',
+        'sql': "SELECT id FROM snapshots WHERE month = '{month}' ORDER BY scrape_date DESC LIMIT 1",
+        'indexes': {'idx_snapshots_month_scrape_date'},
+        'scans': {'Index Only Scan'},
+    },
+    {
+        'name': 'newest changes (get_changes)',
+        'table': 'changes',
+        'sql': "SELECT * FROM changes ORDER BY detected_at DESC, id DESC LIMIT 100",
+        'indexes': {'idx_changes_detected_at_id'},
+    },
+    {
+        'name': 'newest changes of a type (get_changes change_type=...)',
+        'table': 'changes',
+        'sql': "SELECT * FROM changes WHERE change_type = 'status_change' ORDER BY detected_at DESC, id DESC LIMIT 100",
+        'indexes': {'idx_changes_type_detected_at_id'},
+    },
+    {
+        'name': 'newest changes of a month (get_changes month=...)',
+        'table': 'changes',
+        'sql': "SELECT * FROM changes WHERE month = '{month}' ORDER BY detected_at DESC, id DESC LIMIT 100",
+        'indexes': {'idx_changes_month_detected_at'},
+        'partitions': 1,
+    },
+    {
+        'name': 'next page of a month (get_changes_page cursor=...)',
+        'table': 'changes',
+        'sql': (
+            "SELECT * FROM changes WHERE month = '{month}' "
+            "AND (detected_at, id) < (now(), 'ffffffff-ffff-ffff-ffff-ffffffffffff'::uuid) "
+            "ORDER BY detected_at DESC, id DESC LIMIT 100"
+        ),
+        'indexes': {'idx_changes_month_detected_at'},
+        'partitions': 1,
+    },
+    {
+        'name': 'change feed after an offset (iter_changes)',
+        'table': 'changes',
+        'sql': "SELECT * FROM changes WHERE seq > 100 ORDER BY seq LIMIT 500",
+        'indexes': {'idx_changes_seq'},
+    },
+]
+
+
+def run_psql(dsn: str, sql: str, schema: Optional[str] = SCHEMA) -> str:
+    """
+    Run SQL through psql and return its unaligned, tuples-only output
+
+    Args:
+        dsn: Postgres connection string
+        sql: SQL to execute
+        schema: Schema to put first on the search_path (None for default)
+
+    Returns:
+        Raw stdout from psql
+    """
+    env = dict(os.environ)
+    if schema:
+        env['PGOPTIONS'] = f'-c search_path={schema},public'
+    result = subprocess.run(
+        ['psql', dsn, '-X', '-q', '-A', '-t', '-v', 'ON_ERROR_STOP=1'],
+        input=sql,
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f'psql exited with {result.returncode}')
+    return result.stdout
+
+
+def setup_schema(dsn: str, months: int, snapshots_per_month: int, records_per_snapshot: int) -> None:
+    """Create the scratch schema, apply all migrations and load synthetic data"""
+    run_psql(dsn, f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA};', schema=None)
+
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, '*.sql'))):
+        print(f"  Applying {os.path.basename(path)}")
+        with open(path, 'r') as f:
+            run_psql(dsn, f.read())
+
+    print(f"  Loading synthetic data ({months} months x {snapshots_per_month} snapshots x "
+          f"{records_per_snapshot} records)...")
+    run_psql(dsn, SYNTHETIC_DATA_SQL.format(
+        months=months,
+        snapshots_per_month=snapshots_per_month,
+        records_per_snapshot=records_per_snapshot,
+    ))
+
+
+def sample_values(dsn: str) -> Dict[str, str]:
+    """Pick concrete parameter values (a month, its latest snapshot, a casenum)"""
+    row = run_psql(dsn, """
+        SELECT s.month, s.id, r.casenum
+        FROM snapshots s JOIN records r ON r.snapshot_id = s.id
+        ORDER BY s.month DESC, s.scrape_date DESC
+        LIMIT 1;
+    """).strip()
+    month, snapshot_id, casenum = row.split('|')
+    return {'month': month, 'snapshot_id': snapshot_id, 'casenum': casenum}
+
+
+def index_parents(dsn: str) -> Dict[str, str]:
+    """Map each index of a month partition to the partitioned index it belongs to"""
+    output = run_psql(dsn, f"""
+        SELECT c.relname, root.relname
+        FROM pg_class c
+        JOIN pg_class root ON root.oid = pg_partition_root(c.oid)
+        WHERE c.relkind = 'i' AND c.relispartition
+          AND c.relnamespace = '{SCHEMA}'::regnamespace;
+    """)
+    return dict(line.split('|') for line in output.splitlines() if line)
+
+
+def walk_plan(node: Dict):
+    """Yield every node of an EXPLAIN (FORMAT JSON) plan tree"""
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk_plan(child)
+
+
+def check_query(dsn: str, check: Dict, values: Dict[str, str], parents: Dict[str, str]) -> Tuple[List[str], Set[str]]:
+    """
+    EXPLAIN one query and return its problems (empty when it passes)
+
+    Args:
+        dsn: Postgres connection string
+        check: Entry of QUERY_CHECKS
+        values: Sample values used to fill the query placeholders
+        parents: Partition index name -> parent index name (index_parents)
+
+    Returns:
+        Tuple of (human-readable failure reasons, relations of the table scanned)
+    """
+    sql = check['sql'].format(**values)
+    output = run_psql(dsn, f'EXPLAIN (FORMAT JSON) {sql};')
+    plan = json.loads(output)[0]['Plan']
+    allowed_scans = check.get('scans', INDEX_SCANS)
+
+    problems = []
+    used_indexes = set()
+    scanned = set()
+    for node in walk_plan(plan):
+        node_type = node.get('Node Type')
+        relation = node.get('Relation Name')
+        if relation and relation.startswith(check['table']):
+            scanned.add(relation)
+        if node_type == 'Seq Scan' and relation and relation.startswith(check['table']):
+            problems.append(f"sequential scan on {relation}")
+        if node_type in INDEX_SCANS and node.get('Index Name'):
+            index_name = parents.get(node['Index Name'], node['Index Name'])
+            if node_type in allowed_scans:
+                used_indexes.add(index_name)
+            else:
+                problems.append(f"{node_type} on {index_name}, expected {', '.join(sorted(allowed_scans))}")
+
+    if 'partitions' in check and len(scanned) > check['partitions']:
+        problems.append(f"scanned {len(scanned)} partitions, expected at most {check['partitions']} (no pruning)")
+
+    if not used_indexes & check['indexes']:
+        found = ', '.join(sorted(used_indexes)) or 'none'
+        problems.append(f"expected one of {', '.join(sorted(check['indexes']))}, used: {found}")
+
+    return problems, scanned
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify that hot queries are served by indexes (EXPLAIN)')
+    parser.add_argument('--dsn', type=str, default=os.getenv('DATABASE_URL', 'postgresql://localhost/postgres'),
+                        help='Local Postgres connection string (default: $DATABASE_URL)')
+    parser.add_argument('--months', type=int, default=60, help='Synthetic months (default: 60)')
+    parser.add_argument('--snapshots-per-month', type=int, default=20, help='Snapshots per month (default: 20)')
+    parser.add_argument('--records-per-snapshot', type=int, default=200, help='Records per snapshot (default: 200)')
+    parser.add_argument('--keep', action='store_true', help=f'Keep the {SCHEMA} schema after the run')
+
+    args = parser.parse_args()
+
+    print(f"Preparing scratch schema '{SCHEMA}'...")
+    try:
+        setup_schema(args.dsn, args.months, args.snapshots_per_month, args.records_per_snapshot)
+        values = sample_values(args.dsn)
+        parents = index_parents(args.dsn)
+    except (OSError, RuntimeError) as e:
+        print(f"✗ Could not prepare database: {e}")
+        sys.exit(2)
+
+    failures = 0
+    try:
+        print("\nChecking query plans:")
+        for check in QUERY_CHECKS:
+            problems, scanned = check_query(args.dsn, check, values, parents)
+            pruning = ''
+            if 'partitions' in check:
+                pruning = f" ({len(scanned)} partition{'s' if len(scanned) != 1 else ''} scanned)"
+            if problems:
+                failures += 1
+                print(f"  ✗ {check['name']}{pruning}")
+                for problem in problems:
+                    print(f"      {problem}")
+            else:
+                print(f"  ✓ {check['name']}{pruning}")
+    finally:
+        if not args.keep:
+            run_psql(args.dsn, f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;', schema=None)
+
+    print(f"\n{len(QUERY_CHECKS) - failures}/{len(QUERY_CHECKS)} queries use an index")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Clearance-time prediction
+Fits Kaplan-Meier survival curves of waiting days from the latest snapshot
+of every month, stratified by consulate, visa type, visa entry and major,
+and answers "how much longer will a case that has waited N days take"
+from an in-memory lookup table
+"""
+
+import argparse
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clearance_model.npz')
+
+# Longest wait modeled; longer waits are censored at the horizon
+HORIZON_DAYS = 730
+
+# A stratum needs this many cases before it is trusted over a coarser one
+MIN_SAMPLES = 30
+
+# Strata from most to least specific; queries back off along this list
+STRATA = (
+    ('consulate', 'visa_type', 'visa_entry', 'major'),
+    ('consulate', 'visa_type', 'visa_entry'),
+    ('consulate', 'visa_type'),
+    ('visa_type',),
+    (),
+)
+
+# A case "clears" when its check is finished, either way
+FINISHED_STATUSES = ('Clear', 'Reject')
+
+MODEL_COLUMNS = ['consulate', 'visa_type', 'visa_entry', 'major', 'status', 'waiting_days']
+
+
+def _normalize(value) -> str:
+    return str(value or '').strip().lower()
+
+
+def _stratum_key(level: int, values: Sequence[str]) -> str:
+    return f"{level}|" + '|'.join(values)
+
+
+class ClearancePredictor:
+    """
+    Survival curves per stratum, stored as one float32 matrix
+
+    Row i of `survival` is S(t) for t = 0..horizon of the stratum whose key
+    maps to i in `index`. Point queries are a dict lookup plus a binary
+    search on one row.
+    """
+
+    def __init__(self, keys: Sequence[str], survival: np.ndarray, counts: np.ndarray, horizon: int = HORIZON_DAYS):
+        self.keys = list(keys)
+        self.survival = survival
+        self.counts = counts
+        self.horizon = horizon
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        # Negated rows are increasing, which is what searchsorted needs
+        self._neg_survival = -survival
+
+    @classmethod
+    def fit(cls, records: Iterable[Dict], horizon: int = HORIZON_DAYS) -> 'ClearancePredictor':
+        """
+        Fit survival curves for every stratum
+
+        Pending cases are right-censored at their current waiting_days;
+        Clear/Reject cases are events at theirs.
+
+        Args:
+            records: Record dictionaries with the MODEL_COLUMNS fields
+            horizon: Longest wait modeled, in days
+
+        Returns:
+            Fitted predictor
+        """
+        columns: Dict[str, List[str]] = {name: [] for name in ('consulate', 'visa_type', 'visa_entry', 'major')}
+        durations = []
+        events = []
+        for record in records:
+            try:
+                days = int(record.get('waiting_days'))
+            except (ValueError, TypeError):
+                continue
+            if days < 0:
+                continue
+            for name in columns:
+                columns[name].append(_normalize(record.get(name)))
+            durations.append(days)
+            events.append(record.get('status') in FINISHED_STATUSES)
+
+        durations = np.asarray(durations, dtype=np.int64)
+        # Cases still running at the horizon are censored there
+        events = np.asarray(events, dtype=bool) & (durations <= horizon)
+        durations = np.minimum(durations, horizon)
+        width = horizon + 1
+
+        keys: List[str] = []
+        curves: List[np.ndarray] = []
+        counts: List[np.ndarray] = []
+
+        for level, fields in enumerate(STRATA):
+            if fields:
+                labels = np.array(['|'.join(parts) for parts in zip(*(columns[f] for f in fields))], dtype=object)
+                unique_labels, group = np.unique(labels, return_inverse=True)
+            else:
+                unique_labels, group = np.array([''], dtype=object), np.zeros(len(durations), dtype=np.int64)
+            n_groups = len(unique_labels)
+            if n_groups == 0:
+                continue
+
+            # Per-group histograms of exits and events over the day grid, in one bincount each
+            flat = group * width + durations
+            exits = np.bincount(flat, minlength=n_groups * width).reshape(n_groups, width)
+            deaths = np.bincount(flat[events], minlength=n_groups * width).reshape(n_groups, width)
+
+            totals = exits.sum(axis=1, keepdims=True)
+            at_risk = totals - np.cumsum(exits, axis=1) + exits
+            with np.errstate(divide='ignore', invalid='ignore'):
+                hazard = np.where(at_risk > 0, deaths / at_risk, 0.0)
+            survival = np.cumprod(1.0 - hazard, axis=1).astype(np.float32)
+
+            for label, row, total in zip(unique_labels, survival, totals[:, 0]):
+                keys.append(f"{level}|{label}")
+                curves.append(row)
+                counts.append(total)
+
+        if not curves:
+            return cls([], np.zeros((0, width), dtype=np.float32), np.zeros(0, dtype=np.int32), horizon)
+        return cls(keys, np.vstack(curves), np.asarray(counts, dtype=np.int32), horizon)
+
+    def save(self, path: str = DEFAULT_MODEL_PATH) -> None:
+        """Write the lookup table to a compressed .npz file (atomically)"""
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path,
+            keys=np.array(self.keys, dtype=str),
+            survival=self.survival,
+            counts=self.counts,
+            horizon=np.array(self.horizon),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> 'ClearancePredictor':
+        """Load a lookup table written by save()"""
+        with np.load(path) as data:
+            return cls(data['keys'].tolist(), data['survival'], data['counts'], int(data['horizon']))
+
+    def _row(self, consulate: str, visa_type: str, visa_entry: str, major: str, min_samples: int) -> Optional[int]:
+        values = {
+            'consulate': _normalize(consulate),
+            'visa_type': _normalize(visa_type),
+            'visa_entry': _normalize(visa_entry),
+            'major': _normalize(major),
+        }
+        for level, fields in enumerate(STRATA):
+            i = self.index.get(_stratum_key(level, [values[f] for f in fields]))
+            if i is not None and self.counts[i] >= min_samples:
+                return i
+        return None
+
+    def predict(
+        self,
+        consulate: str = '',
+        visa_type: str = '',
+        visa_entry: str = '',
+        major: str = '',
+        days_waited: int = 0,
+        quantiles: Tuple[float, ...] = (0.5, 0.9),
+        min_samples: int = MIN_SAMPLES
+    ) -> Optional[Dict]:
+        """
+        Estimate the remaining wait of a pending case
+
+        Args:
+            consulate: US consulate (e.g. BeiJing)
+            visa_type: Visa type (e.g. H1)
+            visa_entry: Entry type (New/Renewal)
+            major: Major/field of study
+            days_waited: Days the case has already waited
+            quantiles: Quantiles of the remaining wait to return
+            min_samples: Minimum cases for a stratum to be used
+
+        Returns:
+            Dictionary with 'remaining_p<q>' (None when beyond the horizon)
+            for each quantile, 'prob_clear_30d' and the 'samples' behind the
+            estimate; None when no stratum has enough data
+        """
+        i = self._row(consulate, visa_type, visa_entry, major, min_samples)
+        if i is None:
+            return None
+
+        waited = min(max(int(days_waited), 0), self.horizon)
+        curve = self.survival[i]
+        base = float(curve[waited])
+        result = {'samples': int(self.counts[i])}
+
+        for q in quantiles:
+            key = f'remaining_p{round(q * 100):d}'
+            if base <= 0:
+                result[key] = 0
+                continue
+            # First day t with S(t) <= S(waited) * (1 - q)
+            t = int(np.searchsorted(self._neg_survival[i], -base * (1 - q), side='left'))
+            result[key] = t - waited if t <= self.horizon else None
+
+        later = float(curve[min(waited + 30, self.horizon)])
+        result['prob_clear_30d'] = round(1 - later / base, 4) if base > 0 else 1.0
+        return result
+
+
+def fit_from_db(db, horizon: int = HORIZON_DAYS) -> ClearancePredictor:
+    """Fit a predictor from the latest snapshot of every month"""
+    return ClearancePredictor.fit(db.iter_latest_records(MODEL_COLUMNS), horizon=horizon)
+
+
+_cache: Dict[str, object] = {'path': None, 'mtime': None, 'model': None}
+
+
+def get_predictor(path: str = DEFAULT_MODEL_PATH) -> Optional[ClearancePredictor]:
+    """
+    Return the cached predictor, reloading it when the model file changes
+
+    update_and_detect.py rewrites the file after each run, so long-lived
+    processes pick up the new model on their next call.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _cache['model'] is None or _cache['path'] != path or _cache['mtime'] != mtime:
+        _cache.update(path=path, mtime=mtime, model=ClearancePredictor.load(path))
+    return _cache['model']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit or query the clearance-time model')
+    parser.add_argument('--fit', action='store_true', help='Fit from Supabase and save the lookup table')
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL_PATH, help='Model file path')
+    parser.add_argument('--consulate', type=str, default='', help='US consulate (e.g. BeiJing)')
+    parser.add_argument('--visa-type', type=str, default='', help='Visa type (e.g. H1)')
+    parser.add_argument('--visa-entry', type=str, default='', help='Entry type (New/Renewal)')
+    parser.add_argument('--major', type=str, default='', help='Major/field of study')
+    parser.add_argument('--days-waited', type=int, default=0, help='Days already waited')
+
+    args = parser.parse_args()
+
+    if args.fit:
+        from supabase_client import SupabaseClient
+        predictor = fit_from_db(SupabaseClient())
+        predictor.save(args.model)
+        print(f"✓ Saved {len(predictor.keys)} strata to {args.model}")
+        return
+
+    predictor = get_predictor(args.model)
+    if predictor is None:
+        print(f"No model at {args.model}; run with --fit first")
+        return
+
+    estimate = predictor.predict(
+        consulate=args.consulate,
+        visa_type=args.visa_type,
+        visa_entry=args.visa_entry,
+        major=args.major,
+        days_waited=args.days_waited
+    )
+    if estimate is None:
+        print("Not enough data for this case")
+    else:
+        for key, value in estimate.items():
+            print(f"  {key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Snapshot retention and compaction
+Every run saves a full copy of its month, so records (and its snapshot and
+casenum indexes) grows with every scrape. This job keeps the latest --keep
+snapshots of each month and a checkpoint every --checkpoint-every snapshots
+in full, and collapses the others into deltas: the rows of cases that are
+new or changed since the snapshot before, plus tombstones for cases that
+disappeared (migration 011).
+
+get_records_by_casenum (record history) and get_records_as_of (time
+travel) rebuild compacted snapshots in SQL and return the same records as
+before compaction. Rows are deleted in small batches, each its own short
+transaction, so ingest and readers are never blocked for long.
+
+Usage:
+    python compact_snapshots.py --dry-run                 # list what would be compacted
+    python compact_snapshots.py                           # compact everything eligible
+    python compact_snapshots.py --month 2024-03 --keep 5
+"""
+
+import argparse
+import time
+from typing import Dict, Optional
+
+DEFAULT_KEEP = 3
+DEFAULT_CHECKPOINT_EVERY = 10
+DEFAULT_BATCH_SIZE = 500
+
+
+def format_bytes(size: float) -> str:
+    """Human-readable byte count (e.g. 12.3 MB)"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def compact_snapshot(db, snapshot_id: str, batch_size: int = DEFAULT_BATCH_SIZE, pause: float = 0.0) -> Dict:
+    """
+    Turn one full snapshot into a delta
+
+    Safe to interrupt and run again: the snapshot is marked as a delta
+    before any row is deleted, and the rows it still holds are correct.
+
+    Args:
+        db: SupabaseClient
+        snapshot_id: UUID of the snapshot
+        batch_size: Rows looked at per transaction
+        pause: Seconds to sleep between batches
+
+    Returns:
+        Dictionary with removals, deleted_rows, freed_bytes and batches
+    """
+    stats = {
+        'removals': db.begin_snapshot_compaction(snapshot_id),
+        'deleted_rows': 0,
+        'freed_bytes': 0,
+        'batches': 0,
+    }
+    after_id = None
+    while True:
+        batch = db.compact_snapshot_batch(snapshot_id, after_id, batch_size)
+        stats['batches'] += 1
+        stats['deleted_rows'] += batch['deleted_rows']
+        stats['freed_bytes'] += batch['freed_bytes']
+        after_id = batch['last_id']
+        if after_id is None:
+            return stats
+        if pause:
+            time.sleep(pause)
+
+
+def compact_snapshots(
+    db,
+    keep: int = DEFAULT_KEEP,
+    checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY,
+    month: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause: float = 0.0,
+    dry_run: bool = False
+) -> Dict:
+    """
+    Compact every eligible snapshot
+
+    Args:
+        db: SupabaseClient
+        keep: Latest snapshots of each month that stay full
+        checkpoint_every: Every n-th snapshot of a month stays full
+        month: Only this month (YYYY-MM); None for all months
+        batch_size: Rows looked at per transaction
+        pause: Seconds to sleep between batches
+        dry_run: Only list the snapshots that would be compacted
+
+    Returns:
+        Dictionary with snapshots, deleted_rows, freed_bytes, and the
+        records table size before and after (size_before/size_after)
+    """
+    if keep < 1:
+        raise ValueError("keep must be at least 1: the latest snapshot is the change detection baseline")
+    if checkpoint_every < 1:
+        raise ValueError("checkpoint_every must be at least 1")
+
+    candidates = db.get_compaction_candidates(keep, checkpoint_every, month)
+    totals = {'snapshots': 0, 'deleted_rows': 0, 'freed_bytes': 0, 'size_before': None, 'size_after': None}
+    if not candidates:
+        print("No snapshots to compact")
+        return totals
+
+    if dry_run:
+        for snapshot in candidates:
+            print(f"  {snapshot['month']}  {snapshot['scrape_date']}  {snapshot['total_records']:>6} records  {snapshot['id']}")
+        print(f"{len(candidates)} snapshot(s) would be compacted")
+        totals['snapshots'] = len(candidates)
+        return totals
+
+    totals['size_before'] = db.get_records_storage_bytes()
+    for i, snapshot in enumerate(candidates, 1):
+        try:
+            stats = compact_snapshot(db, snapshot['id'], batch_size, pause)
+        except Exception as e:
+            print(f"✗ {snapshot['month']} {snapshot['scrape_date']}: {e}")
+            continue
+        totals['snapshots'] += 1
+        totals['deleted_rows'] += stats['deleted_rows']
+        totals['freed_bytes'] += stats['freed_bytes']
+        print(
+            f"✓ [{i}/{len(candidates)}] {snapshot['month']} {snapshot['scrape_date']}: "
+            f"{stats['deleted_rows']} unchanged rows removed, {stats['removals']} removed cases recorded"
+        )
+    totals['size_after'] = db.get_records_storage_bytes()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact old snapshots into deltas')
+    parser.add_argument('--keep', type=int, default=DEFAULT_KEEP,
+                        help=f'Latest snapshots per month kept in full (default: {DEFAULT_KEEP})')
+    parser.add_argument('--checkpoint-every', type=int, default=DEFAULT_CHECKPOINT_EVERY,
+                        help=f'Keep every n-th snapshot of a month in full (default: {DEFAULT_CHECKPOINT_EVERY})')
+    parser.add_argument('--month', type=str, help='Only compact this month (YYYY-MM)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Rows per transaction (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--pause', type=float, default=0.0,
+                        help='Seconds to sleep between batches (default: 0)')
+    parser.add_argument('--dry-run', action='store_true', help='List the snapshots that would be compacted')
+    args = parser.parse_args()
+
+    if args.keep < 1:
+        parser.error('--keep must be at least 1')
+    if args.checkpoint_every < 1:
+        parser.error('--checkpoint-every must be at least 1')
+
+    from supabase_client import SupabaseClient
+    db = SupabaseClient()
+
+    totals = compact_snapshots(
+        db,
+        keep=args.keep,
+        checkpoint_every=args.checkpoint_every,
+        month=args.month,
+        batch_size=args.batch_size,
+        pause=args.pause,
+        dry_run=args.dry_run
+    )
+    if args.dry_run or not totals['snapshots']:
+        return
+
+    print(f"\nCompacted {totals['snapshots']} snapshot(s): {totals['deleted_rows']} rows removed, "
+          f"{format_bytes(totals['freed_bytes'])} of row data freed for reuse")
+    print(f"records table: {format_bytes(totals['size_before'])} -> {format_bytes(totals['size_after'])} "
+          f"(the files shrink after VACUUM FULL; plain VACUUM makes the space reusable)")
+
+
+if __name__ == '__main__':
+    main()
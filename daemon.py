@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Daemon support for update_and_detect.py
+Runs refresh cycles on a schedule inside one long-lived process and serves
+a local health/metrics endpoint
+"""
+
+import json
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+
+class PipelineMetrics:
+    """Thread-safe counters and gauges describing the daemon's refresh cycles"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.values: Dict[str, float] = {
+            'cycles_total': 0,
+            'cycle_errors_total': 0,
+            'months_processed_total': 0,
+            'records_scraped_total': 0,
+            'changes_detected_total': 0,
+            'last_cycle_started': 0,
+            'last_cycle_finished': 0,
+            'last_cycle_success': 0,
+            'last_cycle_duration_seconds': 0,
+            'baselines_cached': 0,
+        }
+
+    def inc(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + amount
+
+    def set(self, name: str, value: float) -> None:
+        with self._lock:
+            self.values[name] = value
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            values = dict(self.values)
+        values['uptime_seconds'] = time.time() - self.started_at
+        return values
+
+    def to_prometheus(self, prefix: str = 'checkee_') -> str:
+        """Render all values in the Prometheus text exposition format"""
+        lines = []
+        for name, value in sorted(self.snapshot().items()):
+            kind = 'counter' if name.endswith('_total') else 'gauge'
+            lines.append(f"# TYPE {prefix}{name} {kind}")
+            lines.append(f"{prefix}{name} {value:.15g}")
+        return '\n'.join(lines) + '\n'
+
+
+def start_metrics_server(
+    metrics: PipelineMetrics,
+    host: str = '127.0.0.1',
+    port: int = 8765,
+    max_cycle_age: Optional[float] = None
+) -> ThreadingHTTPServer:
+    """
+    Serve /health (JSON) and /metrics (Prometheus text) from a background thread
+
+    Args:
+        metrics: Metrics to expose
+        host: Interface to bind (local only by default)
+        port: Port to bind (0 picks a free port)
+        max_cycle_age: /health reports 503 when the last successful cycle is
+            older than this many seconds (None disables the check)
+
+    Returns:
+        The running server (call shutdown() to stop it)
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/metrics'):
+                self._send(200, 'text/plain; version=0.0.4', metrics.to_prometheus())
+            elif self.path.startswith('/health'):
+                values = metrics.snapshot()
+                last_success = values['last_cycle_success']
+                # Before the first cycle completes the daemon counts as starting up
+                age = time.time() - (last_success or metrics.started_at)
+                healthy = max_cycle_age is None or age <= max_cycle_age
+                body = {
+                    'status': 'ok' if healthy else 'stale',
+                    'last_cycle_success': last_success or None,
+                    'seconds_since_success': round(age, 1),
+                    'cycles_total': values['cycles_total'],
+                    'uptime_seconds': round(values['uptime_seconds'], 1),
+                }
+                self._send(200 if healthy else 503, 'application/json', json.dumps(body))
+            else:
+                self._send(404, 'text/plain', 'not found\n')
+
+        def _send(self, status, content_type, body):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            # Keep scrape logs readable; health checks would flood them
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    return server
+
+
+def run_daemon(
+    run_cycle: Callable[[], Dict],
+    interval: float,
+    metrics: PipelineMetrics,
+    stop_event: Optional[threading.Event] = None
+) -> None:
+    """
+    Run refresh cycles every `interval` seconds until SIGINT/SIGTERM
+
+    A failing cycle is logged and counted; the daemon keeps going.
+
+    Args:
+        run_cycle: Callable doing one refresh; returns a dict that may hold
+            'months', 'records' and 'changes' counts
+        interval: Seconds between cycle starts
+        metrics: Metrics updated after every cycle
+        stop_event: Event to stop the loop (created and wired to signals if None)
+    """
+    if stop_event is None:
+        stop_event = threading.Event()
+
+        def handle_signal(signum, frame):
+            print(f"\nReceived signal {signum}, stopping after the current cycle...")
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, handle_signal)
+        signal.signal(signal.SIGINT, handle_signal)
+
+    while not stop_event.is_set():
+        started = time.time()
+        metrics.set('last_cycle_started', started)
+        print(f"\n=== Refresh cycle at {time.strftime('%Y-%m-%d %H:%M:%S')} ===")
+
+        try:
+            result = run_cycle() or {}
+            metrics.inc('months_processed_total', result.get('months', 0))
+            metrics.inc('records_scraped_total', result.get('records', 0))
+            metrics.inc('changes_detected_total', result.get('changes', 0))
+            metrics.set('last_cycle_success', time.time())
+        except Exception as e:
+            metrics.inc('cycle_errors_total')
+            print(f"✗ Refresh cycle failed: {e}")
+
+        finished = time.time()
+        metrics.inc('cycles_total')
+        metrics.set('last_cycle_finished', finished)
+        metrics.set('last_cycle_duration_seconds', finished - started)
+
+        wait = max(interval - (finished - started), 0)
+        print(f"Next cycle in {wait:.0f}s")
+        stop_event.wait(wait)
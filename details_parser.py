@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Structured parser for personal_detail.php pages
+Reads a case's details page in one pass over the HTML (html.parser, no
+tree) and returns the case metadata as typed fields plus its note and
+experience texts, each once. Every piece of text is attributed to the
+innermost cell, paragraph or block that holds it, so nested layout tables
+do not repeat their content and the cost stays linear in the page size.
+
+Label/value rows ("Status:" | "Clear") fill the metadata; cells and blocks
+whose class mentions note, comment or experience, and other free text of
+paragraph length, are the notes. Navigation (text that is mostly links) is
+skipped.
+"""
+
+import re
+from datetime import date
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+from normalize import parse_date, parse_int
+
+# Row labels on the details page, lowercased without the colon
+LABELS = {
+    'id': 'id',
+    'user id': 'id',
+    'visa type': 'visa_type',
+    'visa entry': 'visa_entry',
+    'entry': 'visa_entry',
+    'us consulate': 'consulate',
+    'consulate': 'consulate',
+    'major': 'major',
+    'status': 'status',
+    'check date': 'check_date',
+    'complete date': 'complete_date',
+    'clear date': 'complete_date',
+    'waiting day(s)': 'waiting_days',
+    'waiting days': 'waiting_days',
+    'note': 'note',
+    'notes': 'note',
+    'experience': 'experience',
+    'comment': 'experience',
+    'comments': 'experience',
+}
+
+# Free text shorter than this is a label, button or menu entry, not a note
+MIN_NOTE_LENGTH = 30
+
+# Notes kept in CaseDetails.text (the exported `details` field)
+MAX_NOTES = 5
+
+_CELL_TAGS = frozenset({'td', 'th'})
+_BLOCK_TAGS = frozenset({'p', 'div', 'li', 'blockquote', 'pre'})
+_ROW_TAGS = frozenset({'tr'})
+_PARAGRAPH_TAGS = frozenset({'p'})
+# Where the search for an element to close implicitly stops
+_ROW_BOUNDARY = frozenset({'tr', 'table'})
+_TABLE_BOUNDARY = frozenset({'table'})
+_BLOCK_BOUNDARY = frozenset({'table', 'div', 'li', 'blockquote'}) | _CELL_TAGS
+_NOTE_CLASS_RE = re.compile(r'note|comment|experience', re.IGNORECASE)
+_INLINE_LABEL_RE = re.compile(r'([A-Za-z ()]{2,20}):\s*(.+)')
+
+
+class CaseDetails:
+    """Typed contents of one details page"""
+
+    __slots__ = (
+        'casenum', 'id', 'visa_type', 'visa_entry', 'consulate', 'major', 'status',
+        'check_date', 'complete_date', 'waiting_days', 'note', 'experiences',
+    )
+
+    def __init__(self):
+        self.casenum: str = ''
+        self.id: str = ''
+        self.visa_type: str = ''
+        self.visa_entry: str = ''
+        self.consulate: str = ''
+        self.major: str = ''
+        self.status: str = ''
+        self.check_date: Optional[date] = None
+        self.complete_date: Optional[date] = None
+        self.waiting_days: Optional[int] = None
+        self.note: str = ''
+        self.experiences: List[str] = []
+
+    @property
+    def notes(self) -> List[str]:
+        """The note followed by the experiences, each text once"""
+        return _dedupe([self.note] + self.experiences) if self.note else list(self.experiences)
+
+    @property
+    def text(self) -> str:
+        """Notes joined with ' | ' (the scraper's `details` field)"""
+        return ' | '.join(self.notes[:MAX_NOTES])
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"CaseDetails({self.to_dict()!r})"
+
+
+class _Element:
+    """An open cell, block or row and the text attributed to it"""
+
+    __slots__ = ('tag', 'is_note', 'parts', 'link_chars', 'cells')
+
+    def __init__(self, tag: str, is_note: bool = False):
+        self.tag = tag
+        self.is_note = is_note
+        self.parts: List[str] = []
+        self.link_chars = 0
+        # Rows only: (text, is_note, link_chars) of their cells
+        self.cells: Optional[List[Tuple[str, bool, int]]] = [] if tag == 'tr' else None
+
+
+class _DetailsHTMLParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.details = CaseDetails()
+        self._stack: List[_Element] = [_Element('root')]
+        # Open tracked elements by tag, so end tags of anything else
+        # (span, font, b, ...) are dropped without looking at the stack
+        self._open: Dict[str, int] = {}
+        self._link_depth = 0
+        self._experiences: List[str] = []
+
+    # Tree bookkeeping: only tables, rows, cells, blocks and note elements
+    # are tracked; each is pushed and popped once
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self._link_depth += 1
+            return
+        if tag == 'br':
+            self.handle_data(' ')
+            return
+        has_note_class = any(
+            name == 'class' and value and _NOTE_CLASS_RE.search(value) for name, value in attrs
+        )
+        if tag in _CELL_TAGS:
+            # <td> without </td>: a new cell closes the open one of its row
+            self._close_open(_CELL_TAGS, _ROW_BOUNDARY)
+        elif tag == 'tr':
+            self._close_open(_ROW_TAGS, _TABLE_BOUNDARY)
+        elif tag == 'p':
+            self._close_open(_PARAGRAPH_TAGS, _BLOCK_BOUNDARY)
+        elif tag not in _BLOCK_TAGS and tag != 'table' and not has_note_class:
+            # Inline markup: its text belongs to the enclosing element
+            return
+        # Everything inside a note element is note text
+        is_note = has_note_class or self._stack[-1].is_note
+        self._stack.append(_Element(tag, is_note))
+        self._open[tag] = self._open.get(tag, 0) + 1
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._link_depth = max(self._link_depth - 1, 0)
+            return
+        if not self._open.get(tag):
+            return
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                self._pop_to(i)
+                return
+
+    def handle_data(self, data):
+        element = self._stack[-1]
+        element.parts.append(data)
+        if self._link_depth:
+            element.link_chars += len(data.strip())
+
+    def close(self):
+        super().close()
+        self._pop_to(0)
+
+    def _pop_to(self, index: int) -> None:
+        """Close the elements from the top of the stack down to `index`"""
+        while len(self._stack) > index:
+            element = self._stack.pop()
+            if element.tag in self._open:
+                self._open[element.tag] -= 1
+            self._finish(element)
+
+    def _close_open(self, tags, boundaries) -> None:
+        """Close the innermost open element of `tags` (and everything inside
+        it) unless one of `boundaries` comes first"""
+        for i in range(len(self._stack) - 1, 0, -1):
+            tag = self._stack[i].tag
+            if tag in tags:
+                self._pop_to(i)
+                return
+            if tag in boundaries:
+                return
+
+    # Text handling
+
+    def _finish(self, element: _Element) -> None:
+        text = ' '.join(''.join(element.parts).split())
+        if element.tag == 'tr':
+            self._finish_row(element.cells)
+            return
+        if element.tag in _CELL_TAGS and self._stack and self._stack[-1].tag == 'tr':
+            self._stack[-1].cells.append((text, element.is_note, element.link_chars))
+            return
+        self._free_text(text, element.is_note, element.link_chars)
+
+    def _finish_row(self, cells: List[Tuple[str, bool, int]]) -> None:
+        i = 0
+        while i < len(cells):
+            text, is_note, link_chars = cells[i]
+            field = _label_field(text)
+            if field is not None and i + 1 < len(cells):
+                if field:
+                    self._set(field, cells[i + 1][0])
+                i += 2
+                continue
+            self._free_text(text, is_note, link_chars)
+            i += 1
+
+    def _free_text(self, text: str, is_note: bool, link_chars: int) -> None:
+        if not text or link_chars * 2 >= len(text) or text.endswith(':'):
+            return
+        match = _INLINE_LABEL_RE.fullmatch(text)
+        if match:
+            field = LABELS.get(match.group(1).strip().lower())
+            if field:
+                self._set(field, match.group(2))
+                return
+        if is_note or len(text) >= MIN_NOTE_LENGTH:
+            self._experiences.append(text)
+
+    def _set(self, field: str, value: str) -> None:
+        details = self.details
+        if field == 'experience':
+            if value:
+                self._experiences.append(value)
+        elif field in ('check_date', 'complete_date'):
+            if getattr(details, field) is None:
+                setattr(details, field, parse_date(value))
+        elif field == 'waiting_days':
+            if details.waiting_days is None:
+                details.waiting_days = parse_int(value)
+        elif not getattr(details, field):
+            setattr(details, field, value)
+
+    def result(self) -> CaseDetails:
+        details = self.details
+        details.experiences = [
+            text for text in _dedupe(self._experiences)
+            if not details.note or text != details.note
+        ]
+        return details
+
+
+def _label_field(text: str) -> Optional[str]:
+    if not text or len(text) > 30:
+        return None
+    label = text[:-1] if text.endswith(':') else text
+    field = LABELS.get(label.strip().lower())
+    if field:
+        return field
+    # An unknown "Something:" label still pairs with its value cell
+    return '' if text.endswith(':') else None
+
+
+def _dedupe(texts: List[str]) -> List[str]:
+    """Non-empty texts in order, each once"""
+    return list(dict.fromkeys(text for text in texts if text))
+
+
+def parse_details_html(html: str) -> CaseDetails:
+    """
+    Parse a personal_detail.php page
+
+    Args:
+        html: Page HTML
+
+    Returns:
+        CaseDetails with the metadata found (empty fields where the page
+        has none) and the deduplicated note/experience texts
+    """
+    parser = _DetailsHTMLParser()
+    parser.feed(html)
+    parser.close()
+    return parser.result()
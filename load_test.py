@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Load test of the scraper's fetch path against the local mock site
+Starts mock_checkee.py in-process (or targets one already running with
+--url), then has CheckeeScraper fetch month and/or details pages at each
+--concurrency level, one scraper and session per worker thread. Reports
+successful fetches/sec, client-side latency percentiles and what the server
+answered (200, 304, 429, 5xx), so concurrency gains, throttling and
+fault handling can be measured without the live site.
+
+Usage:
+    python load_test.py                                   # 200 month pages at 1, 4 and 16 workers
+    python load_test.py --workload details --requests 1000 --latency-ms 50 --jitter-ms 50
+    python load_test.py --rate-limit 20 --error-rate 0.02 --concurrency 8
+    python load_test.py --parse --concurrency 1,2,4       # include parsing in each request
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+from mock_checkee import MockCheckee, start_mock_server
+from scraper import CheckeeScraper
+
+WORKLOADS = ('month', 'details', 'mixed')
+
+# Largest difference in the share of failed fetches between two concurrency
+# levels for which their throughput is still compared
+MAX_FAILURE_SHARE_DIFFERENCE = 0.05
+
+
+def percentile(values: List[float], q: float) -> float:
+    """q-th percentile (0-100) by nearest rank; 0 for no values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def build_urls(scraper: CheckeeScraper, workload: str, count: int, seed: int = 0) -> List[str]:
+    """
+    Page URLs for one run, discovered through the scraper like a real scrape
+
+    Args:
+        scraper: Scraper pointed at the mock site
+        workload: 'month', 'details' or 'mixed' (one month page per 20 details)
+        count: Number of URLs
+        seed: Seed for picking pages
+    """
+    month_urls = [link['url'] for link in scraper.parse_homepage(refresh=True)]
+    if not month_urls:
+        raise RuntimeError(f"No month links on {scraper.base_url}")
+    details_urls = []
+    if workload != 'month':
+        records = scraper.parse_monthly_page(month_urls[0])
+        details_urls = [record['details_link'] for record in records if record.get('details_link')]
+        if not details_urls:
+            raise RuntimeError(f"No details links on {month_urls[0]}")
+
+    rng = random.Random(seed)
+    urls = []
+    for i in range(count):
+        if workload == 'month' or (workload == 'mixed' and i % 21 == 0):
+            urls.append(month_urls[i % len(month_urls)])
+        else:
+            urls.append(rng.choice(details_urls))
+    return urls
+
+
+def run_load(base_url: str, urls: List[str], concurrency: int, parse: bool = False) -> Dict:
+    """
+    Fetch all URLs with `concurrency` worker threads
+
+    Args:
+        base_url: Site root (each worker primes its session there first)
+        urls: Pages to fetch, shared by the workers
+        concurrency: Worker threads, each with its own CheckeeScraper
+        parse: Time parse_monthly_page/parse_details_page instead of get_page
+
+    Returns:
+        Dictionary with requests, failures, elapsed seconds and latencies
+    """
+    # The month index is never written by get_page; keep it away from the real one anyway
+    index_path = os.path.join(tempfile.gettempdir(), 'load_test_month_index.json')
+    scrapers = [CheckeeScraper(base_url, month_index_path=index_path) for _ in range(concurrency)]
+    pending = list(reversed(urls))
+    lock = threading.Lock()
+    latencies: List[float] = []
+    failures = Counter()
+
+    def fetch(scraper: CheckeeScraper, url: str) -> bool:
+        if not parse:
+            return scraper.get_page(url) is not None
+        # The parsers return nothing both for a failed fetch and for an
+        # empty page, so failures are seen in get_page
+        fetched = []
+        get_page = scraper.get_page
+
+        def tracked_get_page(page_url):
+            html = get_page(page_url)
+            fetched.append(html is not None)
+            return html
+
+        scraper.get_page = tracked_get_page
+        try:
+            if 'personal_detail.php' in url:
+                scraper.parse_details_page(url)
+            else:
+                scraper.parse_monthly_page(url)
+        finally:
+            scraper.get_page = get_page
+        return all(fetched)
+
+    def worker(scraper: CheckeeScraper):
+        while True:
+            with lock:
+                if not pending:
+                    return
+                url = pending.pop()
+            started = time.perf_counter()
+            ok = fetch(scraper, url)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    failures['failed'] += 1
+
+    # get_page prints every failed fetch; with fault injection that is most
+    # of the output, and the counts are reported below instead
+    with contextlib.redirect_stdout(io.StringIO()):
+        for scraper in scrapers:
+            scraper.get_page(base_url)
+        threads = [threading.Thread(target=worker, args=(scraper,)) for scraper in scrapers]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'failed': failures['failed'],
+        'elapsed': elapsed,
+        'latencies': latencies,
+    }
+
+
+def success_rate(result: Dict) -> float:
+    """Successful fetches per second of a run_load() result"""
+    if not result['elapsed']:
+        return 0.0
+    return (result['requests'] - result['failed']) / result['elapsed']
+
+
+def failure_share(result: Dict) -> float:
+    """Share of a run_load() result's fetches that failed"""
+    return result['failed'] / result['requests'] if result['requests'] else 0.0
+
+
+def speedup_summary(first_level: int, first: Dict, last_level: int, last: Dict) -> str:
+    """
+    Speed-up line of the last concurrency level over the first
+
+    Counts successful fetches only, since 429s and 5xx come back faster
+    than pages. When the share of failed fetches differs noticeably
+    between the two levels the ratio is not comparable, and a warning is
+    returned instead.
+    """
+    first_failed = failure_share(first)
+    last_failed = failure_share(last)
+    if abs(last_failed - first_failed) > MAX_FAILURE_SHARE_DIFFERENCE:
+        return (
+            f"✗ No speed-up reported: {first_failed:.0%} of fetches failed at {first_level} workers "
+            f"and {last_failed:.0%} at {last_level} (throttled or failing server)"
+        )
+    baseline = success_rate(first)
+    if not baseline:
+        return f"✗ No speed-up reported: no fetch succeeded at {first_level} workers"
+    return f"Speed-up at {last_level} workers over {first_level}: {success_rate(last) / baseline:.1f}x (successful fetches)"
+
+
+def fetch_stats(base_url: str) -> Dict[str, int]:
+    """Request counters of a mock server (GET /__stats)"""
+    with urlopen(base_url.rstrip('/') + '/__stats', timeout=10) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def format_statuses(before: Dict[str, int], after: Dict[str, int]) -> str:
+    statuses = {
+        key[len('status_'):]: after[key] - before.get(key, 0)
+        for key in sorted(after) if key.startswith('status_') and after[key] - before.get(key, 0)
+    }
+    return ' '.join(f"{status}:{count}" for status, count in statuses.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test CheckeeScraper against the local mock site')
+    parser.add_argument('--url', type=str,
+                        help='Mock server to target (default: start one in-process with the options below)')
+    parser.add_argument('--workload', choices=WORKLOADS, default='month',
+                        help='Pages to fetch (default: month)')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per concurrency level (default: 200)')
+    parser.add_argument('--concurrency', type=str, default='1,4,16',
+                        help='Comma-separated worker counts to compare (default: 1,4,16)')
+    parser.add_argument('--parse', action='store_true', help='Parse each page too (measures fetch + parse)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the data and page choice (default: 0)')
+    site_options = parser.add_argument_group('in-process mock site (see mock_checkee.py)')
+    site_options.add_argument('--months', type=int, default=12, help='Months on the homepage (default: 12)')
+    site_options.add_argument('--rows', type=int, default=200, help='Records per month page (default: 200)')
+    site_options.add_argument('--latency-ms', type=float, default=20.0, help='Server latency (default: 20)')
+    site_options.add_argument('--jitter-ms', type=float, default=10.0, help='Extra random latency (default: 10)')
+    site_options.add_argument('--error-rate', type=float, default=0.0, help='Share of 500/503 answers (default: 0)')
+    site_options.add_argument('--timeout-rate', type=float, default=0.0,
+                              help='Share of requests stalled past the scraper timeout (default: 0)')
+    site_options.add_argument('--hang-seconds', type=float, default=35.0, help='Stall of a timed-out request (default: 35)')
+    site_options.add_argument('--rate-limit', type=float, default=0.0, help='Requests/sec before 429s (default: 0, unlimited)')
+    site_options.add_argument('--burst', type=int, default=10, help='Requests allowed at once above the rate (default: 10)')
+    args = parser.parse_args()
+
+    try:
+        levels = [int(level) for level in args.concurrency.split(',')]
+    except ValueError:
+        parser.error('--concurrency must be comma-separated integers')
+    if not levels or min(levels) < 1:
+        parser.error('--concurrency levels must be at least 1')
+
+    server = None
+    base_url = args.url
+    if base_url:
+        if urlparse(base_url).hostname not in ('127.0.0.1', 'localhost', '::1'):
+            # This tool generates load; never point it at the real site
+            parser.error('--url must be a local mock server (localhost)')
+    else:
+        site = MockCheckee(
+            months=args.months,
+            rows=args.rows,
+            seed=args.seed,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate,
+            timeout_rate=args.timeout_rate,
+            hang_seconds=args.hang_seconds,
+            rate_limit=args.rate_limit,
+            burst=args.burst
+        )
+        server = start_mock_server(site)
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        print(f"✓ Mock site at {base_url} ({args.months} months x {args.rows} records, "
+              f"{args.latency_ms:g}+{args.jitter_ms:g}ms latency)")
+
+    try:
+        with tempfile.TemporaryDirectory() as index_dir:
+            discovery = CheckeeScraper(base_url, month_index_path=os.path.join(index_dir, 'month_index.json'))
+            with contextlib.redirect_stdout(io.StringIO()):
+                urls = build_urls(discovery, args.workload, args.requests, args.seed)
+
+        mode = 'fetch + parse' if args.parse else 'fetch'
+        print(f"{args.requests} {args.workload} requests per level ({mode})\n")
+        print(f"  {'workers':>7} {'ok/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>7}  server")
+        results = []
+        for level in levels:
+            before = fetch_stats(base_url)
+            result = run_load(base_url, urls, level, parse=args.parse)
+            after = fetch_stats(base_url)
+            results.append(result)
+            latencies = result['latencies']
+            print(
+                f"  {level:>7} {success_rate(result):>9.1f} {percentile(latencies, 50) * 1000:>8.1f} "
+                f"{percentile(latencies, 90) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} "
+                f"{max(latencies, default=0) * 1000:>8.1f} {result['failed']:>7}  "
+                f"{format_statuses(before, after)}"
+            )
+        if len(levels) > 1:
+            print(f"\n{speedup_summary(levels[0], results[0], levels[-1], results[-1])}")
+    finally:
+        if server:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
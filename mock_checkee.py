@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for checkee.info
+Serves a generated homepage with month links, month pages in the site's
+table layout and personal_detail.php pages, so the scraper can be load
+tested and fault injected without touching the live site. Latency, error
+and timeout rates, throttling (429 with Retry-After) and ETag handling are
+configurable; pages are generated from a seed, so every run serves the
+same data.
+
+Usage:
+    python mock_checkee.py --port 8900 --months 12 --rows 500
+    python mock_checkee.py --latency-ms 80 --jitter-ms 40 --error-rate 0.05 --rate-limit 20
+    python run_scraper.py ...   # with CheckeeScraper(base_url='http://127.0.0.1:8900')
+
+GET /__stats returns the requests served so far by status and page kind.
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from bench_records import CONSULATES, ENTRIES, MAJORS, STATUSES, VISA_TYPES
+
+MONTH_HEADERS = [
+    'Update', 'ID', 'Visa Type', 'Visa Entry', 'US Consulate', 'Major', 'Status',
+    'Check Date', 'Complete Date', 'Waiting Day(s)', 'Details',
+]
+
+NOTES = [
+    'Submitted DS-160 and interviewed the same week. Officer kept the passport and I-797.',
+    'Got the 221(g) white form and was asked for CV, study plan and publication list.',
+    'Sent the additional documents by email, no reply for six weeks.',
+    'Called the consulate twice, they said the case is under administrative processing.',
+    'Status changed to issued after the second follow-up email. Passport back in four days.',
+]
+
+ETAG_MODES = ('strong', 'weak', 'off')
+
+
+def _shift_month(month: str, offset: int) -> str:
+    year, number = map(int, month.split('-'))
+    index = year * 12 + number - 1 - offset
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class MockCheckee:
+    """Generated site content, fault injection and request counters"""
+
+    def __init__(
+        self,
+        months: int = 12,
+        rows: int = 200,
+        latest_month: Optional[str] = None,
+        seed: int = 0,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        hang_seconds: float = 35.0,
+        rate_limit: float = 0.0,
+        burst: int = 10,
+        retry_after: int = 1,
+        etag: str = 'strong',
+        require_cookie: bool = False
+    ):
+        """
+        Args:
+            months: Month links on the homepage
+            rows: Records per month page
+            latest_month: Newest month (YYYY-MM, default: the current UTC month)
+            seed: Seed of the generated records
+            latency_ms: Delay added to every response
+            jitter_ms: Extra uniformly random delay (0 to jitter_ms)
+            error_rate: Share of requests answered with a 500/503
+            timeout_rate: Share of requests that stall for hang_seconds first
+            hang_seconds: Stall of a timed-out request (the scraper gives up after 30s)
+            rate_limit: Requests per second before 429s (token bucket; 0 disables)
+            burst: Requests allowed at once above the rate
+            retry_after: Retry-After seconds sent with a 429
+            etag: 'strong', 'weak' or 'off'; with an ETag, a matching
+                If-None-Match is answered with 304
+            require_cookie: Answer 403 to pages other than the homepage
+                until the client has the homepage's session cookie
+        """
+        if etag not in ETAG_MODES:
+            raise ValueError(f"etag must be one of {', '.join(ETAG_MODES)}")
+        self.latest_month = latest_month or datetime.now(timezone.utc).strftime('%Y-%m')
+        self.month_list = [_shift_month(self.latest_month, i) for i in range(months)]
+        self.rows = rows
+        self.seed = seed
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.retry_after = retry_after
+        self.etag = etag
+        self.require_cookie = require_cookie
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self.stats: Counter = Counter()
+
+    # Content
+
+    def month_records(self, month: str) -> List[Dict]:
+        """The generated records of one month page"""
+        return _month_records(month, self.rows, self.seed) if month in self.month_list else []
+
+    def homepage(self) -> str:
+        links = '\n'.join(
+            f'<tr><td>{month}</td><td><a href="./main.php?dispdate={month}">Track</a></td></tr>'
+            for month in self.month_list
+        )
+        return (
+            '<html><head><title>Checkee: Visa Check Status Tracker</title></head><body>\n'
+            '<table class="menu"><tr><td><a href="./">Home</a> | <a href="./add_case.php">Add your case</a>'
+            ' | Tracker</td></tr></table>\n'
+            '<table border="1"><tr><th>Month</th><th>Cases</th></tr>\n'
+            f'{links}\n</table>\n</body></html>\n'
+        )
+
+    def month_page(self, month: str) -> str:
+        header = ''.join(f'<th>{name}</th>' for name in MONTH_HEADERS)
+        rows = []
+        for record in self.month_records(month):
+            note = record['note']
+            title = f' title="{html.escape(note)}"' if note else ''
+            image = '<img src="./images/notes.png">' if note else 'details'
+            cells = [
+                f'<a href="./update.php?casenum={record["casenum"]}">Update</a>',
+                record['id'], record['visa_type'], record['visa_entry'], record['consulate'],
+                html.escape(record['major']), record['status'], record['check_date'],
+                record['complete_date'], str(record['waiting_days']),
+                f'<a href="./personal_detail.php?casenum={record["casenum"]}"{title}>{image}</a>',
+            ]
+            rows.append('<tr>' + ''.join(f'<td>{cell}</td>' for cell in cells) + '</tr>')
+        return (
+            f'<html><head><title>Checkee: {month}</title></head><body>\n'
+            '<table class="menu"><tr><td><a href="./">Home</a> | Tracker</td></tr></table>\n'
+            f'<table border="1" class="cases">\n<tr>{header}</tr>\n' + '\n'.join(rows) + '\n</table>\n'
+            '</body></html>\n'
+        )
+
+    def details_page(self, casenum: str) -> Optional[str]:
+        record = _case(casenum, self.month_list, self.rows, self.seed)
+        if record is None:
+            return None
+        fields = [
+            ('ID', record['id']),
+            ('Visa Type', record['visa_type']),
+            ('Visa Entry', record['visa_entry']),
+            ('US Consulate', record['consulate']),
+            ('Major', html.escape(record['major'])),
+            ('Status', record['status']),
+            ('Check Date', record['check_date']),
+            ('Complete Date', record['complete_date']),
+            ('Waiting Day(s)', str(record['waiting_days'])),
+        ]
+        rows = ''.join(f'<tr><td class="label">{name}:</td><td>{value}</td></tr>\n' for name, value in fields)
+        note = html.escape(record['note'])
+        return (
+            f'<html><head><title>Checkee: case {casenum}</title></head><body>\n'
+            '<table width="100%"><tr><td>\n'
+            '<table class="menu"><tr><td><a href="./">Home</a> | <a href="./add_case.php">Add your case</a>'
+            ' | Tracker</td></tr></table>\n'
+            '<table width="100%"><tr><td>\n'
+            f'<table border="1" class="detail">\n{rows}'
+            f'<tr><td class="label">Note:</td><td class="note">{note}</td></tr>\n</table>\n'
+            f'<div class="experience"><p>{note}</p></div>\n'
+            '</td></tr></table>\n'
+            '</td></tr></table>\n</body></html>\n'
+        )
+
+    def render(self, path: str, query: Dict[str, List[str]]) -> Tuple[str, Optional[str]]:
+        """Page kind and HTML for a request (None: not found)"""
+        if path in ('', '/', '/index.php'):
+            return 'homepage', self.homepage()
+        if path == '/main.php':
+            month = (query.get('dispdate') or [''])[0]
+            return 'month', self.month_page(month)
+        if path == '/personal_detail.php':
+            return 'details', self.details_page((query.get('casenum') or [''])[0])
+        return 'other', None
+
+    # Faults
+
+    def take_token(self) -> bool:
+        """Whether the rate limit lets one more request through"""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate_limit)
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def draw_fault(self) -> Tuple[float, Optional[int]]:
+        """Delay of one request and the error status to answer with (None: no error)"""
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            draw = self._random.random()
+            error_status = self._random.choice((500, 503))
+        if draw < self.timeout_rate:
+            return delay + self.hang_seconds, None
+        if draw < self.timeout_rate + self.error_rate:
+            return delay, error_status
+        return delay, None
+
+    def count(self, kind: str, status: int) -> None:
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats[f'{kind}_{status}'] += 1
+            self.stats[f'status_{status}'] += 1
+
+    def stats_snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+
+@lru_cache(maxsize=256)
+def _month_records(month: str, rows: int, seed: int) -> List[Dict]:
+    rng = random.Random(f'{seed}:{month}')
+    year, number = map(int, month.split('-'))
+    # Unique across months: the month's index times a range no month fills
+    first_casenum = (year * 12 + number) * 100000
+    records = []
+    for i in range(rows):
+        day = 1 + rng.randrange(28)
+        status = rng.choice(STATUSES)
+        check_date = f'{month}-{day:02d}'
+        waiting_days = rng.randrange(1, 200)
+        records.append({
+            'casenum': str(first_casenum + i),
+            'id': f'user{rng.randrange(100000)}',
+            'visa_type': rng.choice(VISA_TYPES),
+            'visa_entry': rng.choice(ENTRIES),
+            'consulate': rng.choice(CONSULATES),
+            'major': rng.choice(MAJORS),
+            'status': status,
+            'check_date': check_date,
+            'complete_date': '0000-00-00' if status == 'Pending' else f'{_shift_month(month, -1)}-{day:02d}',
+            'waiting_days': waiting_days,
+            'note': rng.choice(NOTES) if rng.random() < 0.2 else '',
+        })
+    return records
+
+
+def _case(casenum: str, months: List[str], rows: int, seed: int) -> Optional[Dict]:
+    if not casenum.isdigit():
+        return None
+    index, position = divmod(int(casenum), 100000)
+    month = f"{(index - 1) // 12:04d}-{(index - 1) % 12 + 1:02d}"
+    if month not in months or position >= rows:
+        return None
+    return _month_records(month, rows, seed)[position]
+
+
+def start_mock_server(site: MockCheckee, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """
+    Serve a MockCheckee from a background thread
+
+    Args:
+        site: Content and fault settings
+        host: Interface to bind (local only by default)
+        port: Port to bind (0 picks a free port)
+
+    Returns:
+        The running server; its base URL is http://host:server.server_port
+        (call shutdown() to stop it)
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, like the real site; the scraper reuses one session
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            # Headers and body go out in separate writes; without this, Nagle
+            # and delayed ACKs add ~40ms to every keep-alive response
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/__stats':
+                self._send(200, json.dumps(site.stats_snapshot()), 'application/json')
+                return
+
+            kind, body = site.render(url.path, parse_qs(url.query))
+            if not site.take_token():
+                site.count(kind, 429)
+                self._send(429, 'Too Many Requests\n', headers={'Retry-After': str(site.retry_after)})
+                return
+
+            delay, error_status = site.draw_fault()
+            if delay:
+                time.sleep(delay)
+            if error_status:
+                site.count(kind, error_status)
+                self._send(error_status, 'Server Error\n')
+                return
+            if body is None:
+                site.count(kind, 404)
+                self._send(404, 'Not Found\n')
+                return
+            if site.require_cookie and kind != 'homepage' and 'PHPSESSID=' not in (self.headers.get('Cookie') or ''):
+                site.count(kind, 403)
+                self._send(403, 'Forbidden\n')
+                return
+
+            headers = {}
+            if kind == 'homepage':
+                headers['Set-Cookie'] = 'PHPSESSID=mock; Path=/'
+            if site.etag != 'off':
+                tag = '"' + hashlib.sha1(body.encode('utf-8')).hexdigest()[:16] + '"'
+                headers['ETag'] = 'W/' + tag if site.etag == 'weak' else tag
+                if headers['ETag'] in (self.headers.get('If-None-Match') or ''):
+                    site.count(kind, 304)
+                    self._send(304, '', headers=headers)
+                    return
+            site.count(kind, 200)
+            self._send(200, body, headers=headers)
+
+        def _send(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+            data = body.encode('utf-8')
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                if status != 304:
+                    self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if status != 304:
+                    self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up (a timed-out request)
+                self.close_connection = True
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='mock-checkee', daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for checkee.info')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8900, help='Port to bind (default: 8900)')
+    parser.add_argument('--months', type=int, default=12, help='Month links on the homepage (default: 12)')
+    parser.add_argument('--rows', type=int, default=200, help='Records per month page (default: 200)')
+    parser.add_argument('--latest-month', type=str, help='Newest month, YYYY-MM (default: current month)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generated records (default: 0)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay added to every response (default: 0)')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Extra random delay up to this much (default: 0)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 500/503 (default: 0)')
+    parser.add_argument('--timeout-rate', type=float, default=0.0,
+                        help='Share of requests that stall for --hang-seconds (default: 0)')
+    parser.add_argument('--hang-seconds', type=float, default=35.0,
+                        help='Stall of a timed-out request (default: 35, past the scraper\'s 30s timeout)')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='Requests per second before answering 429 (default: 0, unlimited)')
+    parser.add_argument('--burst', type=int, default=10, help='Requests allowed at once above the rate (default: 10)')
+    parser.add_argument('--etag', choices=ETAG_MODES, default='strong',
+                        help='ETag sent with pages; If-None-Match gets a 304 (default: strong)')
+    parser.add_argument('--require-cookie', action='store_true',
+                        help='Answer 403 until the client has the homepage session cookie')
+    args = parser.parse_args()
+
+    site = MockCheckee(
+        months=args.months,
+        rows=args.rows,
+        latest_month=args.latest_month,
+        seed=args.seed,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        etag=args.etag,
+        require_cookie=args.require_cookie
+    )
+    server = start_mock_server(site, args.host, args.port)
+    print(f"✓ Mock checkee.info at http://{args.host}:{server.server_port}/ "
+          f"({len(site.month_list)} months x {site.rows} records, stats at /__stats)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Local cache of the checkee.info month index
+Keeps the month links parsed from the homepage in a small JSON file with a
+TTL and the hash of the homepage they came from, so the homepage is only
+re-parsed when it actually changed
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'month_index.json')
+
+# How long a cached index is used without looking at the homepage again
+DEFAULT_TTL_SECONDS = 6 * 3600
+
+
+def homepage_hash(html: str) -> str:
+    """SHA-256 of the homepage HTML"""
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+
+class MonthIndex:
+    """Month links of one site, persisted to a JSON file"""
+
+    def __init__(self, base_url: str, path: str = DEFAULT_INDEX_PATH, ttl: float = DEFAULT_TTL_SECONDS):
+        """
+        Load the cached index if there is one for this site
+
+        Args:
+            base_url: Site the links belong to (a cache for another site is ignored)
+            path: JSON file holding the index
+            ttl: Seconds a cached index stays fresh
+        """
+        self.base_url = base_url
+        self.path = path
+        self.ttl = ttl
+        self.months: List[Dict] = []
+        self.hash: Optional[str] = None
+        self.checked_at = 0.0
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('base_url') != self.base_url:
+            return
+        self.months = data.get('months') or []
+        self.hash = data.get('hash')
+        self.checked_at = float(data.get('checked_at') or 0)
+
+    def save(self) -> None:
+        """Write the index (atomically, so concurrent runs never see half a file)"""
+        data = {
+            'base_url': self.base_url,
+            'hash': self.hash,
+            'checked_at': self.checked_at,
+            'months': self.months,
+        }
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: Could not save month index to {self.path}: {e}")
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        """Whether the cached months can be used without checking the homepage"""
+        if not self.months:
+            return False
+        if now is None:
+            now = time.time()
+        return now - self.checked_at < self.ttl
+
+    def matches(self, html: str) -> bool:
+        """Whether the cached months were parsed from this exact homepage"""
+        return bool(self.months) and self.hash == homepage_hash(html)
+
+    def touch(self) -> None:
+        """Mark the cached months as checked against the current homepage"""
+        self.checked_at = time.time()
+        self.save()
+
+    def update(self, html: str, months: List[Dict]) -> None:
+        """Replace the cached months with ones parsed from `html`"""
+        self.months = months
+        self.hash = homepage_hash(html)
+        self.touch()
+
+    def get(self, month: str) -> Optional[Dict]:
+        """Cached link of one month (YYYY-MM), or None"""
+        for link in self.months:
+            if link['month'] == month:
+                return link
+        return None
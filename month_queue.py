@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Month work queue
+Months from parse_homepage become jobs with leases, so several worker
+processes (on one host or several) can share a backfill or a nightly
+refresh without two of them scraping the same month. A worker claims one
+job at a time, heartbeats while it scrapes and saves, and records the
+outcome; when a worker dies its lease expires and the month is retried by
+another one, up to max_attempts.
+
+SqliteMonthQueue keeps the jobs in a local SQLite file (single host);
+SupabaseMonthQueue uses the shared month_jobs table (migration 008).
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing, contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Seconds a claimed job stays leased without a heartbeat
+DEFAULT_LEASE_SECONDS = 300
+
+# Claims of one month before it is marked failed
+DEFAULT_MAX_ATTEMPTS = 3
+
+JOB_STATUSES = ('pending', 'running', 'done', 'failed')
+
+
+class LeaseLost(Exception):
+    """The job's lease expired and may now belong to another worker"""
+
+
+def default_worker_id() -> str:
+    """Identify this process across hosts: hostname:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def default_run_id() -> str:
+    """Run id for a nightly refresh: today's UTC date (YYYY-MM-DD)"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+class MonthQueue(ABC):
+    """Common interface of the queue backends"""
+
+    def __init__(self, lease_seconds: int = DEFAULT_LEASE_SECONDS, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def enqueue(self, run_id: str, month_links: List[Dict]) -> int:
+        """
+        Add month jobs to a run (months already in the run are left alone)
+
+        Args:
+            run_id: Run the jobs belong to, e.g. '2025-06-01' or 'backfill'
+            month_links: Dictionaries with 'month' and 'url', in scrape order
+
+        Returns:
+            Number of jobs added
+        """
+
+    @abstractmethod
+    def claim(self, run_id: str, worker_id: str) -> Optional[Dict]:
+        """
+        Lease the next pending (or abandoned) job of a run
+
+        Returns:
+            Job dictionary (run_id, month, url, attempts, ...), or None when
+            the run has no claimable job left
+        """
+
+    @abstractmethod
+    def heartbeat(self, job: Dict, worker_id: str) -> bool:
+        """Extend the lease of a job; False when it was lost"""
+
+    @abstractmethod
+    def complete(
+        self,
+        job: Dict,
+        worker_id: str,
+        snapshot_id: Optional[str] = None,
+        records: Optional[int] = None,
+        changes: Optional[int] = None
+    ) -> bool:
+        """Record a finished job; False when the lease was lost"""
+
+    @abstractmethod
+    def fail(self, job: Dict, worker_id: str, error: str) -> Optional[str]:
+        """
+        Record a failed attempt
+
+        Returns:
+            The job's new status ('pending' to retry, or 'failed'), None if
+            the lease was lost
+        """
+
+    @abstractmethod
+    def jobs(self, run_id: str) -> List[Dict]:
+        """All jobs of a run"""
+
+    def counts(self, run_id: str) -> Dict[str, int]:
+        """Number of jobs of a run per status"""
+        counts = {status: 0 for status in JOB_STATUSES}
+        for job in self.jobs(run_id):
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return counts
+
+
+class SqliteMonthQueue(MonthQueue):
+    """Jobs in a local SQLite file, shared by the worker processes of one host"""
+
+    def __init__(self, path: str, **kwargs):
+        """
+        Open (and create if needed) the queue file
+
+        Args:
+            path: SQLite database file
+            **kwargs: lease_seconds, max_attempts
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS month_jobs (
+                    run_id TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    position INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    worker_id TEXT,
+                    lease_expires_at REAL,
+                    heartbeat_at REAL,
+                    started_at REAL,
+                    completed_at REAL,
+                    snapshot_id TEXT,
+                    records INTEGER,
+                    changes INTEGER,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (run_id, month)
+                )
+            """)
+
+    @contextmanager
+    def _transaction(self):
+        """A connection inside BEGIN IMMEDIATE, so claims never race"""
+        # One connection per operation: heartbeats run on another thread
+        with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as conn:
+            conn.row_factory = sqlite3.Row
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def enqueue(self, run_id: str, month_links: List[Dict]) -> int:
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.executemany(
+                """
+                INSERT OR IGNORE INTO month_jobs (run_id, month, url, position, max_attempts, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (run_id, link['month'], link['url'], position, self.max_attempts, now)
+                    for position, link in enumerate(month_links)
+                ]
+            )
+            return cursor.rowcount
+
+    def claim(self, run_id: str, worker_id: str) -> Optional[Dict]:
+        now = time.time()
+        with self._transaction() as conn:
+            # Expired leases that used up their attempts will not be retried
+            conn.execute(
+                """
+                UPDATE month_jobs
+                SET status = 'failed', last_error = COALESCE(last_error, 'lease expired')
+                WHERE run_id = ? AND status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts
+                """,
+                (run_id, now)
+            )
+            row = conn.execute(
+                """
+                SELECT month FROM month_jobs
+                WHERE run_id = ?
+                  AND (status = 'pending' OR (status = 'running' AND lease_expires_at < ?))
+                  AND attempts < max_attempts
+                ORDER BY position, month
+                LIMIT 1
+                """,
+                (run_id, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                """
+                UPDATE month_jobs
+                SET status = 'running', worker_id = ?, attempts = attempts + 1,
+                    lease_expires_at = ?, heartbeat_at = ?, started_at = ?
+                WHERE run_id = ? AND month = ?
+                """,
+                (worker_id, now + self.lease_seconds, now, now, run_id, row['month'])
+            )
+            job = conn.execute(
+                'SELECT * FROM month_jobs WHERE run_id = ? AND month = ?',
+                (run_id, row['month'])
+            ).fetchone()
+            return dict(job)
+
+    def heartbeat(self, job: Dict, worker_id: str) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE month_jobs SET lease_expires_at = ?, heartbeat_at = ?
+                WHERE run_id = ? AND month = ? AND status = 'running' AND worker_id = ?
+                """,
+                (now + self.lease_seconds, now, job['run_id'], job['month'], worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job, worker_id, snapshot_id=None, records=None, changes=None) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE month_jobs
+                SET status = 'done', completed_at = ?, lease_expires_at = NULL,
+                    snapshot_id = ?, records = ?, changes = ?, last_error = NULL
+                WHERE run_id = ? AND month = ? AND status = 'running' AND worker_id = ?
+                """,
+                (time.time(), snapshot_id, records, changes, job['run_id'], job['month'], worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job: Dict, worker_id: str, error: str) -> Optional[str]:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE month_jobs
+                SET status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+                    lease_expires_at = NULL, last_error = ?
+                WHERE run_id = ? AND month = ? AND status = 'running' AND worker_id = ?
+                """,
+                (error, job['run_id'], job['month'], worker_id)
+            )
+            if cursor.rowcount != 1:
+                return None
+            row = conn.execute(
+                'SELECT status FROM month_jobs WHERE run_id = ? AND month = ?',
+                (job['run_id'], job['month'])
+            ).fetchone()
+            return row['status']
+
+    def jobs(self, run_id: str) -> List[Dict]:
+        with self._transaction() as conn:
+            rows = conn.execute(
+                'SELECT * FROM month_jobs WHERE run_id = ? ORDER BY position, month',
+                (run_id,)
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+
+class SupabaseMonthQueue(MonthQueue):
+    """Jobs in the month_jobs table, shared by workers on any host"""
+
+    def __init__(self, db_client, **kwargs):
+        """
+        Args:
+            db_client: SupabaseClient
+            **kwargs: lease_seconds, max_attempts
+        """
+        super().__init__(**kwargs)
+        self.db = db_client
+
+    def enqueue(self, run_id: str, month_links: List[Dict]) -> int:
+        return self.db.enqueue_month_jobs(run_id, month_links, self.max_attempts)
+
+    def claim(self, run_id: str, worker_id: str) -> Optional[Dict]:
+        return self.db.claim_month_job(run_id, worker_id, self.lease_seconds)
+
+    def heartbeat(self, job: Dict, worker_id: str) -> bool:
+        return self.db.heartbeat_month_job(job['run_id'], job['month'], worker_id, self.lease_seconds)
+
+    def complete(self, job, worker_id, snapshot_id=None, records=None, changes=None) -> bool:
+        return self.db.complete_month_job(job['run_id'], job['month'], worker_id, snapshot_id, records, changes)
+
+    def fail(self, job: Dict, worker_id: str, error: str) -> Optional[str]:
+        return self.db.fail_month_job(job['run_id'], job['month'], worker_id, error)
+
+    def jobs(self, run_id: str) -> List[Dict]:
+        return self.db.get_month_jobs(run_id)
+
+
+class LeaseKeeper:
+    """
+    Heartbeat a claimed job from a background thread while it is processed
+
+    Use as a context manager around the work; call renew() right before a
+    write that must not happen once another worker owns the month.
+    """
+
+    def __init__(self, queue: MonthQueue, job: Dict, worker_id: str):
+        self.queue = queue
+        self.job = job
+        self.worker_id = worker_id
+        self.lost = False
+        # Three heartbeats per lease, so one slow or failed call is harmless
+        self.interval = max(queue.lease_seconds / 3, 1)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{job['month']}", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.queue.heartbeat(self.job, self.worker_id):
+                    self.lost = True
+                    return
+            except Exception as e:
+                print(f"  Warning: Heartbeat for {self.job['month']} failed: {e}")
+
+    def renew(self) -> bool:
+        """Heartbeat now; False (and lost) when the lease is gone"""
+        if not self.lost and not self.queue.heartbeat(self.job, self.worker_id):
+            self.lost = True
+        return not self.lost
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Typed record normalization
+Converts each row once, right after parsing, into the typed form every later
+stage consumes: check/complete dates as datetime.date (None for checkee's
+'0000-00-00' and anything that is not a date), waiting_days as int (None if
+not a number) and the case key in `casenum`. A page only has a few hundred
+distinct date strings, so dates are parsed through a memo cache.
+"""
+
+import re
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from visa_record import VisaRecord, as_record, case_key
+
+DATE_FIELDS = ('check_date', 'complete_date')
+
+# Same inputs datetime.strptime(value, '%Y-%m-%d') accepts in practice
+_DATE_RE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})')
+
+# Same inputs int() accepts for the strings checkee serves
+_INT_RE = re.compile(r'\s*[+-]?\d+\s*')
+
+
+@lru_cache(maxsize=8192)
+def _parse_date_text(text: str) -> Optional[date]:
+    match = _DATE_RE.fullmatch(text)
+    if not match:
+        return None
+    try:
+        return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    except ValueError:
+        # '0000-00-00' (not completed yet) and impossible days like 2025-02-30
+        return None
+
+
+def parse_date(value) -> Optional[date]:
+    """
+    Parse a YYYY-MM-DD date
+
+    Args:
+        value: Date string, date object (returned as is) or None
+
+    Returns:
+        The date, or None for empty, '0000-00-00' and invalid values
+    """
+    if isinstance(value, date):
+        return value
+    if not value:
+        return None
+    return _parse_date_text(value if type(value) is str else str(value))
+
+
+def parse_int(value) -> Optional[int]:
+    """
+    Parse an integer the way int() does
+
+    Args:
+        value: String, number or None
+
+    Returns:
+        The integer, or None for empty and non-numeric values
+    """
+    if type(value) is int:
+        return value
+    if not value:
+        return None
+    if type(value) is str:
+        # isdigit() alone also accepts digits int() rejects, such as "²"
+        if (value.isascii() and value.isdigit()) or _INT_RE.fullmatch(value):
+            return int(value)
+        return None
+    try:
+        return int(value)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def normalize_record(record) -> VisaRecord:
+    """
+    Convert a scraped record or database row to the typed form (idempotent)
+
+    Args:
+        record: VisaRecord (converted in place) or dictionary
+
+    Returns:
+        The typed VisaRecord, with `casenum` set to its case key
+    """
+    record = as_record(record)
+    for name in DATE_FIELDS:
+        value = getattr(record, name, None)
+        if value is not None:
+            setattr(record, name, parse_date(value))
+    if hasattr(record, 'waiting_days'):
+        record.waiting_days = parse_int(record.waiting_days)
+    record.casenum = case_key(record)
+    return record
+
+
+def normalize_records(records: Iterable[Dict]) -> List[VisaRecord]:
+    """normalize_record() for every record"""
+    return [normalize_record(record) for record in records]
+
+
+def normalize_row(row: Dict) -> VisaRecord:
+    """Typed record from a `records` table row (user_id maps back to id)"""
+    return normalize_record(VisaRecord.from_row(row))
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Full-text search over case notes and details
+The latest note/details text of each case is kept in a search index that is
+updated incrementally at ingest: the case_notes table (tsvector + trigram
+indexes, migration 009) in Supabase, or an SQLite FTS5 file for local
+scrapes. Both answer search_notes(query, filters, limit) with casenums
+ranked best match first.
+
+Usage:
+    python note_search.py "administrative processing"
+    python note_search.py "tsinghua physics" --consulate BeiJing --limit 5
+    python note_search.py "name check" --index notes.db
+"""
+
+import argparse
+import re
+from typing import Dict, Iterable, List, Optional
+
+from visa_record import case_key
+
+# Changes after which a case's indexed text or filter columns are stale
+INDEXED_CHANGE_TYPES = frozenset({
+    'new_record', 'reappeared', 'case_moved', 'note_added', 'note_updated', 'note_removed', 'status_change'
+})
+
+# Filters search_notes understands (equality on the case's latest value)
+FILTER_FIELDS = ('month', 'consulate', 'visa_type', 'status')
+
+# Relative weight of each text column: major, note, details
+COLUMN_WEIGHTS = (4.0, 2.0, 1.0)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def note_row(record: Dict, month: Optional[str] = None) -> Dict:
+    """A case_notes row for a record (search text plus filter columns)"""
+    return {
+        'casenum': case_key(record),
+        'month': month or record.get('month') or '',
+        'user_id': record.get('id') or '',
+        'visa_type': record.get('visa_type') or '',
+        'consulate': record.get('consulate') or '',
+        'major': record.get('major') or '',
+        'status': record.get('status') or '',
+        'note': record.get('note') or '',
+        'details': record.get('details') or '',
+    }
+
+
+def note_rows(records: Iterable[Dict], changes: Optional[List[Dict]] = None, month: Optional[str] = None) -> List[Dict]:
+    """
+    Rows to upsert into the search index after a scrape
+
+    details are not diffed, so a record scraped with details is re-indexed
+    whenever changes are given; a changed case is re-indexed even with no
+    text left, so a cleared note stops matching.
+
+    Args:
+        records: Records of the new snapshot
+        changes: Changes detected for them; None indexes every record with
+            note or details text (no baseline to compare against, or
+            detection was skipped)
+        month: Month in YYYY-MM format (default: each record's month)
+
+    Returns:
+        case_notes rows of the cases whose indexed text or filter columns
+        may have changed
+    """
+    keys = None
+    if changes is not None:
+        keys = {c['casenum'] for c in changes if c['change_type'] in INDEXED_CHANGE_TYPES}
+
+    rows = {}
+    for record in records:
+        key = case_key(record)
+        if not key:
+            continue
+        if keys is None:
+            indexed = bool(record.get('note') or record.get('details'))
+        else:
+            indexed = key in keys or 'details' in record
+        if indexed:
+            rows[key] = note_row(record, month)
+    return list(rows.values())
+
+
+def fts_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 MATCH expression that cannot be a syntax error
+
+    Every word must match (implicit AND); the last one also matches as a
+    prefix, so results show up while a word is still being typed.
+    """
+    words = _WORD_RE.findall(query)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class SqliteNoteIndex:
+    """Local FTS5 index with the same rows and search API as case_notes"""
+
+    def __init__(self, path: str):
+        """
+        Open (and create if needed) the index file
+
+        Args:
+            path: SQLite database file
+        """
+        # Imported here: the pipeline only needs note_rows from this module
+        import sqlite3
+
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS case_notes (
+                casenum TEXT PRIMARY KEY,
+                month TEXT NOT NULL,
+                user_id TEXT,
+                visa_type TEXT,
+                consulate TEXT,
+                major TEXT,
+                status TEXT,
+                note TEXT NOT NULL DEFAULT '',
+                details TEXT NOT NULL DEFAULT ''
+            );
+
+            -- External-content FTS table: the text lives once, in case_notes
+            CREATE VIRTUAL TABLE IF NOT EXISTS case_notes_fts USING fts5(
+                major, note, details,
+                content='case_notes', content_rowid='rowid',
+                tokenize='porter unicode61'
+            );
+
+            -- Keep the FTS index in step with every insert, upsert and delete
+            CREATE TRIGGER IF NOT EXISTS case_notes_ai AFTER INSERT ON case_notes BEGIN
+                INSERT INTO case_notes_fts(rowid, major, note, details)
+                VALUES (new.rowid, new.major, new.note, new.details);
+            END;
+            CREATE TRIGGER IF NOT EXISTS case_notes_ad AFTER DELETE ON case_notes BEGIN
+                INSERT INTO case_notes_fts(case_notes_fts, rowid, major, note, details)
+                VALUES ('delete', old.rowid, old.major, old.note, old.details);
+            END;
+            CREATE TRIGGER IF NOT EXISTS case_notes_au AFTER UPDATE ON case_notes BEGIN
+                INSERT INTO case_notes_fts(case_notes_fts, rowid, major, note, details)
+                VALUES ('delete', old.rowid, old.major, old.note, old.details);
+                INSERT INTO case_notes_fts(rowid, major, note, details)
+                VALUES (new.rowid, new.major, new.note, new.details);
+            END;
+        """)
+
+    def save_case_notes(self, rows: List[Dict]) -> None:
+        """Insert or update case_notes rows (see note_rows)"""
+        if not rows:
+            return
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO case_notes (casenum, month, user_id, visa_type, consulate, major, status, note, details)
+                VALUES (:casenum, :month, :user_id, :visa_type, :consulate, :major, :status, :note, :details)
+                ON CONFLICT(casenum) DO UPDATE SET
+                    month = excluded.month, user_id = excluded.user_id,
+                    visa_type = excluded.visa_type, consulate = excluded.consulate,
+                    major = excluded.major, status = excluded.status,
+                    note = excluded.note, details = excluded.details
+                """,
+                rows
+            )
+
+    def add_records(self, records: Iterable[Dict], month: Optional[str] = None) -> int:
+        """Index every record with note or details text; returns how many were indexed"""
+        rows = note_rows(records, None, month)
+        self.save_case_notes(rows)
+        return len(rows)
+
+    def search_notes(self, query: str, filters: Optional[Dict] = None, limit: int = 20) -> List[Dict]:
+        """
+        Find cases whose major, note or details match every word of a query
+
+        Args:
+            query: Free text, e.g. "administrative processing"
+            filters: Optional equality filters on month, consulate, visa_type, status
+            limit: Maximum number of results
+
+        Returns:
+            List of dictionaries with casenum, month, rank (higher is better)
+            and note, best match first
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+
+        sql = """
+            SELECT n.casenum, n.month, -bm25(case_notes_fts, ?, ?, ?) AS rank, n.note
+            FROM case_notes_fts
+            JOIN case_notes n ON n.rowid = case_notes_fts.rowid
+            WHERE case_notes_fts MATCH ?
+        """
+        params = [*COLUMN_WEIGHTS, match]
+        for name, value in search_filters(filters).items():
+            sql += f" AND n.{name} = ?"
+            params.append(value)
+        sql += " ORDER BY rank DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def search_filters(filters: Optional[Dict]) -> Dict:
+    """
+    Known, non-empty filters only; every search_notes backend applies them
+
+    Raises:
+        ValueError: A filter that is not in FILTER_FIELDS
+    """
+    filters = filters or {}
+    unknown = set(filters) - set(FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown search filter(s): {', '.join(sorted(unknown))}")
+    return {name: filters[name] for name in FILTER_FIELDS if filters.get(name)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search case notes and details')
+    parser.add_argument('query', help='Words to search for, e.g. "administrative processing"')
+    parser.add_argument('--index', type=str, help='Search a local SQLite index instead of Supabase')
+    parser.add_argument('--limit', type=int, default=20, help='Maximum number of results (default: 20)')
+    for name in FILTER_FIELDS:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, help=f'Only cases with this {name}')
+    args = parser.parse_args()
+
+    filters = {name: getattr(args, name) for name in FILTER_FIELDS}
+    if args.index:
+        with SqliteNoteIndex(args.index) as index:
+            results = index.search_notes(args.query, filters, args.limit)
+    else:
+        from supabase_client import SupabaseClient
+        results = SupabaseClient().search_notes(args.query, filters, args.limit)
+
+    if not results:
+        print("No matching cases")
+        return
+    for result in results:
+        note = (result.get('note') or '').replace('\n', ' ')
+        print(f"  {result['casenum']:>10}  {result['month']}  {result['rank']:.3f}  {note[:80]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Per-stage profiling for pipeline runs (--profile)
+Wraps the pipeline stages (homepage and month fetches, parsing, saving,
+change detection) of one run with cProfile and tracemalloc, optionally
+samples the main thread's stack, and writes everything into a run
+directory:
+
+    <stage>.prof       cProfile stats (python -m pstats, snakeviz)
+    <stage>.txt        the stage's functions by own time
+    allocations.txt    top allocation sites of each stage
+    stacks.collapsed   sampled stacks, one "stage;frame;frame count" per
+                       line (flamegraph.pl, speedscope, inferno)
+    summary.json       calls, wall/self time and memory per stage
+
+Stages are installed by wrapping methods of the scraper, database client
+and detector of a run, so nothing changes and nothing is imported when
+profiling is off. CPU profiles are exclusive: while a nested stage runs
+(a month fetch inside parse_monthly_page) the outer stage is paused, which
+splits fetching from parsing. Wall time is reported both including and
+excluding nested stages; memory includes them.
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Union
+
+DEFAULT_PROFILE_ROOT = 'profiles'
+
+# Seconds between stack samples
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# Frames kept per allocation traceback
+TRACEMALLOC_FRAMES = 1
+
+# Snapshot diffs cost up to seconds on a large heap, so allocation sites
+# come from the first calls of each stage; peak and net memory are
+# measured on every call
+ALLOCATION_SAMPLE_CALLS = 3
+
+_PROFILER_FILES = {__file__, tracemalloc.__file__, contextlib.__file__}
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 15
+
+
+def default_run_dir(root: str = DEFAULT_PROFILE_ROOT) -> str:
+    """A fresh run directory named after the current UTC time"""
+    return os.path.join(root, datetime.now(timezone.utc).strftime('run-%Y%m%d-%H%M%S'))
+
+
+class _Stage:
+    """Accumulated measurements of one stage over all its calls"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.profile = cProfile.Profile()
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.self_seconds = 0.0
+        self.peak_bytes = 0
+        self.net_bytes = 0
+        self.allocations: Counter = Counter()
+
+
+class _Frame:
+    """One active call of a stage on the stage stack"""
+
+    def __init__(self, stage: _Stage):
+        self.stage = stage
+        self.started = time.perf_counter()
+        self.child_seconds = 0.0
+        self.memory_start = 0
+        self.peak = 0
+        self.snapshot = None
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, profiler: 'StageProfiler', thread_id: int, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.profiler = profiler
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self.profiler.busy:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            names.append(self.profiler.current_stage or 'other')
+            self.counts[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class StageProfiler:
+    """Collects CPU profiles, allocations and stack samples per stage"""
+
+    def __init__(
+        self,
+        run_dir: Optional[str] = None,
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+        trace_memory: bool = True
+    ):
+        """
+        Args:
+            run_dir: Directory for the output files (default: profiles/run-<UTC time>)
+            sample_interval: Seconds between stack samples (0 disables sampling)
+            trace_memory: Track allocations per stage with tracemalloc
+        """
+        self.run_dir = run_dir or default_run_dir()
+        self.sample_interval = sample_interval
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, _Stage] = {}
+        self._stack: List[_Frame] = []
+        self._sampler: Optional[_StackSampler] = None
+        self._started = None
+        self.wall_seconds = 0.0
+        # Time spent in the profiler's own bookkeeping (snapshots, mostly)
+        self.overhead_seconds = 0.0
+        self.busy = False
+
+    @property
+    def current_stage(self) -> Optional[str]:
+        stack = self._stack
+        return stack[-1].stage.name if stack else None
+
+    def start(self) -> None:
+        """Start tracing memory and sampling the calling thread"""
+        self._started = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if self.sample_interval > 0:
+            self._sampler = _StackSampler(self, threading.get_ident(), self.sample_interval)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        if self._sampler:
+            self._sampler.stop()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if self._started is not None:
+            self.wall_seconds = time.perf_counter() - self._started
+            self._started = None
+
+    @contextlib.contextmanager
+    def _bookkeeping(self):
+        """Keep the profiler's own work out of stage times and samples"""
+        self.busy = True
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.overhead_seconds += time.perf_counter() - started
+            self.busy = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Measure the enclosed code as one call of a stage"""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = _Stage(name)
+        if any(frame.stage is stage for frame in self._stack):
+            # Re-entered (e.g. a wrapped method calling itself): the outer call measures it
+            yield
+            return
+
+        outer = self._stack[-1] if self._stack else None
+        if outer:
+            outer.stage.profile.disable()
+        frame = _Frame(stage)
+        stage.calls += 1
+        if self.trace_memory and tracemalloc.is_tracing():
+            with self._bookkeeping():
+                current, peak = tracemalloc.get_traced_memory()
+                if outer:
+                    outer.peak = max(outer.peak, peak)
+                frame.memory_start = frame.peak = current
+                if stage.calls <= ALLOCATION_SAMPLE_CALLS:
+                    frame.snapshot = tracemalloc.take_snapshot()
+                tracemalloc.reset_peak()
+        self._stack.append(frame)
+        # Bookkeeping of nested stages is subtracted from this call's time
+        overhead_before = self.overhead_seconds
+        frame.started = time.perf_counter()
+        stage.profile.enable()
+        try:
+            yield
+        finally:
+            stage.profile.disable()
+            elapsed = time.perf_counter() - frame.started - (self.overhead_seconds - overhead_before)
+            self._stack.pop()
+            stage.wall_seconds += elapsed
+            stage.self_seconds += elapsed - frame.child_seconds
+            if self.trace_memory and tracemalloc.is_tracing():
+                with self._bookkeeping():
+                    self._measure_memory(stage, frame, outer)
+            if outer:
+                outer.child_seconds += elapsed
+                outer.stage.profile.enable()
+
+    def _measure_memory(self, stage: _Stage, frame: _Frame, outer: Optional[_Frame]) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        frame.peak = max(frame.peak, peak)
+        stage.peak_bytes = max(stage.peak_bytes, frame.peak - frame.memory_start)
+        stage.net_bytes += current - frame.memory_start
+        if outer:
+            outer.peak = max(outer.peak, frame.peak)
+        if frame.snapshot is not None:
+            for diff in tracemalloc.take_snapshot().compare_to(frame.snapshot, 'lineno'):
+                site = diff.traceback[0]
+                if diff.size_diff > 0 and site.filename not in _PROFILER_FILES:
+                    stage.allocations[f"{site.filename}:{site.lineno}"] += diff.size_diff
+            frame.snapshot = None
+        tracemalloc.reset_peak()
+
+    def instrument(self, obj, method_name: str, stage: Union[str, Callable, None] = None) -> None:
+        """
+        Run a method of an object inside a stage from now on
+
+        Args:
+            obj: Instance whose method is wrapped (only this instance changes)
+            method_name: Name of the method
+            stage: Stage name, or a callable that gets the call's arguments
+                and returns the stage name (default: the method name)
+        """
+        method = getattr(obj, method_name, None)
+        if method is None:
+            return
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            name = stage(*args, **kwargs) if callable(stage) else (stage or method_name)
+            with self.stage(name):
+                return method(*args, **kwargs)
+
+        setattr(obj, method_name, wrapper)
+
+    def write(self) -> Dict:
+        """
+        Write the profiles, allocation sites and collapsed stacks to run_dir
+
+        Returns:
+            The summary (also written to summary.json)
+        """
+        os.makedirs(self.run_dir, exist_ok=True)
+        summary = {
+            'wall_seconds': round(self.wall_seconds, 3),
+            'overhead_seconds': round(self.overhead_seconds, 3),
+            'stages': {},
+        }
+
+        allocation_lines = []
+        for name, stage in self.stages.items():
+            stage.profile.dump_stats(os.path.join(self.run_dir, f'{name}.prof'))
+            stream = io.StringIO()
+            stats = pstats.Stats(stage.profile, stream=stream)
+            if stats.total_calls:
+                stats.sort_stats('tottime').print_stats(TOP_FUNCTIONS)
+            with open(os.path.join(self.run_dir, f'{name}.txt'), 'w', encoding='utf-8') as f:
+                f.write(f"{name}: {stage.calls} calls, {stage.wall_seconds:.3f}s wall, "
+                        f"{stage.self_seconds:.3f}s excluding nested stages\n")
+                f.write(stream.getvalue())
+
+            summary['stages'][name] = {
+                'calls': stage.calls,
+                'wall_seconds': round(stage.wall_seconds, 3),
+                'self_seconds': round(stage.self_seconds, 3),
+                'peak_bytes': stage.peak_bytes,
+                'net_bytes': stage.net_bytes,
+            }
+            if stage.allocations:
+                allocation_lines.append(
+                    f"{name} (first {min(stage.calls, ALLOCATION_SAMPLE_CALLS)} of {stage.calls} calls; "
+                    f"peak {_format_bytes(stage.peak_bytes)}, net {_format_bytes(stage.net_bytes)})"
+                )
+                for site, size in stage.allocations.most_common(TOP_ALLOCATIONS):
+                    allocation_lines.append(f"  {_format_bytes(size):>10}  {site}")
+                allocation_lines.append('')
+
+        if allocation_lines:
+            with open(os.path.join(self.run_dir, 'allocations.txt'), 'w', encoding='utf-8') as f:
+                f.write("Memory allocated per site and stage, still alive when the stage returned "
+                        "(nested stages included)\n\n")
+                f.write('\n'.join(allocation_lines))
+
+        if self._sampler and self._sampler.counts:
+            with open(os.path.join(self.run_dir, 'stacks.collapsed'), 'w', encoding='utf-8') as f:
+                for stack, count in sorted(self._sampler.counts.items()):
+                    f.write(f"{stack} {count}\n")
+            summary['samples'] = sum(self._sampler.counts.values())
+
+        with open(os.path.join(self.run_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def print_summary(self) -> None:
+        """Print a per-stage table, slowest stage first"""
+        print(f"\nProfile ({self.wall_seconds:.1f}s, {self.overhead_seconds:.1f}s of it profiler overhead) "
+              f"written to {self.run_dir}/")
+        print(f"  {'stage':<20} {'calls':>6} {'wall s':>9} {'self s':>9} {'peak':>10}")
+        for stage in sorted(self.stages.values(), key=lambda s: s.self_seconds, reverse=True):
+            print(f"  {stage.name:<20} {stage.calls:>6} {stage.wall_seconds:>9.3f} "
+                  f"{stage.self_seconds:>9.3f} {_format_bytes(stage.peak_bytes):>10}")
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def fetch_stage(scraper) -> Callable:
+    """Stage name for a get_page call, by the kind of page fetched"""
+    def name(url, *args, **kwargs):
+        if url == scraper.base_url:
+            return 'homepage_fetch'
+        if 'dispdate=' in url:
+            return 'month_fetch'
+        return 'details_fetch'
+    return name
+
+
+def instrument_pipeline(profiler: StageProfiler, scraper=None, db_client=None, detector=None) -> None:
+    """
+    Install the standard pipeline stages on a run's objects
+
+    Args:
+        profiler: StageProfiler
+        scraper: CheckeeScraper
+        db_client: SupabaseClient (save_snapshot, save_changes)
+        detector: ChangeDetector or VectorizedChangeDetector
+    """
+    if scraper is not None:
+        profiler.instrument(scraper, 'get_page', fetch_stage(scraper))
+        profiler.instrument(scraper, 'parse_homepage')
+        profiler.instrument(scraper, 'parse_monthly_page')
+        profiler.instrument(scraper, 'parse_details_page')
+    if db_client is not None:
+        profiler.instrument(db_client, 'save_snapshot')
+        profiler.instrument(db_client, 'save_changes')
+    if detector is not None:
+        # Loading the baseline is database time; keep it out of the diff
+        profiler.instrument(detector, '_load_baseline', 'load_baseline')
+        profiler.instrument(detector.case_index, 'prefetch', 'case_index_lookup')
+        profiler.instrument(detector, 'detect_changes')
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Streaming record writers
+Write scraped records one at a time to CSV, JSON or JSON Lines (optionally
+gzip-compressed) with a fixed schema, so exports run in constant memory
+"""
+
+import csv
+import json
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+# Declared export schema (see "Data Fields" in README.md)
+RECORD_FIELDS = [
+    'month',
+    'id',
+    'visa_type',
+    'visa_entry',
+    'consulate',
+    'major',
+    'status',
+    'check_date',
+    'complete_date',
+    'waiting_days',
+    'details_link',
+    'has_notes',
+    'note',
+    'details',
+]
+
+
+def _json_default(value):
+    """Serialize the typed fields json does not know (dates as YYYY-MM-DD)"""
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _open_text(filename: str, compress: Optional[bool]):
+    """Open a file for text writing, gzip-compressed if requested or if it ends in .gz"""
+    if compress is None:
+        compress = filename.endswith('.gz')
+    if compress:
+        import gzip
+        return gzip.open(filename, 'wt', newline='', encoding='utf-8')
+    return open(filename, 'w', newline='', encoding='utf-8')
+
+
+class RecordWriter(ABC):
+    """Base class for streaming writers; use as a context manager"""
+
+    def __init__(self, filename: str, compress: Optional[bool] = None, fields: Optional[List[str]] = None):
+        """
+        Open the output file
+
+        Args:
+            filename: Output path
+            compress: Force gzip on/off (default: gzip when filename ends in .gz)
+            fields: Field names to write (default: RECORD_FIELDS)
+        """
+        self.filename = filename
+        self.fields = fields or RECORD_FIELDS
+        self.count = 0
+        self._file = _open_text(filename, compress)
+        self._start()
+
+    def write(self, record: Dict) -> None:
+        """Write one record"""
+        self._write(record)
+        self.count += 1
+
+    def write_all(self, records: Iterable[Dict]) -> int:
+        """Write every record of an iterable and return how many were written"""
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._finish()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _project(self, record: Dict) -> Dict:
+        """Keep the declared fields present in the record, in schema order"""
+        return {field: record[field] for field in self.fields if field in record}
+
+    def _start(self) -> None:
+        pass
+
+    @abstractmethod
+    def _write(self, record: Dict) -> None:
+        """Write one record to the open file"""
+
+    def _finish(self) -> None:
+        pass
+
+
+class CsvRecordWriter(RecordWriter):
+    """CSV with a header row of the declared fields"""
+
+    def _start(self) -> None:
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fields, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def _write(self, record: Dict) -> None:
+        # DictWriter fills missing fields with '' and ignores undeclared ones
+        self._writer.writerow(self._project(record))
+
+
+class JsonLinesRecordWriter(RecordWriter):
+    """One JSON object per line"""
+
+    def _write(self, record: Dict) -> None:
+        self._file.write(json.dumps(self._project(record), ensure_ascii=False, default=_json_default))
+        self._file.write('\n')
+
+
+class JsonRecordWriter(RecordWriter):
+    """A JSON array written incrementally, one object at a time"""
+
+    def _start(self) -> None:
+        self._file.write('[')
+
+    def _write(self, record: Dict) -> None:
+        self._file.write('\n  ' if self.count == 0 else ',\n  ')
+        self._file.write(json.dumps(self._project(record), ensure_ascii=False, default=_json_default))
+
+    def _finish(self) -> None:
+        self._file.write('\n]\n' if self.count else ']\n')
+
+
+def open_record_writer(filename: str, compress: Optional[bool] = None) -> RecordWriter:
+    """
+    Open a writer based on the file extension (.csv, .json, .jsonl/.ndjson, optionally + .gz)
+
+    Args:
+        filename: Output path
+        compress: Force gzip on/off (default: gzip when filename ends in .gz)
+
+    Returns:
+        An open RecordWriter
+    """
+    name = filename[:-3] if filename.endswith('.gz') else filename
+    if name.endswith('.jsonl') or name.endswith('.ndjson'):
+        return JsonLinesRecordWriter(filename, compress)
+    if name.endswith('.json'):
+        return JsonRecordWriter(filename, compress)
+    return CsvRecordWriter(filename, compress)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Adaptive refresh scheduler
+Gives every month a refresh interval from how much it still changes (recent
+change rate, pending ratio, time since its last change) and picks the most
+overdue months that fit in a per-run budget
+"""
+
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Bounds for a month's refresh interval
+MIN_INTERVAL_HOURS = 6.0
+MAX_INTERVAL_HOURS = 30 * 24.0
+
+# Estimated cost of scraping one month (fetch + parse + polite delay),
+# used to turn a seconds budget into a number of months
+SECONDS_PER_MONTH = 3.0
+
+
+def parse_budget(value: str) -> Dict[str, float]:
+    """
+    Parse a --budget value
+
+    Args:
+        value: Plain number for max requests ("20"), or a duration with an
+            s/m/h suffix for max seconds ("300s", "5m", "1h")
+
+    Returns:
+        Dictionary with either 'requests' or 'seconds'
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*', value or '')
+    if not match:
+        raise ValueError(f"Invalid budget {value!r}: use a request count (20) or a duration (300s, 5m, 1h)")
+    amount, unit = float(match.group(1)), match.group(2)
+    if not unit:
+        return {'requests': int(amount)}
+    return {'seconds': amount * {'s': 1, 'm': 60, 'h': 3600}[unit]}
+
+
+def _hours_since(timestamp, now: datetime) -> Optional[float]:
+    if not timestamp:
+        return None
+    if isinstance(timestamp, datetime):
+        parsed = timestamp
+    else:
+        parsed = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return max((now - parsed).total_seconds() / 3600, 0.0)
+
+
+def refresh_interval_hours(stats: Dict, now: datetime, window_days: int = 30) -> float:
+    """
+    Refresh interval of one month
+
+    Busy months (many real changes per day, many pending cases) get short
+    intervals; quiet months get longer intervals the longer they stay quiet.
+
+    Args:
+        stats: Row of month_refresh_stats()
+        now: Current time
+        window_days: Window the change count was taken over
+
+    Returns:
+        Interval in hours, within [MIN_INTERVAL_HOURS, MAX_INTERVAL_HOURS]
+    """
+    changes_per_day = (stats.get('changes_in_window') or 0) / window_days
+    total = stats.get('total') or 0
+    pending_ratio = (stats.get('pending') or 0) / total if total else 0.0
+    activity = changes_per_day + pending_ratio
+
+    if activity > 0:
+        interval = 24.0 / activity
+    else:
+        # Quiet month: back off in proportion to how long it has been quiet
+        quiet_hours = _hours_since(stats.get('last_change_at'), now)
+        interval = quiet_hours / 4 if quiet_hours is not None else MAX_INTERVAL_HOURS
+
+    return min(max(interval, MIN_INTERVAL_HOURS), MAX_INTERVAL_HOURS)
+
+
+def plan_refresh(
+    month_links: List[Dict],
+    month_stats: List[Dict],
+    budget: Optional[Dict[str, float]] = None,
+    now: Optional[datetime] = None,
+    window_days: int = 30
+) -> List[Dict]:
+    """
+    Choose which months to scrape this run, most valuable first
+
+    Months never scraped come first; the rest are due once the time since
+    their last scrape exceeds their interval and are ranked by how overdue
+    they are (ties go to newer months).
+
+    Args:
+        month_links: parse_homepage() output
+        month_stats: Rows of SupabaseClient.get_month_refresh_stats()
+        budget: parse_budget() output (None for no limit)
+        now: Current time (default: now)
+        window_days: Window the change counts were taken over
+
+    Returns:
+        The selected month_links entries, each with 'priority' and
+        'interval_hours' added, in scrape order
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+
+    stats_by_month = {row['month']: row for row in month_stats}
+    planned = []
+
+    for link in month_links:
+        stats = stats_by_month.get(link['month'])
+        if stats is None or not stats.get('last_scrape_at'):
+            planned.append(dict(link, priority=float('inf'), interval_hours=0.0))
+            continue
+
+        interval = refresh_interval_hours(stats, now, window_days)
+        overdue = _hours_since(stats['last_scrape_at'], now) / interval
+        if overdue >= 1:
+            planned.append(dict(link, priority=overdue, interval_hours=interval))
+
+    planned.sort(key=lambda link: (link['priority'], link['month']), reverse=True)
+
+    if budget:
+        if 'requests' in budget:
+            limit = int(budget['requests'])
+        else:
+            limit = int(budget['seconds'] // SECONDS_PER_MONTH)
+        planned = planned[:max(limit, 0)]
+
+    return planned
@@ -6,6 +6,7 @@ Main script to run the checkee.info scraper
 import argparse
 import sys
 from scraper import CheckeeScraper
+from record_writers import CsvRecordWriter, JsonRecordWriter, JsonLinesRecordWriter
 import json
 
 def main():
@@ -14,12 +15,36 @@ def main():
     parser.add_argument('--include-details', action='store_true', help='Also scrape details pages (slower)')
     parser.add_argument('--output-csv', type=str, default='checkee_data.csv', help='Output CSV filename (default: checkee_data.csv)')
     parser.add_argument('--output-json', type=str, default=None, help='Output JSON filename (optional)')
+    parser.add_argument('--output-jsonl', type=str, default=None, help='Output JSON Lines filename (optional)')
+    parser.add_argument('--gzip', action='store_true', help='Gzip-compress all output files (.gz is also detected from filenames)')
+    parser.add_argument('--search-index', type=str, default=None, help='Also index notes/details into this SQLite full-text search file (optional)')
     parser.add_argument('--test', action='store_true', help='Test mode: scrape only first month')
+    parser.add_argument('--profile', nargs='?', const='', metavar='DIR',
+                        help='Profile each stage (CPU, allocations, sampled stacks) into DIR (default: profiles/run-<UTC time>)')
+    parser.add_argument('--profile-sample-ms', type=float, default=5.0,
+                        help='Stack sampling interval for --profile in milliseconds (default: 5, 0 disables)')
     
     args = parser.parse_args()
     
     scraper = CheckeeScraper()
     
+    if args.profile is None:
+        scrape(scraper, args)
+        return
+    
+    from profiling import StageProfiler, instrument_pipeline
+    profiler = StageProfiler(args.profile or None, sample_interval=args.profile_sample_ms / 1000)
+    instrument_pipeline(profiler, scraper)
+    profiler.start()
+    try:
+        scrape(scraper, args)
+    finally:
+        profiler.stop()
+        profiler.write()
+        profiler.print_summary()
+
+def scrape(scraper, args):
+    """Scrape and write the outputs selected by the command line"""
     if args.test:
         print("Running in test mode (first month only)...")
         month_links = scraper.parse_homepage()
@@ -37,7 +62,7 @@ def main():
         
         if records:
             print("\nSample record:")
-            print(json.dumps(records[0], indent=2, ensure_ascii=False))
+            print(json.dumps(records[0].to_dict(), indent=2, ensure_ascii=False, default=str))
             
             # Save test data
             scraper.save_to_csv(records, 'test_checkee_data.csv')
@@ -45,31 +70,68 @@ def main():
                 scraper.save_to_json(records, args.output_json)
     else:
         print("Starting full scrape...")
-        records = scraper.scrape_all(
-            include_details=args.include_details,
-            months_limit=args.months
-        )
         
-        if not records:
-            print("No records found!")
-            sys.exit(1)
+        # Stream records straight into every output so memory stays flat
+        # and files fill up while scraping is still running
+        outputs = [
+            (CsvRecordWriter, args.output_csv),
+            (JsonRecordWriter, args.output_json),
+            (JsonLinesRecordWriter, args.output_jsonl),
+        ]
+        writers = []
+        for writer_class, filename in outputs:
+            if not filename:
+                continue
+            if args.gzip and not filename.endswith('.gz'):
+                filename += '.gz'
+            writers.append(writer_class(filename))
+        
+        search_index = None
+        pending_index = []
+        indexed = 0
+        if args.search_index:
+            from note_search import SqliteNoteIndex
+            search_index = SqliteNoteIndex(args.search_index)
         
-        print(f"\nTotal records scraped: {len(records)}")
+        total = 0
+        status_counts = {}
+        try:
+            for record in scraper.iter_records(
+                include_details=args.include_details,
+                months_limit=args.months
+            ):
+                for writer in writers:
+                    writer.write(record)
+                total += 1
+                status = record.get('status', 'Unknown')
+                status_counts[status] = status_counts.get(status, 0) + 1
+                
+                if search_index:
+                    # Index in batches: one transaction per 1000 records
+                    pending_index.append(record)
+                    if len(pending_index) >= 1000:
+                        indexed += search_index.add_records(pending_index)
+                        pending_index = []
+        finally:
+            for writer in writers:
+                writer.close()
+            if search_index:
+                indexed += search_index.add_records(pending_index)
+                search_index.close()
         
-        # Save to CSV
-        scraper.save_to_csv(records, args.output_csv)
+        if not total:
+            print("No records found!")
+            sys.exit(1)
         
-        # Save to JSON if requested
-        if args.output_json:
-            scraper.save_to_json(records, args.output_json)
+        print(f"\nTotal records scraped: {total}")
+        for writer in writers:
+            print(f"Saved {writer.count} records to {writer.filename}")
+        if search_index:
+            print(f"Indexed {indexed} cases with notes into {args.search_index}")
         
         # Print summary
         print("\nSummary:")
-        print(f"  Total records: {len(records)}")
-        status_counts = {}
-        for record in records:
-            status = record.get('status', 'Unknown')
-            status_counts[status] = status_counts.get(status, 0) + 1
+        print(f"  Total records: {total}")
         print("  Status breakdown:")
         for status, count in sorted(status_counts.items()):
             print(f"    {status}: {count}")
@@ -13,29 +13,21 @@ if __name__ == '__main__':
     
     scraper = CheckeeScraper()
     
-    print(f"Fetching homepage to find month links...")
-    month_links = scraper.parse_homepage()
-    
-    # Find the specific month
-    target_month = None
-    for link in month_links:
-        if link['month'] == month:
-            target_month = link
-            break
-    
-    if not target_month:
-        print(f"Error: Month {month} not found")
-        print(f"Available months: {[l['month'] for l in month_links[:10]]}...")
-        sys.exit(1)
+    # Month pages have a fixed URL pattern, so the homepage isn't needed
+    url = scraper.month_url(month)
     
     print(f"Scraping {month}...")
-    records = scraper.parse_monthly_page(target_month['url'])
+    records = scraper.parse_monthly_page(url)
     
     # Add month to records
     for record in records:
         record['month'] = month
     
     print(f"Found {len(records)} records")
+    if not records:
+        print(f"Error: No records for {month}")
+        print(f"Known months: {[l['month'] for l in scraper.month_index.months[:10]]}...")
+        sys.exit(1)
     
     # Save to CSV
     filename = f'checkee_{month}.csv'
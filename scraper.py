@@ -4,37 +4,74 @@ Scraper for checkee.info website
 Scrapes visa check data from monthly pages
 """
 
-import requests
-from bs4 import BeautifulSoup
-import csv
 import json
 import time
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
 import re
+from normalize import normalize_record
+from visa_record import VisaRecord, extract_casenum
+from record_writers import CsvRecordWriter, JsonRecordWriter, JsonLinesRecordWriter
+from month_index import DEFAULT_INDEX_PATH, DEFAULT_TTL_SECONDS, MonthIndex
+
+# Month links on the homepage, e.g. ./main.php?dispdate=2026-02
+_DISPDATE_RE = re.compile(r'main\.php\?dispdate=(\d{4}-\d{2})')
+
+# requests, bs4 and details_parser are imported on first use so that
+# --help, --dry-run and other paths that never touch the network start quickly
+
+
+def _make_soup(html):
+    """Parse HTML with BeautifulSoup (imported lazily)"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
+
 
 class CheckeeScraper:
-    def __init__(self, base_url="https://www.checkee.info"):
+    def __init__(self, base_url="https://www.checkee.info", month_index_path=DEFAULT_INDEX_PATH,
+                 month_index_ttl=DEFAULT_TTL_SECONDS):
         self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Referer': 'https://www.checkee.info/'
-        })
-        # Visit homepage first to get cookies
+        self._session = None
+        self._primed = False
+        self._homepage_html = None
+        self.month_index = MonthIndex(base_url, month_index_path, month_index_ttl)
+    
+    @property
+    def session(self):
+        """HTTP session, created on first use"""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                'Accept-Language': 'en-US,en;q=0.5',
+                'Connection': 'keep-alive',
+                'Upgrade-Insecure-Requests': '1',
+                'Referer': 'https://www.checkee.info/'
+            })
+        return self._session
+    
+    def _prime_session(self):
+        """Visit the homepage once to get cookies before the first other page"""
+        self._primed = True
         try:
             response = self.session.get(self.base_url, timeout=30)
             if response.status_code != 200:
                 print(f"Warning: Homepage returned status {response.status_code}")
+            else:
+                # parse_homepage() can use this instead of fetching it again
+                self._homepage_html = response.text
         except Exception as e:
             print(f"Warning: Could not visit homepage: {e}")
     
     def get_page(self, url):
         """Fetch a page with retry logic"""
+        if url == self.base_url:
+            # Fetching the homepage sets the cookies itself
+            self._primed = True
+        elif not self._primed:
+            self._prime_session()
         try:
             response = self.session.get(url, timeout=30)
             response.raise_for_status()
@@ -45,14 +82,38 @@ class CheckeeScraper:
             print(f"Error fetching {url}: {e}")
             return None
     
-    def parse_homepage(self):
-        """Parse homepage to get all month links"""
-        html = self.get_page(self.base_url)
+    def parse_homepage(self, refresh=False):
+        """
+        Get all month links, from the local month index while it is fresh
+        
+        Args:
+            refresh: Check the homepage even if the cached index is fresh
+        """
+        # A homepage fetched to prime the session costs nothing to check
+        html, self._homepage_html = self._homepage_html, None
+        if html is None:
+            if not refresh and self.month_index.is_fresh():
+                return [dict(link) for link in self.month_index.months]
+            html = self.get_page(self.base_url)
         if not html:
+            if self.month_index.months:
+                print("Warning: Could not fetch homepage HTML, using cached month index")
+                return [dict(link) for link in self.month_index.months]
             print("Warning: Could not fetch homepage HTML")
             return []
         
-        soup = BeautifulSoup(html, 'html.parser')
+        if self.month_index.matches(html):
+            # Homepage unchanged since the index was built
+            self.month_index.touch()
+            return [dict(link) for link in self.month_index.months]
+        
+        unique_links = self._parse_month_links(html)
+        self.month_index.update(html, unique_links)
+        return [dict(link) for link in unique_links]
+    
+    def _parse_month_links(self, html):
+        """Parse month links out of the homepage HTML"""
+        soup = _make_soup(html)
         month_links = []
         
         # Find all Track links - they should be in a table
@@ -62,22 +123,15 @@ class CheckeeScraper:
         
         for link in all_links:
             href = link.get('href', '')
-            if 'main.php?dispdate=' in href:
-                month = link.text.strip()
-                # Handle relative URLs - normalize them
-                if href.startswith('./'):
-                    # Keep the ./ for urljoin to work correctly
-                    pass
-                full_url = urljoin(self.base_url, href)
-                # Extract date from URL
-                match = re.search(r'dispdate=(\d{4}-\d{2})', href)
-                if match:
-                    date_str = match.group(1)
-                    month_links.append({
-                        'month': date_str,
-                        'url': full_url,
-                        'text': month
-                    })
+            # Extract date from URL
+            match = _DISPDATE_RE.search(href)
+            if match:
+                # urljoin handles relative ./main.php links
+                month_links.append({
+                    'month': match.group(1),
+                    'url': urljoin(self.base_url, href),
+                    'text': link.text.strip()
+                })
         
         print(f"Found {len(month_links)} month links before deduplication")
         
@@ -93,16 +147,26 @@ class CheckeeScraper:
         unique_links.sort(key=lambda x: x['month'], reverse=True)
         
         return unique_links
+    
+    def month_url(self, month):
+        """
+        URL of one month's page (YYYY-MM) without fetching the homepage
         
-        return month_links
+        Uses the cached link when the month is in the index, otherwise
+        builds the URL from the site's dispdate pattern.
+        """
+        link = self.month_index.get(month)
+        if link:
+            return link['url']
+        return urljoin(self.base_url.rstrip('/') + '/', f'main.php?dispdate={month}')
     
     def parse_monthly_page(self, url):
-        """Parse a monthly page to extract visa application records"""
+        """Parse a monthly page to extract visa application records (typed, see normalize.py)"""
         html = self.get_page(url)
         if not html:
             return []
         
-        soup = BeautifulSoup(html, 'html.parser')
+        soup = _make_soup(html)
         records = []
         
         # Find the main data table - it has headers: Update, ID, Visa Type, etc.
@@ -129,19 +193,19 @@ class CheckeeScraper:
                     
                     # Extract data - skip first column (Update link)
                     # Columns: Update, ID, Visa Type, Visa Entry, US Consulate, Major, Status, Check Date, Complete Date, Waiting Day(s), Details
-                    record = {
-                        'id': cell_texts[1] if len(cell_texts) > 1 else '',
-                        'visa_type': cell_texts[2] if len(cell_texts) > 2 else '',
-                        'visa_entry': cell_texts[3] if len(cell_texts) > 3 else '',
-                        'consulate': cell_texts[4] if len(cell_texts) > 4 else '',
-                        'major': cell_texts[5] if len(cell_texts) > 5 else '',
-                        'status': cell_texts[6] if len(cell_texts) > 6 else '',
-                        'check_date': cell_texts[7] if len(cell_texts) > 7 else '',
-                        'complete_date': cell_texts[8] if len(cell_texts) > 8 else '',
-                        'waiting_days': cell_texts[9] if len(cell_texts) > 9 else '',
-                        'details_link': '',
-                        'has_notes': False
-                    }
+                    record = VisaRecord(
+                        id=cell_texts[1] if len(cell_texts) > 1 else '',
+                        visa_type=cell_texts[2] if len(cell_texts) > 2 else '',
+                        visa_entry=cell_texts[3] if len(cell_texts) > 3 else '',
+                        consulate=cell_texts[4] if len(cell_texts) > 4 else '',
+                        major=cell_texts[5] if len(cell_texts) > 5 else '',
+                        status=cell_texts[6] if len(cell_texts) > 6 else '',
+                        check_date=cell_texts[7] if len(cell_texts) > 7 else '',
+                        complete_date=cell_texts[8] if len(cell_texts) > 8 else '',
+                        waiting_days=cell_texts[9] if len(cell_texts) > 9 else '',
+                        details_link='',
+                        has_notes=False
+                    )
                     
                     # Find details link in the last column
                     details_cell = cells[-1] if len(cells) > 10 else None
@@ -161,38 +225,33 @@ class CheckeeScraper:
                                 if title:
                                     record['note'] = title
                     
-                    records.append(record)
+                    records.append(normalize_record(record))
         
         return records
     
-    def parse_details_page(self, url):
-        """Parse a details page to get user notes/experiences"""
+    def parse_case_details(self, url):
+        """
+        Fetch and parse a details page into typed fields (see details_parser.py)
+        
+        Returns:
+            CaseDetails, or None if the page could not be fetched
+        """
         html = self.get_page(url)
         if not html:
-            return ''
-        
-        soup = BeautifulSoup(html, 'html.parser')
-        notes = []
-        
-        # Look for tables or divs containing notes/experiences
-        # The structure may vary, so we'll look for common patterns
-        for element in soup.find_all(['table', 'div', 'p', 'td']):
-            text = element.get_text(strip=True)
-            # Look for substantial text that might be a note/experience
-            if text and len(text) > 30 and not any(skip in text.lower() for skip in ['home', 'add your case', 'tracker', 'update', 'id', 'visa type']):
-                notes.append(text)
-        
-        # Also check for specific note sections
-        note_sections = soup.find_all(['div', 'td'], class_=lambda x: x and ('note' in x.lower() or 'comment' in x.lower() or 'experience' in x.lower()))
-        for section in note_sections:
-            text = section.get_text(strip=True)
-            if text:
-                notes.append(text)
+            return None
         
-        return ' | '.join(notes[:5])  # Limit to first 5 notes to avoid duplicates
+        from details_parser import parse_details_html
+        details = parse_details_html(html)
+        details.casenum = extract_casenum(url)
+        return details
     
-    def scrape_all(self, include_details=False, months_limit=None):
-        """Scrape all months"""
+    def parse_details_page(self, url):
+        """Get the user notes/experiences of a details page as one ' | '-joined string"""
+        details = self.parse_case_details(url)
+        return details.text if details else ''
+    
+    def iter_records(self, include_details=False, months_limit=None):
+        """Scrape all months, yielding records as soon as each month is parsed"""
         print("Fetching homepage...")
         month_links = self.parse_homepage()
         
@@ -201,58 +260,52 @@ class CheckeeScraper:
         
         print(f"Found {len(month_links)} months to scrape")
         
-        all_records = []
-        
         for i, month_info in enumerate(month_links, 1):
             print(f"Scraping {month_info['month']} ({i}/{len(month_links)})...")
             records = self.parse_monthly_page(month_info['url'])
             
-            # Add month info to each record
             for record in records:
+                # Add month info to each record
                 record['month'] = month_info['month']
-            
-            all_records.extend(records)
-            
-            # If including details, scrape details pages
-            if include_details:
-                for record in records:
-                    if record.get('details_link'):
-                        print(f"  Fetching details for {record.get('id', 'unknown')}...")
-                        details = self.parse_details_page(record['details_link'])
-                        record['details'] = details
-                        time.sleep(0.5)  # Be polite
+                
+                # If including details, scrape details pages
+                if include_details and record.get('details_link'):
+                    print(f"  Fetching details for {record.get('id', 'unknown')}...")
+                    record['details'] = self.parse_details_page(record['details_link'])
+                    time.sleep(0.5)  # Be polite
+                
+                yield record
             
             time.sleep(1)  # Be polite between pages
-        
-        return all_records
     
-    def save_to_csv(self, records, filename='checkee_data.csv'):
-        """Save records to CSV"""
-        if not records:
+    def scrape_all(self, include_details=False, months_limit=None):
+        """Scrape all months"""
+        return list(self.iter_records(include_details=include_details, months_limit=months_limit))
+    
+    def save_to_csv(self, records, filename='checkee_data.csv', compress=None):
+        """Save records (any iterable) to CSV, streaming; gzip if filename ends in .gz"""
+        self._save(CsvRecordWriter, records, filename, compress)
+    
+    def save_to_json(self, records, filename='checkee_data.json', compress=None):
+        """Save records (any iterable) to a JSON array, streaming; gzip if filename ends in .gz"""
+        self._save(JsonRecordWriter, records, filename, compress)
+    
+    def save_to_jsonl(self, records, filename='checkee_data.jsonl', compress=None):
+        """Save records (any iterable) to JSON Lines, streaming; gzip if filename ends in .gz"""
+        self._save(JsonLinesRecordWriter, records, filename, compress)
+    
+    def _save(self, writer_class, records, filename, compress):
+        records = iter(records)
+        first = next(records, None)
+        if first is None:
             print("No records to save")
             return
         
-        # Get all unique keys from records
-        fieldnames = set()
-        for record in records:
-            fieldnames.update(record.keys())
-        
-        fieldnames = sorted(list(fieldnames))
+        with writer_class(filename, compress) as writer:
+            writer.write(first)
+            writer.write_all(records)
         
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(records)
-        
-        print(f"Saved {len(records)} records to {filename}")
-    
-    def save_to_json(self, records, filename='checkee_data.json'):
-        """Save records to JSON"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(records, f, indent=2, ensure_ascii=False)
-        
-        print(f"Saved {len(records)} records to {filename}")
-
+        print(f"Saved {writer.count} records to {filename}")
 
 def main():
     scraper = CheckeeScraper()
@@ -274,7 +327,7 @@ def main():
             print(f"Found {len(test_records)} records")
             if test_records:
                 print("\nSample record:")
-                print(json.dumps(test_records[0], indent=2))
+                print(json.dumps(test_records[0].to_dict(), indent=2, default=str))
     else:
         print("No month links found. Checking HTML structure...")
         html = scraper.get_page(scraper.base_url)
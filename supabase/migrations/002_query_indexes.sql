@@ -0,0 +1,35 @@
+-- Composite and covering indexes for the hot query shapes
+--
+-- records:   latest snapshot of a month, optionally filtered by consulate,
+--            visa_type and status (/api/records, get_records_by_snapshot)
+--            and per-case history ordered by created_at (get_records_by_casenum)
+-- snapshots: latest snapshot per month (get_latest_snapshot, dashboard)
+-- changes:   newest changes, optionally filtered by change_type (get_changes)
+
+-- records filtered by snapshot plus the dashboard filters
+CREATE INDEX IF NOT EXISTS idx_records_snapshot_filters
+    ON records(snapshot_id, consulate, visa_type, status);
+
+-- records filtered by snapshot plus status only (status is the most common
+-- single filter and would otherwise skip two columns of the index above)
+CREATE INDEX IF NOT EXISTS idx_records_snapshot_status
+    ON records(snapshot_id, status);
+
+-- per-case history in chronological order
+CREATE INDEX IF NOT EXISTS idx_records_casenum_created_at
+    ON records(casenum, created_at);
+
+-- latest snapshot for a month; INCLUDE lets id/total_records lookups run
+-- as index-only scans
+CREATE INDEX IF NOT EXISTS idx_snapshots_month_scrape_date
+    ON snapshots(month, scrape_date DESC) INCLUDE (id, total_records);
+
+-- newest changes of a given type
+CREATE INDEX IF NOT EXISTS idx_changes_type_detected_at
+    ON changes(change_type, detected_at DESC);
+
+-- These single-column indexes are left-prefixes of the composites above
+DROP INDEX IF EXISTS idx_records_snapshot_id;
+DROP INDEX IF EXISTS idx_records_casenum;
+DROP INDEX IF EXISTS idx_snapshots_month;
+DROP INDEX IF EXISTS idx_changes_change_type;
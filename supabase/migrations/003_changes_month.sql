@@ -0,0 +1,43 @@
+-- Denormalize the month onto changes so month filtering, ordering and
+-- pagination of get_changes all happen in SQL
+
+ALTER TABLE changes ADD COLUMN IF NOT EXISTS month TEXT;
+
+-- Backfill from the snapshot each change was detected in
+UPDATE changes c
+SET month = s.month
+FROM snapshots s
+WHERE c.snapshot_id_new = s.id
+  AND c.month IS NULL;
+
+ALTER TABLE changes ALTER COLUMN month SET NOT NULL;
+
+-- The pipeline sets month explicitly; fill it for any other writer
+CREATE OR REPLACE FUNCTION changes_set_month()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.month IS NULL THEN
+        SELECT month INTO NEW.month FROM snapshots WHERE id = NEW.snapshot_id_new;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_changes_set_month ON changes;
+CREATE TRIGGER trg_changes_set_month
+    BEFORE INSERT ON changes
+    FOR EACH ROW EXECUTE FUNCTION changes_set_month();
+
+-- Keyset pagination runs on (detected_at, id) so ties on detected_at
+-- (a whole batch shares one timestamp) are paged deterministically
+CREATE INDEX IF NOT EXISTS idx_changes_month_detected_at
+    ON changes(month, detected_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_changes_detected_at_id
+    ON changes(detected_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_changes_type_detected_at_id
+    ON changes(change_type, detected_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_changes_detected_at;
+DROP INDEX IF EXISTS idx_changes_type_detected_at;
+
+COMMENT ON COLUMN changes.month IS 'Month (YYYY-MM) of the snapshot the change was detected in';
@@ -0,0 +1,56 @@
+-- Compact per-case timeline: one row per status transition instead of one
+-- full record copy per snapshot
+
+CREATE TABLE IF NOT EXISTS case_events (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    casenum TEXT NOT NULL,
+    month TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    status TEXT,
+    event_at TIMESTAMPTZ NOT NULL,
+    snapshot_id UUID REFERENCES snapshots(id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- A case's whole timeline is one index-only range read
+CREATE INDEX IF NOT EXISTS idx_case_events_casenum_event_at
+    ON case_events(casenum, event_at) INCLUDE (event_type, status, month);
+
+-- Makes incremental inserts and the backfill below idempotent
+CREATE UNIQUE INDEX IF NOT EXISTS idx_case_events_unique
+    ON case_events(casenum, event_type, event_at, status);
+
+-- Backfill from existing snapshots and changes. A case first seen already
+-- cleared/rejected gets its Pending period from check_date to complete_date.
+WITH first_seen AS (
+    SELECT DISTINCT ON (r.casenum)
+        r.casenum, r.month, r.status, r.check_date, r.complete_date, r.snapshot_id, s.scrape_date
+    FROM records r
+    JOIN snapshots s ON s.id = r.snapshot_id
+    WHERE r.casenum <> ''
+    ORDER BY r.casenum, s.scrape_date
+)
+INSERT INTO case_events (casenum, month, event_type, status, event_at, snapshot_id)
+SELECT casenum, month, 'first_seen',
+       CASE WHEN status IN ('Clear', 'Reject') AND check_date IS NOT NULL AND complete_date IS NOT NULL
+            THEN 'Pending' ELSE status END,
+       COALESCE(check_date::timestamptz, scrape_date),
+       snapshot_id
+FROM first_seen
+UNION ALL
+SELECT casenum, month, 'status_change', status, complete_date::timestamptz, snapshot_id
+FROM first_seen
+WHERE status IN ('Clear', 'Reject') AND check_date IS NOT NULL AND complete_date IS NOT NULL
+UNION ALL
+SELECT c.casenum, c.month, 'status_change', c.new_value,
+       COALESCE(r.complete_date::timestamptz, c.detected_at),
+       c.snapshot_id_new
+FROM changes c
+LEFT JOIN records r
+    ON r.snapshot_id = c.snapshot_id_new
+   AND r.casenum = c.casenum
+   AND c.new_value IN ('Clear', 'Reject')
+WHERE c.change_type = 'status_change'
+ON CONFLICT DO NOTHING;
+
+COMMENT ON TABLE case_events IS 'Per-case status transitions, maintained incrementally at ingest';
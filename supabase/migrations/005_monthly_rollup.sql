@@ -0,0 +1,92 @@
+-- Latest snapshot per month and precomputed dashboard rollups, so page
+-- loads read a few hundred aggregate rows instead of every record
+
+-- Served by idx_snapshots_month_scrape_date (002)
+CREATE OR REPLACE VIEW latest_snapshot_per_month AS
+SELECT DISTINCT ON (month)
+    id, month, scrape_date, total_records
+FROM snapshots
+ORDER BY month, scrape_date DESC;
+
+-- One row per (month, consulate, visa_type) of the latest snapshot of each
+-- month. 'ALL' in consulate/visa_type marks the rollup over that dimension,
+-- e.g. (month, 'ALL', 'ALL') holds the month totals.
+CREATE TABLE IF NOT EXISTS monthly_rollup (
+    month TEXT NOT NULL,
+    consulate TEXT NOT NULL,
+    visa_type TEXT NOT NULL,
+    snapshot_id UUID REFERENCES snapshots(id) ON DELETE CASCADE,
+    snapshot_date TIMESTAMPTZ,
+    total INTEGER NOT NULL DEFAULT 0,
+    pending INTEGER NOT NULL DEFAULT 0,
+    clear INTEGER NOT NULL DEFAULT 0,
+    reject INTEGER NOT NULL DEFAULT 0,
+    waiting_days_count INTEGER NOT NULL DEFAULT 0,
+    waiting_days_sum BIGINT NOT NULL DEFAULT 0,
+    avg_waiting_days DOUBLE PRECISION,
+    min_waiting_days INTEGER,
+    max_waiting_days INTEGER,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (month, consulate, visa_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_monthly_rollup_visa_type
+    ON monthly_rollup(visa_type, consulate, month);
+
+-- Recompute the rollup for the given months (all months when NULL).
+-- Returns the number of rollup rows written.
+CREATE OR REPLACE FUNCTION refresh_monthly_rollup(p_months TEXT[] DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    written INTEGER;
+BEGIN
+    DELETE FROM monthly_rollup
+    WHERE p_months IS NULL OR month = ANY(p_months);
+
+    INSERT INTO monthly_rollup (
+        month, consulate, visa_type, snapshot_id, snapshot_date,
+        total, pending, clear, reject,
+        waiting_days_count, waiting_days_sum,
+        avg_waiting_days, min_waiting_days, max_waiting_days
+    )
+    WITH base AS (
+        SELECT
+            l.month,
+            l.id AS snapshot_id,
+            l.scrape_date,
+            COALESCE(NULLIF(r.consulate, ''), 'Unknown') AS consulate,
+            COALESCE(NULLIF(r.visa_type, ''), 'Unknown') AS visa_type,
+            r.status,
+            r.waiting_days
+        FROM latest_snapshot_per_month l
+        JOIN records r ON r.snapshot_id = l.id
+        WHERE p_months IS NULL OR l.month = ANY(p_months)
+    )
+    SELECT
+        month,
+        CASE WHEN GROUPING(consulate) = 1 THEN 'ALL' ELSE consulate END,
+        CASE WHEN GROUPING(visa_type) = 1 THEN 'ALL' ELSE visa_type END,
+        snapshot_id,
+        scrape_date,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE status = 'Pending'),
+        COUNT(*) FILTER (WHERE status = 'Clear'),
+        COUNT(*) FILTER (WHERE status = 'Reject'),
+        COUNT(waiting_days),
+        COALESCE(SUM(waiting_days), 0),
+        AVG(waiting_days),
+        MIN(waiting_days),
+        MAX(waiting_days)
+    FROM base
+    GROUP BY month, snapshot_id, scrape_date,
+        GROUPING SETS ((), (consulate), (visa_type), (consulate, visa_type));
+
+    GET DIAGNOSTICS written = ROW_COUNT;
+    RETURN written;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_monthly_rollup();
+
+COMMENT ON VIEW latest_snapshot_per_month IS 'Most recent snapshot of each month';
+COMMENT ON TABLE monthly_rollup IS 'Per-month/consulate/visa type counts and waiting-day aggregates of the latest snapshots, refreshed by update_and_detect.py';
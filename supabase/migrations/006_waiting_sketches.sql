@@ -0,0 +1,21 @@
+-- Mergeable waiting-day quantile sketches (see wait_sketch.py), one per
+-- (month, consulate, visa_type) of the latest snapshot of each month
+
+CREATE TABLE IF NOT EXISTS waiting_sketches (
+    month TEXT NOT NULL,
+    consulate TEXT NOT NULL,
+    visa_type TEXT NOT NULL,
+    snapshot_id UUID REFERENCES snapshots(id) ON DELETE CASCADE,
+    count INTEGER NOT NULL,
+    sketch JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (month, consulate, visa_type)
+);
+
+-- Range reads for one consulate and/or visa type across months
+CREATE INDEX IF NOT EXISTS idx_waiting_sketches_consulate_visa_month
+    ON waiting_sketches(consulate, visa_type, month);
+CREATE INDEX IF NOT EXISTS idx_waiting_sketches_visa_month
+    ON waiting_sketches(visa_type, month);
+
+COMMENT ON TABLE waiting_sketches IS 'Waiting-day quantile sketches of completed cases, rebuilt at snapshot ingest';
@@ -0,0 +1,33 @@
+-- Per-month signals for the adaptive refresh scheduler (refresh_scheduler.py)
+
+-- Served by idx_changes_month_detected_at (003)
+CREATE OR REPLACE FUNCTION month_refresh_stats(p_window_days INTEGER DEFAULT 30)
+RETURNS TABLE (
+    month TEXT,
+    last_scrape_at TIMESTAMPTZ,
+    last_change_at TIMESTAMPTZ,
+    changes_in_window BIGINT,
+    total INTEGER,
+    pending INTEGER
+) AS $$
+    SELECT
+        l.month,
+        l.scrape_date,
+        c.last_change_at,
+        COALESCE(c.changes_in_window, 0),
+        r.total,
+        r.pending
+    FROM latest_snapshot_per_month l
+    LEFT JOIN LATERAL (
+        -- waiting_days_update fires daily for every pending case, so it says
+        -- nothing about real activity; pending is counted separately
+        SELECT
+            MAX(ch.detected_at) AS last_change_at,
+            COUNT(*) FILTER (WHERE ch.detected_at >= now() - make_interval(days => p_window_days)) AS changes_in_window
+        FROM changes ch
+        WHERE ch.month = l.month
+          AND ch.change_type <> 'waiting_days_update'
+    ) c ON TRUE
+    LEFT JOIN monthly_rollup r
+        ON r.month = l.month AND r.consulate = 'ALL' AND r.visa_type = 'ALL';
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,163 @@
+-- Month work queue shared by update_and_detect.py --worker processes
+-- (month_queue.py). Each run (a backfill, a nightly refresh) is a set of
+-- month jobs; a worker leases one job at a time, heartbeats while it
+-- scrapes and saves, and records the outcome. An expired lease makes the
+-- job claimable again, so a crashed worker's month is retried elsewhere.
+
+CREATE TABLE IF NOT EXISTS month_jobs (
+    run_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    url TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker_id TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    started_at TIMESTAMPTZ,
+    completed_at TIMESTAMPTZ,
+    snapshot_id UUID REFERENCES snapshots(id) ON DELETE SET NULL,
+    records INTEGER,
+    changes INTEGER,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (run_id, month)
+);
+
+-- Claim scans only the open jobs of one run, in page order
+CREATE INDEX IF NOT EXISTS idx_month_jobs_open
+    ON month_jobs(run_id, position)
+    WHERE status IN ('pending', 'running');
+
+-- Add jobs to a run; months already in the run (any status) are left alone,
+-- so every worker of a run can enqueue the same months safely.
+-- Returns the number of jobs added.
+CREATE OR REPLACE FUNCTION enqueue_month_jobs(
+    p_run_id TEXT,
+    p_jobs JSONB,
+    p_max_attempts INTEGER DEFAULT 3
+)
+RETURNS INTEGER AS $$
+DECLARE
+    added INTEGER;
+BEGIN
+    INSERT INTO month_jobs (run_id, month, url, position, max_attempts)
+    SELECT p_run_id, j.month, j.url, j.position, p_max_attempts
+    FROM jsonb_to_recordset(p_jobs) AS j(month TEXT, url TEXT, position INTEGER)
+    ON CONFLICT (run_id, month) DO NOTHING;
+    GET DIAGNOSTICS added = ROW_COUNT;
+    RETURN added;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Lease the next open job of a run: pending, or running with an expired
+-- lease. SKIP LOCKED lets concurrent workers claim different months
+-- without waiting on each other. Returns no row when nothing is claimable.
+CREATE OR REPLACE FUNCTION claim_month_job(
+    p_run_id TEXT,
+    p_worker_id TEXT,
+    p_lease_seconds INTEGER
+)
+RETURNS SETOF month_jobs AS $$
+BEGIN
+    -- Expired leases that used up their attempts will not be retried
+    UPDATE month_jobs
+    SET status = 'failed',
+        last_error = COALESCE(last_error, 'lease expired')
+    WHERE run_id = p_run_id
+      AND status = 'running'
+      AND lease_expires_at < now()
+      AND attempts >= max_attempts;
+
+    RETURN QUERY
+    UPDATE month_jobs j
+    SET status = 'running',
+        worker_id = p_worker_id,
+        attempts = j.attempts + 1,
+        lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+        heartbeat_at = now(),
+        started_at = now()
+    WHERE (j.run_id, j.month) = (
+        SELECT o.run_id, o.month
+        FROM month_jobs o
+        WHERE o.run_id = p_run_id
+          AND o.status IN ('pending', 'running')
+          AND (o.status = 'pending' OR o.lease_expires_at < now())
+          AND o.attempts < o.max_attempts
+        ORDER BY o.position, o.month
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING j.*;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Extend the lease of a job this worker still holds.
+-- Returns FALSE when the lease was lost (expired and claimed elsewhere).
+CREATE OR REPLACE FUNCTION heartbeat_month_job(
+    p_run_id TEXT,
+    p_month TEXT,
+    p_worker_id TEXT,
+    p_lease_seconds INTEGER
+)
+RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE month_jobs
+    SET lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+        heartbeat_at = now()
+    WHERE run_id = p_run_id
+      AND month = p_month
+      AND status = 'running'
+      AND worker_id = p_worker_id;
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Record a finished job. Returns FALSE when the lease was lost.
+CREATE OR REPLACE FUNCTION complete_month_job(
+    p_run_id TEXT,
+    p_month TEXT,
+    p_worker_id TEXT,
+    p_snapshot_id UUID DEFAULT NULL,
+    p_records INTEGER DEFAULT NULL,
+    p_changes INTEGER DEFAULT NULL
+)
+RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE month_jobs
+    SET status = 'done',
+        completed_at = now(),
+        lease_expires_at = NULL,
+        snapshot_id = p_snapshot_id,
+        records = p_records,
+        changes = p_changes,
+        last_error = NULL
+    WHERE run_id = p_run_id
+      AND month = p_month
+      AND status = 'running'
+      AND worker_id = p_worker_id;
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Record a failed attempt: back to pending while attempts remain,
+-- otherwise failed. Returns the job's new status (NULL if the lease was lost).
+CREATE OR REPLACE FUNCTION fail_month_job(
+    p_run_id TEXT,
+    p_month TEXT,
+    p_worker_id TEXT,
+    p_error TEXT
+)
+RETURNS TEXT AS $$
+    UPDATE month_jobs
+    SET status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+        lease_expires_at = NULL,
+        last_error = p_error
+    WHERE run_id = p_run_id
+      AND month = p_month
+      AND status = 'running'
+      AND worker_id = p_worker_id
+    RETURNING status;
+$$ LANGUAGE sql;
@@ -0,0 +1,90 @@
+-- Full-text search over case notes and details (note_search.py)
+-- One row per case holding its latest text, upserted at ingest for cases
+-- that are new or whose note/status changed, so searching never scans the
+-- per-snapshot copies in records.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE TABLE IF NOT EXISTS case_notes (
+    casenum TEXT PRIMARY KEY,
+    month TEXT NOT NULL,
+    user_id TEXT,
+    visa_type TEXT,
+    consulate TEXT,
+    major TEXT,
+    status TEXT,
+    note TEXT NOT NULL DEFAULT '',
+    details TEXT NOT NULL DEFAULT '',
+    -- Weights match note_search.COLUMN_WEIGHTS: major, note, details
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', COALESCE(major, '')), 'A') ||
+        setweight(to_tsvector('english', note), 'B') ||
+        setweight(to_tsvector('english', details), 'C')
+    ) STORED,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Word and phrase matches
+CREATE INDEX IF NOT EXISTS idx_case_notes_search
+    ON case_notes USING GIN (search_vector);
+
+-- Fuzzy fallback for misspellings and partial words (word_similarity, <%)
+CREATE INDEX IF NOT EXISTS idx_case_notes_text_trgm
+    ON case_notes USING GIN ((note || ' ' || details) gin_trgm_ops);
+
+-- Backfill from the latest snapshot that has each case
+INSERT INTO case_notes (casenum, month, user_id, visa_type, consulate, major, status, note)
+SELECT DISTINCT ON (r.casenum)
+    r.casenum, r.month, r.user_id, r.visa_type, r.consulate, r.major, r.status, r.note
+FROM latest_snapshot_per_month l
+JOIN records r ON r.snapshot_id = l.id
+WHERE r.casenum <> ''
+  AND COALESCE(r.note, '') <> ''
+ORDER BY r.casenum, l.scrape_date DESC
+ON CONFLICT (casenum) DO NOTHING;
+
+-- Ranked search: full-text match first; when nothing matches, cases whose
+-- text contains words similar to the query (typos, partial words).
+-- NULL filters are ignored.
+CREATE OR REPLACE FUNCTION search_notes(
+    p_query TEXT,
+    p_month TEXT DEFAULT NULL,
+    p_consulate TEXT DEFAULT NULL,
+    p_visa_type TEXT DEFAULT NULL,
+    p_status TEXT DEFAULT NULL,
+    p_limit INTEGER DEFAULT 20
+)
+RETURNS TABLE (
+    casenum TEXT,
+    month TEXT,
+    rank REAL,
+    note TEXT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT c.casenum, c.month, ts_rank_cd(c.search_vector, q.tsq) AS rank, c.note
+    FROM case_notes c, websearch_to_tsquery('english', p_query) AS q(tsq)
+    WHERE c.search_vector @@ q.tsq
+      AND (p_month IS NULL OR c.month = p_month)
+      AND (p_consulate IS NULL OR c.consulate = p_consulate)
+      AND (p_visa_type IS NULL OR c.visa_type = p_visa_type)
+      AND (p_status IS NULL OR c.status = p_status)
+    ORDER BY 3 DESC, 1
+    LIMIT p_limit;
+
+    IF FOUND THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT c.casenum, c.month, word_similarity(p_query, c.note || ' ' || c.details) AS rank, c.note
+    FROM case_notes c
+    WHERE p_query <% (c.note || ' ' || c.details)
+      AND (p_month IS NULL OR c.month = p_month)
+      AND (p_consulate IS NULL OR c.consulate = p_consulate)
+      AND (p_visa_type IS NULL OR c.visa_type = p_visa_type)
+      AND (p_status IS NULL OR c.status = p_status)
+    ORDER BY 3 DESC, 1
+    LIMIT p_limit;
+END;
+$$ LANGUAGE plpgsql STABLE;
@@ -0,0 +1,82 @@
+-- Change feed: a monotonic sequence number on changes plus stored
+-- per-consumer offsets, so downstream jobs read every change exactly once
+-- ("seq > my offset") instead of polling overlapping detected_at windows.
+
+CREATE SEQUENCE IF NOT EXISTS changes_seq;
+
+ALTER TABLE changes ADD COLUMN IF NOT EXISTS seq BIGINT;
+
+-- Existing changes get sequence numbers in detection order
+WITH ordered AS (
+    SELECT id, row_number() OVER (ORDER BY detected_at, id) AS rn
+    FROM changes
+    WHERE seq IS NULL
+)
+UPDATE changes c
+SET seq = o.rn + COALESCE((SELECT MAX(seq) FROM changes), 0)
+FROM ordered o
+WHERE c.id = o.id;
+
+SELECT setval('changes_seq', COALESCE((SELECT MAX(seq) FROM changes), 0) + 1, false);
+
+ALTER SEQUENCE changes_seq OWNED BY changes.seq;
+ALTER TABLE changes ALTER COLUMN seq SET DEFAULT nextval('changes_seq');
+ALTER TABLE changes ALTER COLUMN seq SET NOT NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_changes_seq ON changes(seq);
+
+-- Sequence numbers are handed out at insert time, but a reader only sees
+-- them at commit. With two concurrent writers (e.g. --worker processes) a
+-- consumer could see seq 51 committed, move its offset past 50 and never
+-- see 50 when that transaction commits later. Inserting transactions
+-- therefore take a transaction-scoped lock first, which makes seq order
+-- equal commit order. Change batches are small, so the wait is short.
+CREATE OR REPLACE FUNCTION changes_serialize_seq()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('changes_seq'));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_changes_serialize_seq ON changes;
+CREATE TRIGGER trg_changes_serialize_seq
+    BEFORE INSERT ON changes
+    FOR EACH STATEMENT EXECUTE FUNCTION changes_serialize_seq();
+
+-- Push: LISTEN changes_feed gets the highest new seq when an insert
+-- commits, so followers can wait instead of polling
+CREATE OR REPLACE FUNCTION changes_notify_feed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('changes_feed', (SELECT MAX(seq) FROM inserted)::TEXT);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_changes_notify_feed ON changes;
+CREATE TRIGGER trg_changes_notify_feed
+    AFTER INSERT ON changes
+    REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE FUNCTION changes_notify_feed();
+
+-- Last seq each consumer has processed
+CREATE TABLE IF NOT EXISTS change_feed_offsets (
+    consumer TEXT PRIMARY KEY,
+    last_seq BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Store a consumer's offset; it only ever moves forward, so a late commit
+-- from a restarted consumer cannot replay changes. Returns the stored offset.
+CREATE OR REPLACE FUNCTION commit_change_offset(p_consumer TEXT, p_seq BIGINT)
+RETURNS BIGINT AS $$
+    INSERT INTO change_feed_offsets (consumer, last_seq, updated_at)
+    VALUES (p_consumer, p_seq, now())
+    ON CONFLICT (consumer) DO UPDATE
+    SET last_seq = GREATEST(change_feed_offsets.last_seq, EXCLUDED.last_seq),
+        updated_at = now()
+    RETURNING last_seq;
+$$ LANGUAGE sql;
+
+COMMENT ON COLUMN changes.seq IS 'Feed position: increases in commit order, read with seq > consumer offset';
@@ -0,0 +1,317 @@
+-- Snapshot compaction (compact_snapshots.py)
+-- Every run stores a full copy of its month, so records grows without
+-- bound. Old snapshots can be turned into deltas: a delta snapshot keeps
+-- only the rows of cases that are new or changed since the snapshot before
+-- it, plus a tombstone for each case that disappeared. The latest snapshots
+-- of a month and periodic checkpoints stay full, so rebuilding any snapshot
+-- reads at most one checkpoint interval of rows.
+--
+-- Pending cases' waiting_days grows with the calendar, which would make
+-- every pending case "changed" in every run. A row therefore also counts as
+-- unchanged when its waiting_days moved by exactly the days between the two
+-- scrapes, and rebuilding adds those days back (snapshot_waiting_days).
+
+ALTER TABLE snapshots ADD COLUMN IF NOT EXISTS storage TEXT NOT NULL DEFAULT 'full'
+    CHECK (storage IN ('full', 'delta'));
+
+-- Cases present before a delta snapshot but missing from it
+CREATE TABLE IF NOT EXISTS snapshot_removals (
+    snapshot_id UUID NOT NULL REFERENCES snapshots(id) ON DELETE CASCADE,
+    casenum TEXT NOT NULL,
+    PRIMARY KEY (snapshot_id, casenum)
+);
+
+CREATE INDEX IF NOT EXISTS idx_snapshot_removals_casenum ON snapshot_removals(casenum);
+
+-- waiting_days a stored row implies at a later scrape
+CREATE OR REPLACE FUNCTION snapshot_waiting_days(
+    p_waiting_days INTEGER,
+    p_complete_date DATE,
+    p_from TIMESTAMPTZ,
+    p_to TIMESTAMPTZ
+)
+RETURNS INTEGER AS $$
+    SELECT CASE
+        WHEN p_complete_date IS NULL AND p_waiting_days IS NOT NULL
+        THEN p_waiting_days + ((p_to AT TIME ZONE 'UTC')::date - (p_from AT TIME ZONE 'UTC')::date)
+        ELSE p_waiting_days
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Time travel: the records of any snapshot, full or delta, as they were
+-- scraped. Rows carried over from earlier snapshots keep their own id.
+CREATE OR REPLACE FUNCTION records_as_of(p_snapshot_id UUID)
+RETURNS SETOF records AS $$
+    WITH target AS (
+        SELECT id, month, scrape_date, created_at FROM snapshots WHERE id = p_snapshot_id
+    ),
+    base AS (
+        SELECT s.scrape_date
+        FROM snapshots s, target t
+        WHERE s.month = t.month AND s.scrape_date <= t.scrape_date AND s.storage = 'full'
+        ORDER BY s.scrape_date DESC
+        LIMIT 1
+    ),
+    chain AS (
+        SELECT s.id, s.scrape_date
+        FROM snapshots s, target t, base b
+        WHERE s.month = t.month AND s.scrape_date BETWEEN b.scrape_date AND t.scrape_date
+    ),
+    stored AS (
+        SELECT r.*, c.scrape_date AS stored_at,
+               rank() OVER (PARTITION BY r.casenum ORDER BY c.scrape_date DESC) AS recency
+        FROM chain c
+        JOIN records r ON r.snapshot_id = c.id
+    )
+    SELECT st.id, t.id, st.casenum, st.user_id, st.visa_type, st.visa_entry, st.consulate,
+           st.major, st.status, st.check_date, st.complete_date,
+           snapshot_waiting_days(st.waiting_days, st.complete_date, st.stored_at, t.scrape_date),
+           st.details_link, st.has_notes, st.note, st.month,
+           CASE WHEN st.snapshot_id = t.id THEN st.created_at ELSE t.created_at END
+    FROM stored st, target t
+    WHERE st.recency = 1
+      AND NOT EXISTS (
+          SELECT 1
+          FROM snapshot_removals x
+          JOIN chain c ON c.id = x.snapshot_id
+          WHERE x.casenum = st.casenum AND c.scrape_date > st.stored_at
+      );
+$$ LANGUAGE sql STABLE;
+
+-- One row per snapshot that contains the case, oldest first (the answer
+-- get_records_by_casenum gave before compaction)
+CREATE OR REPLACE FUNCTION get_record_history(p_casenum TEXT)
+RETURNS SETOF records AS $$
+    WITH stored AS (
+        SELECT r.*, s.scrape_date AS stored_at
+        FROM records r
+        JOIN snapshots s ON s.id = r.snapshot_id
+        WHERE r.casenum = p_casenum
+    )
+    SELECT h.*
+    FROM snapshots s
+    CROSS JOIN LATERAL (
+        SELECT st.id AS id, s.id AS snapshot_id, st.casenum AS casenum, st.user_id AS user_id,
+               st.visa_type AS visa_type, st.visa_entry AS visa_entry, st.consulate AS consulate,
+               st.major AS major, st.status AS status, st.check_date AS check_date,
+               st.complete_date AS complete_date,
+               snapshot_waiting_days(st.waiting_days, st.complete_date, st.stored_at, s.scrape_date) AS waiting_days,
+               st.details_link AS details_link, st.has_notes AS has_notes, st.note AS note,
+               st.month AS month,
+               CASE WHEN st.snapshot_id = s.id THEN st.created_at ELSE s.created_at END AS created_at
+        FROM stored st
+        WHERE st.month = s.month
+          AND st.stored_at = (
+              SELECT MAX(x.stored_at) FROM stored x
+              WHERE x.month = s.month AND x.stored_at <= s.scrape_date
+          )
+          -- Gone again if a later full snapshot lacks it or a delta removed it
+          AND NOT EXISTS (
+              SELECT 1 FROM snapshots f
+              WHERE f.month = s.month AND f.storage = 'full'
+                AND f.scrape_date > st.stored_at AND f.scrape_date <= s.scrape_date
+          )
+          AND NOT EXISTS (
+              SELECT 1
+              FROM snapshot_removals x
+              JOIN snapshots xs ON xs.id = x.snapshot_id
+              WHERE x.casenum = p_casenum AND xs.month = s.month
+                AND xs.scrape_date > st.stored_at AND xs.scrape_date <= s.scrape_date
+          )
+    ) h
+    WHERE s.month IN (SELECT month FROM stored)
+    ORDER BY s.scrape_date, h.created_at;
+$$ LANGUAGE sql STABLE;
+
+-- Full snapshots that may become deltas: all but the latest p_keep of each
+-- month and every p_checkpoint_every-th one (counting from the first, which
+-- is always a checkpoint). Positions never change because snapshots are
+-- never deleted, so the same snapshots stay checkpoints across runs.
+CREATE OR REPLACE FUNCTION snapshot_compaction_candidates(
+    p_keep INTEGER DEFAULT 3,
+    p_checkpoint_every INTEGER DEFAULT 10,
+    p_month TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    month TEXT,
+    scrape_date TIMESTAMPTZ,
+    total_records INTEGER
+) AS $$
+    SELECT ranked.id, ranked.month, ranked.scrape_date, ranked.total_records
+    FROM (
+        SELECT s.id, s.month, s.scrape_date, s.total_records, s.storage,
+               row_number() OVER (PARTITION BY s.month ORDER BY s.scrape_date) - 1 AS position,
+               row_number() OVER (PARTITION BY s.month ORDER BY s.scrape_date DESC) AS recency
+        FROM snapshots s
+        WHERE p_month IS NULL OR s.month = p_month
+    ) ranked
+    WHERE ranked.storage = 'full'
+      AND ranked.recency > GREATEST(p_keep, 1)
+      AND ranked.position % GREATEST(p_checkpoint_every, 1) <> 0
+    ORDER BY ranked.month, ranked.scrape_date;
+$$ LANGUAGE sql STABLE;
+
+-- First step of compacting a snapshot: record the cases that disappeared
+-- in it and mark it as a delta. Rows still stored in a delta snapshot are
+-- correct as they are, so reads stay right while compact_snapshot_batch
+-- deletes the redundant ones. Returns the number of removals recorded.
+CREATE OR REPLACE FUNCTION begin_snapshot_compaction(p_snapshot_id UUID)
+RETURNS INTEGER AS $$
+DECLARE
+    v_snapshot snapshots%ROWTYPE;
+    v_previous UUID;
+    v_removed INTEGER;
+BEGIN
+    SELECT * INTO v_snapshot FROM snapshots WHERE id = p_snapshot_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Snapshot % does not exist', p_snapshot_id;
+    END IF;
+    IF v_snapshot.storage = 'delta' THEN
+        RETURN 0;  -- Already begun; the batches pick up where they stopped
+    END IF;
+
+    SELECT s.id INTO v_previous
+    FROM snapshots s
+    WHERE s.month = v_snapshot.month AND s.scrape_date < v_snapshot.scrape_date
+    ORDER BY s.scrape_date DESC
+    LIMIT 1;
+    IF v_previous IS NULL THEN
+        RAISE EXCEPTION 'Snapshot % is the first of % and must stay full', p_snapshot_id, v_snapshot.month;
+    END IF;
+    IF NOT EXISTS (
+        SELECT 1 FROM snapshots s
+        WHERE s.month = v_snapshot.month AND s.scrape_date > v_snapshot.scrape_date
+    ) THEN
+        RAISE EXCEPTION 'Snapshot % is the latest of % and must stay full', p_snapshot_id, v_snapshot.month;
+    END IF;
+
+    INSERT INTO snapshot_removals (snapshot_id, casenum)
+    SELECT DISTINCT p_snapshot_id, a.casenum
+    FROM records_as_of(v_previous) a
+    WHERE NOT EXISTS (
+        SELECT 1 FROM records r
+        WHERE r.snapshot_id = p_snapshot_id AND r.casenum = a.casenum
+    )
+    ON CONFLICT DO NOTHING;
+    GET DIAGNOSTICS v_removed = ROW_COUNT;
+
+    UPDATE snapshots SET storage = 'delta' WHERE id = p_snapshot_id;
+    RETURN v_removed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Delete, from one batch of a delta snapshot's rows (id > p_after_id), the
+-- rows that equal the case's state in the snapshot before. Each call is its
+-- own short transaction touching at most p_limit rows. last_id is NULL once
+-- the snapshot has no rows left to look at.
+CREATE OR REPLACE FUNCTION compact_snapshot_batch(
+    p_snapshot_id UUID,
+    p_after_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 500
+)
+RETURNS TABLE (
+    last_id UUID,
+    deleted_rows INTEGER,
+    freed_bytes BIGINT
+) AS $$
+DECLARE
+    v_snapshot snapshots%ROWTYPE;
+    v_base_at TIMESTAMPTZ;
+    v_last UUID;
+    v_deleted INTEGER;
+    v_bytes BIGINT;
+BEGIN
+    SELECT * INTO v_snapshot FROM snapshots WHERE id = p_snapshot_id;
+    IF NOT FOUND OR v_snapshot.storage <> 'delta' THEN
+        RAISE EXCEPTION 'Snapshot % is not being compacted (call begin_snapshot_compaction first)', p_snapshot_id;
+    END IF;
+
+    SELECT MAX(s.scrape_date) INTO v_base_at
+    FROM snapshots s
+    WHERE s.month = v_snapshot.month AND s.scrape_date < v_snapshot.scrape_date AND s.storage = 'full';
+
+    SELECT b.id INTO v_last
+    FROM (
+        SELECT r.id FROM records r
+        WHERE r.snapshot_id = p_snapshot_id AND (p_after_id IS NULL OR r.id > p_after_id)
+        ORDER BY r.id
+        LIMIT p_limit
+    ) b
+    ORDER BY b.id DESC
+    LIMIT 1;
+
+    WITH batch AS (
+        SELECT r.*
+        FROM records r
+        WHERE r.snapshot_id = p_snapshot_id
+          AND (p_after_id IS NULL OR r.id > p_after_id)
+          AND r.id <= v_last
+    ),
+    previous AS (
+        SELECT b.id AS new_id, p.*
+        FROM batch b
+        CROSS JOIN LATERAL (
+            SELECT r.*, s.scrape_date AS stored_at,
+                   rank() OVER (ORDER BY s.scrape_date DESC) AS recency,
+                   count(*) OVER (PARTITION BY s.id) AS copies
+            FROM records r
+            JOIN snapshots s ON s.id = r.snapshot_id
+            WHERE r.casenum = b.casenum
+              AND s.month = v_snapshot.month
+              AND s.scrape_date >= v_base_at
+              AND s.scrape_date < v_snapshot.scrape_date
+        ) p
+        WHERE p.recency = 1
+    ),
+    redundant AS (
+        SELECT b.id
+        FROM batch b
+        JOIN previous p ON p.new_id = b.id
+        WHERE p.copies = 1
+          -- Duplicate keys in one snapshot are kept as stored
+          AND (SELECT count(*) FROM records d
+               WHERE d.snapshot_id = p_snapshot_id AND d.casenum = b.casenum) = 1
+          AND NOT EXISTS (
+              SELECT 1
+              FROM snapshot_removals x
+              JOIN snapshots xs ON xs.id = x.snapshot_id
+              WHERE x.casenum = b.casenum AND xs.month = v_snapshot.month
+                AND xs.scrape_date > p.stored_at AND xs.scrape_date < v_snapshot.scrape_date
+          )
+          AND b.user_id IS NOT DISTINCT FROM p.user_id
+          AND b.visa_type IS NOT DISTINCT FROM p.visa_type
+          AND b.visa_entry IS NOT DISTINCT FROM p.visa_entry
+          AND b.consulate IS NOT DISTINCT FROM p.consulate
+          AND b.major IS NOT DISTINCT FROM p.major
+          AND b.status IS NOT DISTINCT FROM p.status
+          AND b.check_date IS NOT DISTINCT FROM p.check_date
+          AND b.complete_date IS NOT DISTINCT FROM p.complete_date
+          AND b.waiting_days IS NOT DISTINCT FROM
+              snapshot_waiting_days(p.waiting_days, p.complete_date, p.stored_at, v_snapshot.scrape_date)
+          AND b.details_link IS NOT DISTINCT FROM p.details_link
+          AND b.has_notes IS NOT DISTINCT FROM p.has_notes
+          AND b.note IS NOT DISTINCT FROM p.note
+    ),
+    deleted AS (
+        DELETE FROM records r
+        USING redundant x
+        WHERE r.id = x.id
+        RETURNING r.*
+    )
+    SELECT count(*), COALESCE(SUM(pg_column_size(deleted.*)), 0)
+    INTO v_deleted, v_bytes
+    FROM deleted;
+
+    RETURN QUERY SELECT v_last, v_deleted, v_bytes;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Size of records with its indexes and TOAST, for compaction reports
+CREATE OR REPLACE FUNCTION records_storage_bytes()
+RETURNS BIGINT AS $$
+    SELECT pg_total_relation_size('records');
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON COLUMN snapshots.storage IS 'full: every record stored; delta: only rows changed since the previous snapshot (see records_as_of)';
+COMMENT ON TABLE snapshot_removals IS 'Cases missing from a delta snapshot that the snapshot before it had';
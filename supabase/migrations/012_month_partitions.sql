@@ -0,0 +1,424 @@
+-- Partition records and changes by month
+-- Every query of the pipeline and the dashboard is about one month, but
+-- with one shared table each of them walks indexes that cover the whole
+-- history. With LIST partitions on month, queries that filter on month
+-- (get_records_by_snapshot, /api/records, get_statistics, get_changes
+-- month=...) only touch that month's partition and its small indexes, and
+-- a month's data can be dropped or detached without a huge DELETE.
+--
+-- Partitions are named <table>_YYYY_MM and created by
+-- ensure_month_partitions, which update_and_detect.py calls for the months
+-- on the homepage before saving. Rows of a month without a partition land
+-- in <table>_default and are moved when its partition is created.
+--
+-- The existing rows are copied once, inside this migration.
+
+-- Create the records and changes partitions of each month that has none
+-- yet. Returns the number of partitions created.
+CREATE OR REPLACE FUNCTION ensure_month_partitions(p_months TEXT[])
+RETURNS INTEGER AS $$
+DECLARE
+    v_month TEXT;
+    v_parent TEXT;
+    v_partition TEXT;
+    v_created INTEGER := 0;
+    -- The schema the function was created in (pinned on search_path below);
+    -- every name is qualified with it
+    v_schema TEXT := current_schema();
+BEGIN
+    FOREACH v_month IN ARRAY p_months LOOP
+        IF v_month IS NULL OR v_month !~ '^\d{4}-\d{2}$' THEN
+            RAISE EXCEPTION 'Invalid month %: expected YYYY-MM', v_month;
+        END IF;
+
+        FOREACH v_parent IN ARRAY ARRAY['records', 'changes'] LOOP
+            v_partition := v_parent || '_' || replace(v_month, '-', '_');
+            CONTINUE WHEN to_regclass(format('%I.%I', v_schema, v_partition)) IS NOT NULL;
+
+            -- Workers of one run can see the same new month at the same time
+            PERFORM pg_advisory_xact_lock(hashtext(v_schema || '.' || v_partition));
+            CONTINUE WHEN to_regclass(format('%I.%I', v_schema, v_partition)) IS NOT NULL;
+
+            -- Attaching a table (instead of CREATE ... PARTITION OF) lets
+            -- rows the default partition already holds for this month move
+            -- over first; indexes, foreign keys and triggers are cloned
+            -- from the parent on attach
+            EXECUTE format(
+                'CREATE TABLE %I.%I (LIKE %I.%I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                v_schema, v_partition, v_schema, v_parent
+            );
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM %I.%I WHERE month = %L RETURNING *) INSERT INTO %I.%I SELECT * FROM moved',
+                v_schema, v_parent || '_default', v_month, v_schema, v_partition
+            );
+            EXECUTE format(
+                'ALTER TABLE %I.%I ATTACH PARTITION %I.%I FOR VALUES IN (%L)',
+                v_schema, v_parent, v_schema, v_partition, v_month
+            );
+            v_created := v_created + 1;
+        END LOOP;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- It runs with the owner's rights, so it must not resolve names through the
+-- caller's search_path (a caller could plant a table or function there).
+-- Pin it to the schema this migration runs in (public on Supabase) with
+-- pg_temp last.
+DO $$
+BEGIN
+    EXECUTE format(
+        'ALTER FUNCTION ensure_month_partitions(TEXT[]) SET search_path = %I, pg_temp',
+        current_schema()
+    );
+END $$;
+
+-- Creating tables needs the owner's rights; only the backend may call it
+REVOKE EXECUTE ON FUNCTION ensure_month_partitions(TEXT[]) FROM PUBLIC;
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+        REVOKE EXECUTE ON FUNCTION ensure_month_partitions(TEXT[]) FROM anon, authenticated;
+    END IF;
+END $$;
+
+-- These return the records row type, which must follow the table below
+DROP FUNCTION IF EXISTS records_as_of(UUID);
+DROP FUNCTION IF EXISTS get_record_history(TEXT);
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'records'::regclass) = 'p' THEN
+        RETURN;  -- Already partitioned
+    END IF;
+
+    -- records
+    ALTER TABLE records RENAME TO records_unpartitioned;
+    ALTER TABLE records_unpartitioned RENAME CONSTRAINT records_pkey TO records_unpartitioned_pkey;
+
+    CREATE TABLE records (
+        LIKE records_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS,
+        PRIMARY KEY (id, month),
+        FOREIGN KEY (snapshot_id) REFERENCES snapshots(id) ON DELETE CASCADE
+    ) PARTITION BY LIST (month);
+    CREATE TABLE records_default PARTITION OF records DEFAULT;
+
+    -- changes
+    ALTER TABLE changes RENAME TO changes_unpartitioned;
+    ALTER TABLE changes_unpartitioned RENAME CONSTRAINT changes_pkey TO changes_unpartitioned_pkey;
+    ALTER SEQUENCE changes_seq OWNED BY NONE;
+
+    CREATE TABLE changes (
+        LIKE changes_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS,
+        PRIMARY KEY (id, month),
+        FOREIGN KEY (snapshot_id_old) REFERENCES snapshots(id) ON DELETE SET NULL,
+        FOREIGN KEY (snapshot_id_new) REFERENCES snapshots(id) ON DELETE CASCADE
+    ) PARTITION BY LIST (month);
+    CREATE TABLE changes_default PARTITION OF changes DEFAULT;
+
+    PERFORM ensure_month_partitions(ARRAY(
+        SELECT month FROM records_unpartitioned
+        UNION
+        SELECT month FROM changes_unpartitioned
+        UNION
+        SELECT month FROM snapshots
+    ));
+
+    INSERT INTO records SELECT * FROM records_unpartitioned;
+    INSERT INTO changes SELECT * FROM changes_unpartitioned;
+
+    DROP TABLE records_unpartitioned;
+    DROP TABLE changes_unpartitioned;
+    ALTER SEQUENCE changes_seq OWNED BY changes.seq;
+END $$;
+
+-- Indexes are created on the parent after the copy and cascade to every
+-- partition, including the ones ensure_month_partitions attaches later.
+-- Within a partition month is constant, so idx_records_month is not rebuilt.
+CREATE INDEX IF NOT EXISTS idx_records_snapshot_filters
+    ON records(snapshot_id, consulate, visa_type, status);
+CREATE INDEX IF NOT EXISTS idx_records_snapshot_status
+    ON records(snapshot_id, status);
+CREATE INDEX IF NOT EXISTS idx_records_casenum_created_at
+    ON records(casenum, created_at);
+CREATE INDEX IF NOT EXISTS idx_records_status
+    ON records(status);
+
+CREATE INDEX IF NOT EXISTS idx_changes_casenum
+    ON changes(casenum);
+CREATE INDEX IF NOT EXISTS idx_changes_month_detected_at
+    ON changes(month, detected_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_changes_detected_at_id
+    ON changes(detected_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_changes_type_detected_at_id
+    ON changes(change_type, detected_at DESC, id DESC);
+-- A unique index on a partitioned table must include month; seq comes
+-- from a sequence, so it stays unique without one
+CREATE INDEX IF NOT EXISTS idx_changes_seq
+    ON changes(seq);
+
+-- Change feed triggers (migration 010). trg_changes_set_month is not
+-- recreated: a row trigger cannot move a row to another partition, so
+-- writers must set month (the pipeline always does; it is NOT NULL).
+DROP TRIGGER IF EXISTS trg_changes_serialize_seq ON changes;
+CREATE TRIGGER trg_changes_serialize_seq
+    BEFORE INSERT ON changes
+    FOR EACH STATEMENT EXECUTE FUNCTION changes_serialize_seq();
+
+DROP TRIGGER IF EXISTS trg_changes_notify_feed ON changes;
+CREATE TRIGGER trg_changes_notify_feed
+    AFTER INSERT ON changes
+    REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE FUNCTION changes_notify_feed();
+
+DROP FUNCTION IF EXISTS changes_set_month();
+
+-- Same as migration 011, for the partitioned row type; the rows of a
+-- snapshot are read from its month's partition only
+CREATE OR REPLACE FUNCTION records_as_of(p_snapshot_id UUID)
+RETURNS SETOF records AS $$
+    WITH target AS (
+        SELECT id, month, scrape_date, created_at FROM snapshots WHERE id = p_snapshot_id
+    ),
+    base AS (
+        SELECT s.scrape_date
+        FROM snapshots s, target t
+        WHERE s.month = t.month AND s.scrape_date <= t.scrape_date AND s.storage = 'full'
+        ORDER BY s.scrape_date DESC
+        LIMIT 1
+    ),
+    chain AS (
+        SELECT s.id, s.scrape_date
+        FROM snapshots s, target t, base b
+        WHERE s.month = t.month AND s.scrape_date BETWEEN b.scrape_date AND t.scrape_date
+    ),
+    stored AS (
+        SELECT r.*, c.scrape_date AS stored_at,
+               rank() OVER (PARTITION BY r.casenum ORDER BY c.scrape_date DESC) AS recency
+        FROM chain c
+        JOIN records r ON r.snapshot_id = c.id
+        WHERE r.month = (SELECT month FROM target)
+    )
+    SELECT st.id, t.id, st.casenum, st.user_id, st.visa_type, st.visa_entry, st.consulate,
+           st.major, st.status, st.check_date, st.complete_date,
+           snapshot_waiting_days(st.waiting_days, st.complete_date, st.stored_at, t.scrape_date),
+           st.details_link, st.has_notes, st.note, st.month,
+           CASE WHEN st.snapshot_id = t.id THEN st.created_at ELSE t.created_at END
+    FROM stored st, target t
+    WHERE st.recency = 1
+      AND NOT EXISTS (
+          SELECT 1
+          FROM snapshot_removals x
+          JOIN chain c ON c.id = x.snapshot_id
+          WHERE x.casenum = st.casenum AND c.scrape_date > st.stored_at
+      );
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION get_record_history(p_casenum TEXT)
+RETURNS SETOF records AS $$
+    WITH stored AS (
+        SELECT r.*, s.scrape_date AS stored_at
+        FROM records r
+        JOIN snapshots s ON s.id = r.snapshot_id
+        WHERE r.casenum = p_casenum
+    )
+    SELECT h.*
+    FROM snapshots s
+    CROSS JOIN LATERAL (
+        SELECT st.id AS id, s.id AS snapshot_id, st.casenum AS casenum, st.user_id AS user_id,
+               st.visa_type AS visa_type, st.visa_entry AS visa_entry, st.consulate AS consulate,
+               st.major AS major, st.status AS status, st.check_date AS check_date,
+               st.complete_date AS complete_date,
+               snapshot_waiting_days(st.waiting_days, st.complete_date, st.stored_at, s.scrape_date) AS waiting_days,
+               st.details_link AS details_link, st.has_notes AS has_notes, st.note AS note,
+               st.month AS month,
+               CASE WHEN st.snapshot_id = s.id THEN st.created_at ELSE s.created_at END AS created_at
+        FROM stored st
+        WHERE st.month = s.month
+          AND st.stored_at = (
+              SELECT MAX(x.stored_at) FROM stored x
+              WHERE x.month = s.month AND x.stored_at <= s.scrape_date
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM snapshots f
+              WHERE f.month = s.month AND f.storage = 'full'
+                AND f.scrape_date > st.stored_at AND f.scrape_date <= s.scrape_date
+          )
+          AND NOT EXISTS (
+              SELECT 1
+              FROM snapshot_removals x
+              JOIN snapshots xs ON xs.id = x.snapshot_id
+              WHERE x.casenum = p_casenum AND xs.month = s.month
+                AND xs.scrape_date > st.stored_at AND xs.scrape_date <= s.scrape_date
+          )
+    ) h
+    WHERE s.month IN (SELECT month FROM stored)
+    ORDER BY s.scrape_date, h.created_at;
+$$ LANGUAGE sql STABLE;
+
+-- Compaction (migration 011) with every records reference pinned to the
+-- snapshot's month: rows, previous states and the DELETE are all read from
+-- one partition instead of probing every month's indexes
+CREATE OR REPLACE FUNCTION begin_snapshot_compaction(p_snapshot_id UUID)
+RETURNS INTEGER AS $$
+DECLARE
+    v_snapshot snapshots%ROWTYPE;
+    v_previous UUID;
+    v_removed INTEGER;
+BEGIN
+    SELECT * INTO v_snapshot FROM snapshots WHERE id = p_snapshot_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Snapshot % does not exist', p_snapshot_id;
+    END IF;
+    IF v_snapshot.storage = 'delta' THEN
+        RETURN 0;  -- Already begun; the batches pick up where they stopped
+    END IF;
+
+    SELECT s.id INTO v_previous
+    FROM snapshots s
+    WHERE s.month = v_snapshot.month AND s.scrape_date < v_snapshot.scrape_date
+    ORDER BY s.scrape_date DESC
+    LIMIT 1;
+    IF v_previous IS NULL THEN
+        RAISE EXCEPTION 'Snapshot % is the first of % and must stay full', p_snapshot_id, v_snapshot.month;
+    END IF;
+    IF NOT EXISTS (
+        SELECT 1 FROM snapshots s
+        WHERE s.month = v_snapshot.month AND s.scrape_date > v_snapshot.scrape_date
+    ) THEN
+        RAISE EXCEPTION 'Snapshot % is the latest of % and must stay full', p_snapshot_id, v_snapshot.month;
+    END IF;
+
+    INSERT INTO snapshot_removals (snapshot_id, casenum)
+    SELECT DISTINCT p_snapshot_id, a.casenum
+    FROM records_as_of(v_previous) a
+    WHERE NOT EXISTS (
+        SELECT 1 FROM records r
+        WHERE r.snapshot_id = p_snapshot_id AND r.month = v_snapshot.month
+          AND r.casenum = a.casenum
+    )
+    ON CONFLICT DO NOTHING;
+    GET DIAGNOSTICS v_removed = ROW_COUNT;
+
+    UPDATE snapshots SET storage = 'delta' WHERE id = p_snapshot_id;
+    RETURN v_removed;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION compact_snapshot_batch(
+    p_snapshot_id UUID,
+    p_after_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 500
+)
+RETURNS TABLE (
+    last_id UUID,
+    deleted_rows INTEGER,
+    freed_bytes BIGINT
+) AS $$
+DECLARE
+    v_snapshot snapshots%ROWTYPE;
+    v_base_at TIMESTAMPTZ;
+    v_last UUID;
+    v_deleted INTEGER;
+    v_bytes BIGINT;
+BEGIN
+    SELECT * INTO v_snapshot FROM snapshots WHERE id = p_snapshot_id;
+    IF NOT FOUND OR v_snapshot.storage <> 'delta' THEN
+        RAISE EXCEPTION 'Snapshot % is not being compacted (call begin_snapshot_compaction first)', p_snapshot_id;
+    END IF;
+
+    SELECT MAX(s.scrape_date) INTO v_base_at
+    FROM snapshots s
+    WHERE s.month = v_snapshot.month AND s.scrape_date < v_snapshot.scrape_date AND s.storage = 'full';
+
+    SELECT b.id INTO v_last
+    FROM (
+        SELECT r.id FROM records r
+        WHERE r.snapshot_id = p_snapshot_id AND r.month = v_snapshot.month
+          AND (p_after_id IS NULL OR r.id > p_after_id)
+        ORDER BY r.id
+        LIMIT p_limit
+    ) b
+    ORDER BY b.id DESC
+    LIMIT 1;
+
+    WITH batch AS (
+        SELECT r.*
+        FROM records r
+        WHERE r.snapshot_id = p_snapshot_id
+          AND r.month = v_snapshot.month
+          AND (p_after_id IS NULL OR r.id > p_after_id)
+          AND r.id <= v_last
+    ),
+    previous AS (
+        SELECT b.id AS new_id, p.*
+        FROM batch b
+        CROSS JOIN LATERAL (
+            SELECT r.*, s.scrape_date AS stored_at,
+                   rank() OVER (ORDER BY s.scrape_date DESC) AS recency,
+                   count(*) OVER (PARTITION BY s.id) AS copies
+            FROM records r
+            JOIN snapshots s ON s.id = r.snapshot_id
+            WHERE r.casenum = b.casenum
+              AND r.month = v_snapshot.month
+              AND s.month = v_snapshot.month
+              AND s.scrape_date >= v_base_at
+              AND s.scrape_date < v_snapshot.scrape_date
+        ) p
+        WHERE p.recency = 1
+    ),
+    redundant AS (
+        SELECT b.id
+        FROM batch b
+        JOIN previous p ON p.new_id = b.id
+        WHERE p.copies = 1
+          -- Duplicate keys in one snapshot are kept as stored
+          AND (SELECT count(*) FROM records d
+               WHERE d.snapshot_id = p_snapshot_id AND d.month = v_snapshot.month
+                 AND d.casenum = b.casenum) = 1
+          AND NOT EXISTS (
+              SELECT 1
+              FROM snapshot_removals x
+              JOIN snapshots xs ON xs.id = x.snapshot_id
+              WHERE x.casenum = b.casenum AND xs.month = v_snapshot.month
+                AND xs.scrape_date > p.stored_at AND xs.scrape_date < v_snapshot.scrape_date
+          )
+          AND b.user_id IS NOT DISTINCT FROM p.user_id
+          AND b.visa_type IS NOT DISTINCT FROM p.visa_type
+          AND b.visa_entry IS NOT DISTINCT FROM p.visa_entry
+          AND b.consulate IS NOT DISTINCT FROM p.consulate
+          AND b.major IS NOT DISTINCT FROM p.major
+          AND b.status IS NOT DISTINCT FROM p.status
+          AND b.check_date IS NOT DISTINCT FROM p.check_date
+          AND b.complete_date IS NOT DISTINCT FROM p.complete_date
+          AND b.waiting_days IS NOT DISTINCT FROM
+              snapshot_waiting_days(p.waiting_days, p.complete_date, p.stored_at, v_snapshot.scrape_date)
+          AND b.details_link IS NOT DISTINCT FROM p.details_link
+          AND b.has_notes IS NOT DISTINCT FROM p.has_notes
+          AND b.note IS NOT DISTINCT FROM p.note
+    ),
+    deleted AS (
+        DELETE FROM records r
+        USING redundant x
+        WHERE r.month = v_snapshot.month AND r.id = x.id
+        RETURNING r.*
+    )
+    SELECT count(*), COALESCE(SUM(pg_column_size(deleted.*)), 0)
+    INTO v_deleted, v_bytes
+    FROM deleted;
+
+    RETURN QUERY SELECT v_last, v_deleted, v_bytes;
+END;
+$$ LANGUAGE plpgsql;
+
+-- pg_total_relation_size of a partitioned table is 0; add up its partitions
+CREATE OR REPLACE FUNCTION records_storage_bytes()
+RETURNS BIGINT AS $$
+    SELECT COALESCE(SUM(pg_total_relation_size(relid)), 0)::BIGINT
+    FROM pg_partition_tree('records')
+    WHERE isleaf;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON TABLE records IS 'Stores individual visa application records from each snapshot (partitioned by month)';
+COMMENT ON TABLE changes IS 'Tracks detected changes between snapshots (partitioned by month)';
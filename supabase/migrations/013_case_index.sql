@@ -0,0 +1,64 @@
+-- Cross-month case index (case_index.py)
+-- A case's month is the check-date listing it appears under, and a case
+-- can move to another month page between scrapes. Each month is diffed on
+-- its own, so a move used to show up as a new record in one month and a
+-- removal in the other. case_index holds one row per case: the month it is
+-- listed under now, when it was first and last seen, and its latest
+-- status. update_case_index folds in every saved snapshot, and the change
+-- detector looks up the cases it is about to report as new or removed by
+-- key instead of reading other months' snapshots.
+
+CREATE TABLE IF NOT EXISTS case_index (
+    casenum TEXT PRIMARY KEY,
+    month TEXT NOT NULL,
+    status TEXT,
+    first_seen TIMESTAMPTZ NOT NULL,
+    last_seen TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_case_index_month ON case_index(month);
+
+-- Backfill from the newest stored row of each case. Compacted snapshots
+-- only store rows that changed, so last_seen of a case that has left every
+-- page can be earlier than its last scrape.
+INSERT INTO case_index (casenum, month, status, first_seen, last_seen)
+SELECT DISTINCT ON (r.casenum)
+    r.casenum, r.month, r.status,
+    MIN(s.scrape_date) OVER (PARTITION BY r.casenum),
+    s.scrape_date
+FROM records r
+JOIN snapshots s ON s.id = r.snapshot_id
+WHERE r.casenum <> ''
+ORDER BY r.casenum, s.scrape_date DESC
+ON CONFLICT (casenum) DO NOTHING;
+
+-- Fold one saved snapshot into the index: every case on the page is now
+-- listed under the snapshot's month with its scraped status. A row is only
+-- overwritten by a newer scrape, so months saved concurrently (or out of
+-- order) leave each case where it was seen last. Rows are written in key
+-- order, so concurrent calls lock them in the same order.
+-- Returns the number of index rows written.
+CREATE OR REPLACE FUNCTION update_case_index(p_snapshot_id UUID)
+RETURNS INTEGER AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    INSERT INTO case_index AS c (casenum, month, status, first_seen, last_seen)
+    SELECT DISTINCT ON (r.casenum)
+        r.casenum, s.month, r.status, s.scrape_date, s.scrape_date
+    FROM snapshots s
+    JOIN records r ON r.snapshot_id = s.id AND r.month = s.month
+    WHERE s.id = p_snapshot_id
+      AND r.casenum <> ''
+    ORDER BY r.casenum
+    ON CONFLICT (casenum) DO UPDATE
+        SET month = EXCLUDED.month,
+            status = EXCLUDED.status,
+            last_seen = EXCLUDED.last_seen
+        WHERE c.last_seen <= EXCLUDED.last_seen;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON TABLE case_index IS 'One row per case: the month page it is listed under now, first/last scrape that had it and its latest status; updated by update_and_detect.py';
@@ -5,17 +5,56 @@ Handles saving snapshots, records, and changes to Supabase
 """
 
 import os
-from typing import List, Dict, Optional
+import re
+import uuid
+from typing import List, Dict, Optional, Set, Tuple, TYPE_CHECKING
 from datetime import datetime
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from normalize import parse_date, parse_int
+from note_search import search_filters
+from visa_record import case_key, extract_casenum
 
-load_dotenv()
+if TYPE_CHECKING:
+    from supabase import Client
+
+# detected_at as PostgREST returns it (ISO 8601 timestamp); a cursor goes
+# into the or() filter grammar, so nothing else may get through
+_CURSOR_TIMESTAMP_RE = re.compile(
+    r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d{1,6})?(Z|[+-]\d{2}(:?\d{2})?)?'
+)
+
+
+def record_to_row(record, snapshot_id: str, month: str) -> Dict:
+    """Convert a scraped record into a `records` table row"""
+    check_date = parse_date(record.get('check_date', ''))
+    complete_date = parse_date(record.get('complete_date', ''))
+    return {
+        'snapshot_id': snapshot_id,
+        'casenum': case_key(record),
+        'user_id': record.get('id', ''),
+        'visa_type': record.get('visa_type', ''),
+        'visa_entry': record.get('visa_entry', ''),
+        'consulate': record.get('consulate', ''),
+        'major': record.get('major', ''),
+        'status': record.get('status', ''),
+        'check_date': check_date.isoformat() if check_date else None,
+        'complete_date': complete_date.isoformat() if complete_date else None,
+        'waiting_days': parse_int(record.get('waiting_days', '')),
+        'details_link': record.get('details_link', ''),
+        'has_notes': record.get('has_notes', False),
+        'note': record.get('note', ''),
+        'month': month
+    }
 
 
 class SupabaseClient:
     def __init__(self):
         """Initialize Supabase client with credentials from environment variables"""
+        # Imported here: supabase pulls in httpx, pydantic and friends, which
+        # entry points that never reach the database shouldn't pay for
+        from dotenv import load_dotenv
+        from supabase import create_client
+        
+        load_dotenv()
         supabase_url = os.getenv('SUPABASE_URL')
         supabase_key = os.getenv('SUPABASE_SECRET_KEY')  # Use secret key for backend operations
         
@@ -27,14 +66,14 @@ class SupabaseClient:
         # Ensure URL doesn't have trailing slash
         supabase_url = supabase_url.rstrip('/')
         
-        self.client: Client = create_client(supabase_url, supabase_key)
+        self.client: 'Client' = create_client(supabase_url, supabase_key)
     
     def save_snapshot(self, records: List[Dict], month: str) -> str:
         """
         Save a new snapshot and all its records to the database
         
         Args:
-            records: List of record dictionaries
+            records: List of records (VisaRecord or dictionaries)
             month: Month in YYYY-MM format
             
         Returns:
@@ -65,36 +104,23 @@ class SupabaseClient:
                 else:
                     raise
         
-        # Extract casenum from details_link for each record
-        records_with_casenum = []
-        for record in records:
-            record_data = {
-                'snapshot_id': snapshot_id,
-                'casenum': self._extract_casenum(record.get('details_link', '')),
-                'user_id': record.get('id', ''),
-                'visa_type': record.get('visa_type', ''),
-                'visa_entry': record.get('visa_entry', ''),
-                'consulate': record.get('consulate', ''),
-                'major': record.get('major', ''),
-                'status': record.get('status', ''),
-                'check_date': self._parse_date(record.get('check_date', '')),
-                'complete_date': self._parse_date(record.get('complete_date', '')),
-                'waiting_days': self._parse_int(record.get('waiting_days', '')),
-                'details_link': record.get('details_link', ''),
-                'has_notes': record.get('has_notes', False),
-                'note': record.get('note', ''),
-                'month': month
-            }
-            records_with_casenum.append(record_data)
-        
-        # Batch insert records (Supabase supports up to 1000 per batch)
+        # Batch insert records (Supabase supports up to 1000 per batch).
+        # Rows are built one batch at a time so only one batch of dicts is
+        # alive alongside the compact records.
         batch_size = 1000
-        for i in range(0, len(records_with_casenum), batch_size):
-            batch = records_with_casenum[i:i + batch_size]
+        for i in range(0, len(records), batch_size):
+            batch = [
+                self._record_to_row(record, snapshot_id, month)
+                for record in records[i:i + batch_size]
+            ]
             self.client.table('records').insert(batch).execute()
         
         return snapshot_id
     
+    def _record_to_row(self, record, snapshot_id: str, month: str) -> Dict:
+        """Convert a scraped record into a `records` table row"""
+        return record_to_row(record, snapshot_id, month)
+    
     def get_latest_snapshot(self, month: Optional[str] = None) -> Optional[Dict]:
         """
         Get the most recent snapshot for a given month (or overall if month is None)
@@ -116,38 +142,178 @@ class SupabaseClient:
             return result.data[0]
         return None
     
-    def get_records_by_snapshot(self, snapshot_id: str) -> List[Dict]:
+    def get_records_by_snapshot(self, snapshot_id: str, month: Optional[str] = None) -> List[Dict]:
         """
         Get all records for a specific snapshot
         
+        Reads the stored rows, which is every record only for full
+        snapshots; use get_records_as_of for compacted ones.
+        
         Args:
             snapshot_id: UUID of the snapshot
+            month: The snapshot's month (YYYY-MM); when given, only that
+                month's partition is read
             
         Returns:
             List of record dictionaries
         """
-        result = self.client.table('records').select('*').eq('snapshot_id', snapshot_id).execute()
-        return result.data
+        def build_query():
+            query = self.client.table('records').select('*').eq('snapshot_id', snapshot_id)
+            if month:
+                query = query.eq('month', month)
+            return query.order('id')
+        
+        return list(self._fetch_all(build_query))
+    
+    def iter_latest_records(self, columns: Optional[List[str]] = None, page_size: int = 1000):
+        """
+        Iterate over the records of the latest snapshot of every month
+        
+        Args:
+            columns: Columns to select (default: all)
+            page_size: Rows fetched per request
+            
+        Yields:
+            Record dictionaries
+        """
+        select = ','.join(columns) if columns else '*'
+        snapshots = self.client.table('latest_snapshot_per_month').select('id,month').execute().data
+        
+        for snapshot in snapshots:
+            yield from self._fetch_all(
+                lambda: (
+                    self.client.table('records')
+                    .select(select)
+                    .eq('snapshot_id', snapshot['id'])
+                    .eq('month', snapshot['month'])
+                    .order('id')
+                ),
+                page_size
+            )
+    
+    def _fetch_all(self, build_query, page_size: int = 1000):
+        """
+        Page through a query with range requests (PostgREST caps rows per response)
+        
+        Args:
+            build_query: Callable returning a fresh, ordered query builder
+            page_size: Rows fetched per request
+            
+        Yields:
+            Row dictionaries
+        """
+        offset = 0
+        while True:
+            rows = build_query().range(offset, offset + page_size - 1).execute().data
+            yield from rows
+            if len(rows) < page_size:
+                break
+            offset += page_size
     
     def get_records_by_casenum(self, casenum: str) -> List[Dict]:
         """
         Get all records (across all snapshots) for a specific casenum
         
+        Compacted (delta) snapshots are rebuilt in SQL, so there is still
+        one record per snapshot that contains the case (migration 011).
+        
         Args:
             casenum: Case number identifier
             
         Returns:
             List of record dictionaries ordered by created_at
         """
-        result = (
-            self.client.table('records')
-            .select('*')
-            .eq('casenum', casenum)
-            .order('created_at', desc=False)
-            .execute()
-        )
+        result = self.client.rpc('get_record_history', {'p_casenum': casenum}).execute()
         return result.data
     
+    def get_records_as_of(self, snapshot_id: str) -> List[Dict]:
+        """
+        Get the records of any snapshot as they were scraped, including
+        snapshots that compaction turned into deltas
+        
+        Args:
+            snapshot_id: UUID of the snapshot
+            
+        Returns:
+            List of record dictionaries
+        """
+        return list(self._fetch_all(
+            lambda: self.client.rpc('records_as_of', {'p_snapshot_id': snapshot_id}).order('casenum').order('id')
+        ))
+    
+    def get_compaction_candidates(
+        self,
+        keep: int = 3,
+        checkpoint_every: int = 10,
+        month: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Get the full snapshots that compaction may turn into deltas
+        
+        Args:
+            keep: Latest snapshots of each month that stay full
+            checkpoint_every: Every n-th snapshot of a month stays full
+            month: Only this month (YYYY-MM); None for all months
+            
+        Returns:
+            List of snapshot dictionaries (id, month, scrape_date, total_records)
+        """
+        result = self.client.rpc('snapshot_compaction_candidates', {
+            'p_keep': keep,
+            'p_checkpoint_every': checkpoint_every,
+            'p_month': month
+        }).execute()
+        return result.data
+    
+    def begin_snapshot_compaction(self, snapshot_id: str) -> int:
+        """
+        Record the cases missing from a snapshot and mark it as a delta
+        
+        Returns:
+            Number of removed cases recorded (0 when already begun)
+        """
+        result = self.client.rpc('begin_snapshot_compaction', {'p_snapshot_id': snapshot_id}).execute()
+        return result.data or 0
+    
+    def compact_snapshot_batch(self, snapshot_id: str, after_id: Optional[str] = None, limit: int = 500) -> Dict:
+        """
+        Delete the redundant rows in one batch of a delta snapshot
+        
+        Args:
+            snapshot_id: UUID of a snapshot begin_snapshot_compaction was called for
+            after_id: last_id of the previous batch (None for the first)
+            limit: Rows looked at in this batch
+            
+        Returns:
+            Dictionary with last_id (None when the snapshot is done),
+            deleted_rows and freed_bytes
+        """
+        result = self.client.rpc('compact_snapshot_batch', {
+            'p_snapshot_id': snapshot_id,
+            'p_after_id': after_id,
+            'p_limit': limit
+        }).execute()
+        return result.data[0]
+    
+    def ensure_month_partitions(self, months: List[str]) -> int:
+        """
+        Create the records and changes partitions of months that have none
+        
+        Args:
+            months: Months in YYYY-MM format
+            
+        Returns:
+            Number of partitions created (0 when all exist)
+        """
+        if not months:
+            return 0
+        result = self.client.rpc('ensure_month_partitions', {'p_months': sorted(set(months))}).execute()
+        return result.data or 0
+    
+    def get_records_storage_bytes(self) -> int:
+        """Size of the records table with its indexes, in bytes"""
+        return self.client.rpc('records_storage_bytes', {}).execute().data
+    
     def save_changes(self, changes: List[Dict]) -> None:
         """
         Save detected changes to the database
@@ -171,6 +337,73 @@ class SupabaseClient:
             batch = changes[i:i + batch_size]
             self.client.table('changes').insert(batch).execute()
     
+    def get_removed_casenums(self, month: str) -> Set[str]:
+        """
+        Get the cases of a month whose latest whole-case change is a removal
+        
+        A case that moved into the month (case_moved) is on its page again,
+        like a reappeared one.
+        
+        Args:
+            month: Month in YYYY-MM format
+            
+        Returns:
+            Set of case keys currently missing from the month page
+        """
+        rows = self._fetch_all(
+            lambda: (
+                self.client.table('changes')
+                .select('casenum,change_type')
+                .eq('month', month)
+                .in_('change_type', ['removed', 'reappeared', 'case_moved'])
+                .order('detected_at')
+                .order('id')
+            )
+        )
+        
+        removed = set()
+        for row in rows:
+            if row['change_type'] == 'removed':
+                removed.add(row['casenum'])
+            else:
+                removed.discard(row['casenum'])
+        return removed
+    
+    def get_case_index(self, casenums: List[str]) -> Dict[str, Dict]:
+        """
+        Look up cases in the cross-month case index
+        
+        Args:
+            casenums: Case keys to look up (keep batches small, they go in the URL)
+            
+        Returns:
+            Dictionary mapping each indexed key to its month, status,
+            first_seen and last_seen (keys without a row are left out)
+        """
+        if not casenums:
+            return {}
+        result = (
+            self.client.table('case_index')
+            .select('casenum,month,status,first_seen,last_seen')
+            .in_('casenum', list(casenums))
+            .execute()
+        )
+        return {row.pop('casenum'): row for row in result.data}
+    
+    def update_case_index(self, snapshot_id: str) -> int:
+        """
+        Fold a saved snapshot into the case index: its cases are now listed
+        under its month, with their scraped status and last_seen
+        
+        Args:
+            snapshot_id: UUID of the snapshot
+            
+        Returns:
+            Number of index rows written
+        """
+        result = self.client.rpc('update_case_index', {'p_snapshot_id': snapshot_id}).execute()
+        return result.data or 0
+    
     def get_changes(
         self,
         since_date: Optional[datetime] = None,
@@ -181,6 +414,9 @@ class SupabaseClient:
         """
         Query changes with optional filters
         
+        For processing every change once (alerts, exports), read the
+        change feed with iter_changes instead of polling this.
+        
         Args:
             since_date: Only return changes after this date
             month: Filter by month (YYYY-MM)
@@ -188,37 +424,443 @@ class SupabaseClient:
             limit: Maximum number of results
             
         Returns:
-            List of change dictionaries
+            List of change dictionaries, newest first
+        """
+        page = self.get_changes_page(
+            since_date=since_date,
+            month=month,
+            change_type=change_type,
+            limit=limit
+        )
+        return page['changes']
+    
+    def get_changes_page(
+        self,
+        since_date: Optional[datetime] = None,
+        month: Optional[str] = None,
+        change_type: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Dict:
+        """
+        Query one page of changes, newest first, using keyset pagination
+        
+        Filtering, ordering and pagination all run in SQL on the
+        (month, detected_at, id) indexes. Pass the returned next_cursor back
+        in to fetch the following page.
+        
+        Args:
+            since_date: Only return changes after this date
+            month: Filter by month (YYYY-MM)
+            change_type: Filter by change type
+            limit: Maximum number of results per page
+            cursor: next_cursor from the previous page (None for the first page)
+            
+        Returns:
+            Dictionary with 'changes' (list of change dictionaries) and
+            'next_cursor' (None when there are no more pages)
+            
+        Raises:
+            ValueError: The cursor is not one this method returned
         """
-        query = self.client.table('changes').select('*').order('detected_at', desc=True).limit(limit)
+        query = (
+            self.client.table('changes')
+            .select('*')
+            .order('detected_at', desc=True)
+            .order('id', desc=True)
+            .limit(limit)
+        )
         
         if since_date:
             query = query.gte('detected_at', since_date.isoformat())
         
+        if month:
+            query = query.eq('month', month)
+        
         if change_type:
             query = query.eq('change_type', change_type)
         
-        # For month filter, we need to join with snapshots or records
-        # For now, we'll filter client-side if needed
-        result = query.execute()
+        if cursor:
+            detected_at, change_id = self._decode_cursor(cursor)
+            # (detected_at, id) < (cursor.detected_at, cursor.id)
+            query = query.or_(
+                f'detected_at.lt."{detected_at}",'
+                f'and(detected_at.eq."{detected_at}",id.lt.{change_id})'
+            )
         
-        changes = result.data
+        changes = query.execute().data
         
-        # Filter by month if specified (requires checking snapshot month)
-        if month:
-            # Get snapshot IDs for this month
-            snapshots_result = (
-                self.client.table('snapshots')
-                .select('id')
-                .eq('month', month)
+        next_cursor = None
+        if len(changes) == limit:
+            last = changes[-1]
+            next_cursor = self._encode_cursor(last['detected_at'], last['id'])
+        
+        return {'changes': changes, 'next_cursor': next_cursor}
+    
+    def get_changes_after(self, after_seq: int = 0, limit: int = 500) -> List[Dict]:
+        """
+        Get the changes that follow a feed position, oldest first
+        
+        Args:
+            after_seq: Feed position (seq) already processed; 0 for the start
+            limit: Maximum number of changes
+            
+        Returns:
+            List of change dictionaries in seq order
+        """
+        return (
+            self.client.table('changes')
+            .select('*')
+            .gt('seq', after_seq)
+            .order('seq')
+            .limit(limit)
+            .execute()
+            .data
+        )
+    
+    def iter_changes(self, after_cursor: Optional[str] = None, batch_size: int = 500):
+        """
+        Iterate over every change after a feed cursor until caught up
+        
+        Unlike get_changes, nothing is read twice and nothing is skipped:
+        seq increases in commit order (migration 010), so `seq > cursor`
+        picks up exactly the changes committed since the last read.
+        
+        Args:
+            after_cursor: str(seq) of the last processed change (None for the start)
+            batch_size: Changes fetched per request
+            
+        Yields:
+            Change dictionaries in seq order
+        """
+        after_seq = int(after_cursor or 0)
+        while True:
+            batch = self.get_changes_after(after_seq, batch_size)
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after_seq = batch[-1]['seq']
+    
+    def get_change_offset(self, consumer: str) -> int:
+        """Last seq a feed consumer has committed (0 if it never did)"""
+        result = (
+            self.client.table('change_feed_offsets')
+            .select('last_seq')
+            .eq('consumer', consumer)
+            .execute()
+        )
+        return result.data[0]['last_seq'] if result.data else 0
+    
+    def commit_change_offset(self, consumer: str, seq: int) -> int:
+        """
+        Store a feed consumer's position (it never moves backwards)
+        
+        Args:
+            consumer: Consumer name, e.g. 'alerts'
+            seq: seq of the last processed change
+            
+        Returns:
+            The stored offset
+        """
+        result = self.client.rpc('commit_change_offset', {'p_consumer': consumer, 'p_seq': seq}).execute()
+        return result.data if result.data is not None else seq
+    
+    def save_case_events(self, events: List[Dict]) -> None:
+        """
+        Append case timeline events, ignoring ones that already exist
+        
+        Args:
+            events: List of case event dictionaries (see case_timeline.build_case_events)
+        """
+        if not events:
+            return
+        
+        batch_size = 1000
+        for i in range(0, len(events), batch_size):
+            batch = events[i:i + batch_size]
+            (
+                self.client.table('case_events')
+                .upsert(batch, on_conflict='casenum,event_type,event_at,status', ignore_duplicates=True)
                 .execute()
             )
-            snapshot_ids = {s['id'] for s in snapshots_result.data}
+    
+    def get_case_events(self, casenum: str) -> List[Dict]:
+        """
+        Get the status timeline of a case
+        
+        Args:
+            casenum: Case number identifier
+            
+        Returns:
+            List of case event dictionaries ordered by event_at
+        """
+        result = (
+            self.client.table('case_events')
+            .select('event_type,status,event_at,month')
+            .eq('casenum', casenum)
+            .order('event_at', desc=False)
+            .execute()
+        )
+        return result.data
+    
+    def save_case_notes(self, rows: List[Dict]) -> None:
+        """
+        Insert or update rows of the note search index
+        
+        Args:
+            rows: case_notes rows (see note_search.note_rows)
+        """
+        if not rows:
+            return
+        
+        batch_size = 1000
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            self.client.table('case_notes').upsert(batch, on_conflict='casenum').execute()
+    
+    def search_notes(self, query: str, filters: Optional[Dict] = None, limit: int = 20) -> List[Dict]:
+        """
+        Full-text search over case notes and details
+        
+        Args:
+            query: Free text, e.g. "administrative processing"
+            filters: Optional equality filters on month, consulate, visa_type, status
+            limit: Maximum number of results
+            
+        Returns:
+            List of dictionaries with casenum, month, rank and note, best match first
+            
+        Raises:
+            ValueError: An unknown filter
+        """
+        # Same validation as SqliteNoteIndex: unknown filters raise, empty ones are ignored
+        filters = search_filters(filters)
+        result = self.client.rpc('search_notes', {
+            'p_query': query,
+            'p_month': filters.get('month'),
+            'p_consulate': filters.get('consulate'),
+            'p_visa_type': filters.get('visa_type'),
+            'p_status': filters.get('status'),
+            'p_limit': limit
+        }).execute()
+        return result.data or []
+    
+    def refresh_monthly_rollup(self, months: Optional[List[str]] = None) -> int:
+        """
+        Recompute dashboard rollups from the latest snapshot of each month
+        
+        Args:
+            months: Months (YYYY-MM) to refresh, or None for all months
+            
+        Returns:
+            Number of rollup rows written
+        """
+        result = self.client.rpc('refresh_monthly_rollup', {'p_months': months}).execute()
+        return result.data or 0
+    
+    def get_monthly_rollup(
+        self,
+        month: Optional[str] = None,
+        consulate: str = 'ALL',
+        visa_type: str = 'ALL'
+    ) -> List[Dict]:
+        """
+        Read precomputed per-month aggregates
+        
+        Args:
+            month: Optional month filter (YYYY-MM)
+            consulate: Consulate to read, or 'ALL' for the rollup over consulates
+            visa_type: Visa type to read, or 'ALL' for the rollup over visa types
+            
+        Returns:
+            List of rollup dictionaries ordered by month
+        """
+        query = (
+            self.client.table('monthly_rollup')
+            .select('*')
+            .eq('consulate', consulate)
+            .eq('visa_type', visa_type)
+            .order('month', desc=False)
+        )
+        
+        if month:
+            query = query.eq('month', month)
+        
+        return query.execute().data
+    
+    def save_waiting_sketches(self, month: str, snapshot_id: str, sketches: Dict) -> None:
+        """
+        Replace the waiting-day sketches of a month
+        
+        Args:
+            month: Month in YYYY-MM format
+            snapshot_id: UUID of the snapshot the sketches were built from
+            sketches: Dictionary mapping (consulate, visa_type) to WaitingDaysSketch
+        """
+        rows = [
+            {
+                'month': month,
+                'consulate': consulate,
+                'visa_type': visa_type,
+                'snapshot_id': snapshot_id,
+                'count': sketch.count,
+                'sketch': sketch.to_dict()
+            }
+            for (consulate, visa_type), sketch in sketches.items()
+        ]
+        
+        self.client.table('waiting_sketches').delete().eq('month', month).execute()
+        if rows:
+            self.client.table('waiting_sketches').insert(rows).execute()
+    
+    def get_waiting_sketches(
+        self,
+        start_month: str,
+        end_month: str,
+        consulate: Optional[str] = None,
+        visa_type: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Get stored waiting-day sketches for a month range
+        
+        Args:
+            start_month: First month (YYYY-MM, inclusive)
+            end_month: Last month (YYYY-MM, inclusive)
+            consulate: Optional consulate filter
+            visa_type: Optional visa type filter
+            
+        Returns:
+            List of sketch row dictionaries (every row of the range; a wide
+            range has more than one response holds, so it is paged)
+        """
+        def build_query():
+            query = (
+                self.client.table('waiting_sketches')
+                .select('month,consulate,visa_type,count,sketch')
+                .gte('month', start_month)
+                .lte('month', end_month)
+            )
+            
+            if consulate:
+                query = query.eq('consulate', consulate)
+            
+            if visa_type:
+                query = query.eq('visa_type', visa_type)
+            
+            # Primary key order, so pages neither overlap nor skip rows
+            return query.order('month').order('consulate').order('visa_type')
+        
+        return list(self._fetch_all(build_query))
+    
+    def get_month_refresh_stats(self, window_days: int = 30) -> List[Dict]:
+        """
+        Get per-month refresh signals for the adaptive scheduler
+        
+        Args:
+            window_days: Window for counting recent changes
+            
+        Returns:
+            List of dictionaries with month, last_scrape_at, last_change_at,
+            changes_in_window, total and pending
+        """
+        result = self.client.rpc('month_refresh_stats', {'p_window_days': window_days}).execute()
+        return result.data or []
+    
+    def enqueue_month_jobs(self, run_id: str, month_links: List[Dict], max_attempts: int = 3) -> int:
+        """
+        Add month jobs to a work queue run (months already in the run are kept)
+        
+        Args:
+            run_id: Run the jobs belong to
+            month_links: Dictionaries with 'month' and 'url', in scrape order
+            max_attempts: Claims of a month before it is marked failed
             
-            # Filter changes to only those with snapshot_id_new in this month
-            changes = [c for c in changes if c.get('snapshot_id_new') in snapshot_ids]
+        Returns:
+            Number of jobs added
+        """
+        jobs = [
+            {'month': link['month'], 'url': link['url'], 'position': position}
+            for position, link in enumerate(month_links)
+        ]
+        result = self.client.rpc('enqueue_month_jobs', {
+            'p_run_id': run_id,
+            'p_jobs': jobs,
+            'p_max_attempts': max_attempts
+        }).execute()
+        return result.data or 0
+    
+    def claim_month_job(self, run_id: str, worker_id: str, lease_seconds: int) -> Optional[Dict]:
+        """
+        Lease the next claimable month job of a run
         
-        return changes
+        Args:
+            run_id: Run to take a job from
+            worker_id: Identifier of the claiming worker
+            lease_seconds: Lease length without a heartbeat
+            
+        Returns:
+            The month_jobs row, or None when nothing is claimable
+        """
+        result = self.client.rpc('claim_month_job', {
+            'p_run_id': run_id,
+            'p_worker_id': worker_id,
+            'p_lease_seconds': lease_seconds
+        }).execute()
+        return result.data[0] if result.data else None
+    
+    def heartbeat_month_job(self, run_id: str, month: str, worker_id: str, lease_seconds: int) -> bool:
+        """Extend a job lease; False when the worker no longer holds it"""
+        result = self.client.rpc('heartbeat_month_job', {
+            'p_run_id': run_id,
+            'p_month': month,
+            'p_worker_id': worker_id,
+            'p_lease_seconds': lease_seconds
+        }).execute()
+        return bool(result.data)
+    
+    def complete_month_job(
+        self,
+        run_id: str,
+        month: str,
+        worker_id: str,
+        snapshot_id: Optional[str] = None,
+        records: Optional[int] = None,
+        changes: Optional[int] = None
+    ) -> bool:
+        """Record a finished month job; False when the worker no longer holds it"""
+        result = self.client.rpc('complete_month_job', {
+            'p_run_id': run_id,
+            'p_month': month,
+            'p_worker_id': worker_id,
+            'p_snapshot_id': snapshot_id,
+            'p_records': records,
+            'p_changes': changes
+        }).execute()
+        return bool(result.data)
+    
+    def fail_month_job(self, run_id: str, month: str, worker_id: str, error: str) -> Optional[str]:
+        """Record a failed attempt; returns the new status ('pending' or 'failed'), None if the lease was lost"""
+        result = self.client.rpc('fail_month_job', {
+            'p_run_id': run_id,
+            'p_month': month,
+            'p_worker_id': worker_id,
+            'p_error': error[:1000]
+        }).execute()
+        return result.data or None
+    
+    def get_month_jobs(self, run_id: str) -> List[Dict]:
+        """
+        Get all month jobs of a work queue run
+        
+        Args:
+            run_id: Run identifier
+            
+        Returns:
+            List of month_jobs rows in scrape order
+        """
+        return list(self._fetch_all(
+            lambda: self.client.table('month_jobs').select('*').eq('run_id', run_id).order('position').order('month')
+        ))
     
     def get_statistics(self, month: Optional[str] = None) -> Dict:
         """
@@ -238,7 +880,7 @@ class SupabaseClient:
         snapshot_id = latest_snapshot['id']
         
         # Get records for latest snapshot
-        records = self.get_records_by_snapshot(snapshot_id)
+        records = self.get_records_by_snapshot(snapshot_id, latest_snapshot['month'])
         
         if not records:
             return {}
@@ -288,32 +930,34 @@ class SupabaseClient:
     
     def _extract_casenum(self, details_link: str) -> str:
         """Extract casenum from details_link URL"""
-        if not details_link:
-            return ''
-        
-        # Extract casenum from URL like: personal_detail.php?casenum=844578
-        import re
-        match = re.search(r'casenum=(\d+)', details_link)
-        if match:
-            return match.group(1)
-        return ''
-    
-    def _parse_date(self, date_str: str) -> Optional[str]:
-        """Parse date string, return None for invalid dates like '0000-00-00'"""
-        if not date_str or date_str == '0000-00-00':
-            return None
+        return extract_casenum(details_link)
+    
+    def _encode_cursor(self, detected_at: str, change_id: str) -> str:
+        """Build an opaque keyset cursor from the last change of a page"""
+        return f"{detected_at}|{change_id}"
+    
+    def _decode_cursor(self, cursor: str) -> Tuple[str, str]:
+        """
+        Split a keyset cursor back into (detected_at, id)
+        
+        Raises:
+            ValueError: The cursor is not an ISO timestamp and a UUID (it is
+                put into a PostgREST filter, so it is checked strictly)
+        """
+        detected_at, sep, change_id = cursor.rpartition('|')
+        if not sep or not _CURSOR_TIMESTAMP_RE.fullmatch(detected_at):
+            raise ValueError(f"Invalid changes cursor: {cursor!r}")
         try:
-            # Validate date format
-            datetime.strptime(date_str, '%Y-%m-%d')
-            return date_str
-        except (ValueError, TypeError):
-            return None
+            change_id = str(uuid.UUID(change_id))
+        except ValueError:
+            raise ValueError(f"Invalid changes cursor: {cursor!r}") from None
+        return detected_at, change_id
     
-    def _parse_int(self, value: str) -> Optional[int]:
+    def _parse_date(self, value) -> Optional[str]:
+        """Date column value (YYYY-MM-DD), None for invalid dates like '0000-00-00'"""
+        parsed = parse_date(value)
+        return parsed.isoformat() if parsed else None
+    
+    def _parse_int(self, value) -> Optional[int]:
         """Parse integer, return None if invalid"""
-        if not value:
-            return None
-        try:
-            return int(value)
-        except (ValueError, TypeError):
-            return None
+        return parse_int(value)
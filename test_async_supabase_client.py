@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+AsyncSupabaseClient tests against a mock PostgREST (httpx.MockTransport):
+plain inserts are only resent when the server cannot have run them, and
+only coroutines are exposed
+
+Run with pytest
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+import async_supabase_client
+from async_supabase_client import AsyncSupabaseClient, PostgrestError
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    async def sleep(seconds):
+        pass
+    monkeypatch.setattr(async_supabase_client.asyncio, 'sleep', sleep)
+    monkeypatch.setenv('SUPABASE_URL', 'https://example.supabase.co')
+    monkeypatch.setenv('SUPABASE_SECRET_KEY', 'test-key')
+
+
+def run(responses, call):
+    """
+    Run call(db) against a server answering with `responses` in turn (a
+    status code, or an exception to raise); returns (result or exception, requests)
+    """
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        response = responses[min(len(requests), len(responses)) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return httpx.Response(response, json=[{'id': 'snap-1'}] if response < 400 else {'code': 'X'})
+
+    async def main():
+        async with AsyncSupabaseClient() as db:
+            await db._http.aclose()
+            db._http = httpx.AsyncClient(base_url=db.rest_url, transport=httpx.MockTransport(handler))
+            try:
+                return await call(db)
+            except Exception as e:
+                return e
+
+    return asyncio.run(main()), requests
+
+
+def save_changes(db):
+    return db.save_changes([{'casenum': 'c1', 'change_type': 'removed'}])
+
+
+def save_case_notes(db):
+    return db.save_case_notes([{'casenum': 'c1', 'note': 'x'}])
+
+
+@pytest.mark.parametrize('failure', [
+    502,
+    504,
+    httpx.ReadTimeout('timed out'),
+    httpx.RemoteProtocolError('server disconnected'),
+])
+def test_plain_insert_not_resent_after_it_may_have_run(failure):
+    result, requests = run([failure, 201], save_changes)
+    assert isinstance(result, (PostgrestError, httpx.TransportError))
+    assert len(requests) == 1
+
+
+@pytest.mark.parametrize('failure', [429, httpx.ConnectError('refused'), httpx.ConnectTimeout('timed out')])
+def test_plain_insert_resent_when_it_did_not_run(failure):
+    result, requests = run([failure, 201], save_changes)
+    assert result is None
+    assert len(requests) == 2
+
+
+def test_snapshot_insert_not_resent():
+    result, requests = run([503, 201], lambda db: db.save_snapshot([], '2025-01'))
+    assert isinstance(result, PostgrestError) and result.status_code == 503
+    assert len(requests) == 1
+
+
+def test_idempotent_requests_retried():
+    # Upserts
+    result, requests = run([502, httpx.ReadTimeout('timed out'), 201], save_case_notes)
+    assert result is None and len(requests) == 3
+    assert requests[0].headers['Prefer'].startswith('resolution=merge-duplicates')
+    # Reads
+    result, requests = run([500, 200], lambda db: db.get_latest_snapshot('2025-01'))
+    assert result == {'id': 'snap-1'} and len(requests) == 2
+    # Gives up after MAX_RETRIES
+    result, requests = run([500], lambda db: db.get_latest_snapshot('2025-01'))
+    assert isinstance(result, PostgrestError)
+    assert len(requests) == async_supabase_client.MAX_RETRIES
+
+
+def test_only_coroutines_exposed():
+    """Every public method is a coroutine mirroring a SupabaseClient method; nothing sync is inherited"""
+    import inspect
+    from supabase_client import SupabaseClient
+
+    assert not issubclass(AsyncSupabaseClient, SupabaseClient)
+    methods = {
+        name: member for name, member in inspect.getmembers(AsyncSupabaseClient, inspect.isfunction)
+        if not name.startswith('_') and name != 'aclose'
+    }
+    assert 'save_snapshot' in methods and 'get_changes_page' in methods
+    for name, method in methods.items():
+        assert inspect.iscoroutinefunction(method) or inspect.isasyncgenfunction(method), name
+        assert callable(getattr(SupabaseClient, name, None)), name
+    # What is not defined is missing, instead of a sync method without a client
+    assert not hasattr(AsyncSupabaseClient, 'ensure_month_partitions')
+    assert not hasattr(AsyncSupabaseClient, 'claim_month_job')
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+bench_startup tests: heavy modules are flagged however deep they are imported
+
+Run with pytest
+"""
+
+from bench_startup import heavy_imports, import_profile
+
+
+def test_transitive_heavy_import_flagged(tmp_path):
+    (tmp_path / 'wraps_pandas.py').write_text('import pandas.core.frame\n')
+    imports = import_profile(['-c', f'import sys; sys.path.insert(0, {str(tmp_path)!r}); import wraps_pandas'])
+
+    # pandas is nested under wraps_pandas, so it is indented in the profile
+    assert any(name.strip() == 'wraps_pandas' and not name.startswith(' ') for _, name in imports)
+    assert not any(name == 'pandas' for _, name in imports)
+    assert 'pandas' in heavy_imports(imports)
+
+
+def test_light_startup_not_flagged():
+    imports = import_profile(['-c', 'import json, argparse'])
+    assert heavy_imports(imports) == []
+    assert heavy_imports([(10, 'requests.adapters'), (5, '    bs4.element')]) == ['bs4', 'requests']
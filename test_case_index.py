@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Case index tests: cases that move between month pages are reported once,
+as case_moved, and the index is read in batches of LOOKUP_BATCH keys
+
+Run with pytest, or directly: python test_case_index.py
+"""
+
+import random
+
+from case_index import LOOKUP_BATCH, MOVED, CaseIndex
+from change_detector import ChangeDetector
+from vectorized_detector import VectorizedChangeDetector
+from normalize import normalize_record
+from visa_record import case_key
+
+from test_change_detector_parity import make_record
+
+
+class FakeIndexDb:
+    """Just enough of SupabaseClient for CaseIndex and detect_changes"""
+
+    def __init__(self, index=None):
+        self.index = index or {}
+        self.lookups = []
+
+    def get_case_index(self, casenums):
+        self.lookups.append(list(casenums))
+        return {key: self.index[key] for key in casenums if key in self.index}
+
+    def get_latest_snapshot(self, month=None):
+        return {'id': f'snap-{month}'}
+
+    def get_removed_casenums(self, month):
+        return set()
+
+
+def make_months(seed=3):
+    """Two months of 100 cases each; every 10th case of 2025-01 moved to 2025-02"""
+    rng = random.Random(seed)
+    old_a = [normalize_record(make_record(rng, i, f'a{i}')) for i in range(100)]
+    old_b = [normalize_record(make_record(rng, 1000 + i, f'b{i}')) for i in range(100)]
+    moved = old_a[::10]
+    moved_keys = {case_key(r) for r in moved}
+    old = {'2025-01': old_a, '2025-02': old_b}
+    pages = {'2025-01': [r for r in old_a if case_key(r) not in moved_keys], '2025-02': old_b + moved}
+    return old, pages, moved
+
+
+def assert_one_move(changes, moved):
+    """Nothing removed from the month it left, one move into the other"""
+    assert changes['2025-01'] == []
+    assert [c['casenum'] for c in changes['2025-02']] == [case_key(r) for r in moved]
+    assert all(
+        (c['change_type'], c['field_name'], c['old_value'], c['new_value']) == (MOVED, 'month', '2025-01', '2025-02')
+        for c in changes['2025-02']
+    )
+
+
+def test_moved_cases():
+    """A case that changed month pages is one case_moved change, whichever month is diffed first"""
+    old, pages, moved = make_months()
+
+    results = []
+    for detector_class in (ChangeDetector, VectorizedChangeDetector):
+        for months in (['2025-01', '2025-02'], ['2025-02', '2025-01']):
+            detector = detector_class(None, cache_baselines=True)
+            for month in months:
+                detector.case_index.record(month, old[month], '2025-03-01T00:00:00+00:00')
+            detector.case_index.begin_run((month, pages[month]) for month in months)
+            changes = {}
+            for month in months:
+                diff = detector.diff_records(old[month], pages[month], f'snap-{month}')
+                changes[month] = detector.case_index.resolve_moves(diff, month)
+                detector.case_index.record(month, pages[month], '2025-03-02T00:00:00+00:00')
+            results.append(changes)
+            assert_one_move(changes, moved)
+    assert all(result == results[0] for result in results)
+
+
+def test_move_within_one_run():
+    """Both months scraped in one run, with the index read from the database (as update_and_detect does)"""
+    old, pages, moved = make_months(seed=5)
+    index = {
+        case_key(r): {'month': month, 'status': r['status'] or '', 'first_seen': '2025-03-01', 'last_seen': '2025-03-01'}
+        for month, records in old.items() for r in records
+    }
+
+    for detector_class in (ChangeDetector, VectorizedChangeDetector):
+        for months in (['2025-01', '2025-02'], ['2025-02', '2025-01']):
+            db = FakeIndexDb(index)
+            detector = detector_class(db, cache_baselines=True)
+            for month in months:
+                detector.remember_baseline(month, f'snap-{month}', old[month])
+            detector.case_index.begin_run((month, pages[month]) for month in months)
+            changes = {}
+            for month in months:
+                changes[month] = [
+                    {k: v for k, v in c.items() if k != 'month'}
+                    for c in detector.detect_changes(pages[month], month)
+                ]
+                detector.case_index.record(month, pages[month], '2025-03-02T00:00:00+00:00')
+            assert_one_move(changes, moved)
+            # Only the moved keys were looked up, each once
+            looked_up = [key for batch in db.lookups for key in batch]
+            assert sorted(looked_up) == sorted(case_key(r) for r in moved)
+
+
+def test_prefetch_batches():
+    """Keys are fetched LOOKUP_BATCH at a time, once each; missing ones are cached as None"""
+    keys = [f'k{i}' for i in range(2 * LOOKUP_BATCH + 50)]
+    db = FakeIndexDb({key: {'month': '2025-01'} for key in keys[::2]})
+    index = CaseIndex(db)
+
+    index.prefetch(keys + keys[:10])
+    assert [len(batch) for batch in db.lookups] == [LOOKUP_BATCH, LOOKUP_BATCH, 50]
+    assert [key for batch in db.lookups for key in batch] == keys
+    assert len(index) == len(keys)
+
+    # Held in memory: neither found nor missing keys are fetched again
+    index.prefetch(keys)
+    assert index.lookup('k0') == {'month': '2025-01'}
+    assert index.lookup('k1') is None
+    assert len(db.lookups) == 3
+
+    # Only the new key goes to the database
+    index.prefetch(['k0', 'new'])
+    assert db.lookups[-1] == ['new']
+
+    # A new run starts empty unless entries are kept
+    index.begin_run([])
+    assert len(index) == 0
+    kept = CaseIndex(db, keep_entries=True)
+    kept.prefetch(['k0'])
+    kept.begin_run([])
+    assert len(kept) == 1
+
+
+def main():
+    test_moved_cases()
+    test_move_within_one_run()
+    test_prefetch_batches()
+    print("✓ Case index resolves moves")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+SqliteMonthQueue tests: expired leases are re-claimed up to max_attempts,
+and a worker that lost its lease cannot complete the job
+
+Run with pytest
+"""
+
+import pytest
+
+import month_queue
+from month_queue import SqliteMonthQueue
+
+RUN = 'run-1'
+LINKS = [
+    {'month': '2025-01', 'url': 'https://www.checkee.info/main.php?dispdate=2025-01'},
+    {'month': '2025-02', 'url': 'https://www.checkee.info/main.php?dispdate=2025-02'},
+]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable time.time for lease expiry"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(month_queue.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = SqliteMonthQueue(str(tmp_path / 'queue.db'), lease_seconds=60, max_attempts=2)
+    assert queue.enqueue(RUN, LINKS) == 2
+    return queue
+
+
+def test_claim_order_and_no_double_claim(queue):
+    assert queue.enqueue(RUN, LINKS) == 0
+    first = queue.claim(RUN, 'w1')
+    second = queue.claim(RUN, 'w2')
+    assert (first['month'], second['month']) == ('2025-01', '2025-02')
+    assert queue.claim(RUN, 'w3') is None
+    assert queue.counts(RUN)['running'] == 2
+
+
+def test_expired_lease_is_reclaimed_up_to_max_attempts(queue, clock):
+    job = queue.claim(RUN, 'w1')
+    assert job['month'] == '2025-01' and job['attempts'] == 1
+    queue.complete(queue.claim(RUN, 'w1'), 'w1')  # 2025-02 out of the way
+
+    # Heartbeats keep the lease
+    clock[0] += 50
+    assert queue.heartbeat(job, 'w1')
+    clock[0] += 50
+    assert queue.claim(RUN, 'w2') is None
+
+    # w1 stops heartbeating: after the lease another worker takes the job
+    clock[0] += 61
+    retry = queue.claim(RUN, 'w2')
+    assert (retry['month'], retry['worker_id'], retry['attempts']) == ('2025-01', 'w2', 2)
+    assert not queue.heartbeat(job, 'w1')
+
+    # The second expiry uses up max_attempts: failed, not claimed again
+    clock[0] += 61
+    assert queue.claim(RUN, 'w3') is None
+    failed = {j['month']: j for j in queue.jobs(RUN)}['2025-01']
+    assert (failed['status'], failed['attempts'], failed['last_error']) == ('failed', 2, 'lease expired')
+    assert queue.counts(RUN) == {'pending': 0, 'running': 0, 'done': 1, 'failed': 1}
+
+
+def test_complete_after_lost_lease(queue, clock):
+    job = queue.claim(RUN, 'w1')
+    clock[0] += 61
+    retry = queue.claim(RUN, 'w2')
+    assert retry['month'] == job['month']
+
+    # The worker that lost the lease can neither complete nor fail the job
+    assert queue.complete(job, 'w1', snapshot_id='snap-w1', records=10, changes=1) is False
+    assert queue.fail(job, 'w1', 'boom') is None
+    assert queue.complete(retry, 'w2', snapshot_id='snap-w2', records=10, changes=1) is True
+    done = {j['month']: j for j in queue.jobs(RUN)}[job['month']]
+    assert (done['status'], done['snapshot_id'], done['worker_id']) == ('done', 'snap-w2', 'w2')
+
+
+def test_fail_retries_until_max_attempts(queue):
+    job = queue.claim(RUN, 'w1')
+    assert queue.fail(job, 'w1', 'timeout') == 'pending'
+    job = queue.claim(RUN, 'w1')
+    assert job['month'] == '2025-01' and job['attempts'] == 2
+    assert queue.fail(job, 'w1', 'timeout') == 'failed'
+    assert queue.claim(RUN, 'w1')['month'] == '2025-02'
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Note search tests: upserts keep case_notes_fts in step with case_notes,
+cleared text is re-indexed, and both backends apply the same filters
+
+Run with pytest
+"""
+
+import pytest
+
+from change_detector import ChangeDetector
+from normalize import normalize_record
+from note_search import SqliteNoteIndex, fts_query, note_rows, search_filters
+from supabase_client import SupabaseClient
+
+
+def make_record(casenum, note='', details='', **fields):
+    record = {
+        'id': f'user{casenum}',
+        'visa_type': 'F1',
+        'consulate': 'BeiJing',
+        'major': 'Physics',
+        'status': 'Pending',
+        'note': note,
+        'details': details,
+        'details_link': f'https://www.checkee.info/personal_detail.php?casenum={casenum}',
+    }
+    record.update(fields)
+    return record
+
+
+@pytest.fixture
+def index(tmp_path):
+    with SqliteNoteIndex(str(tmp_path / 'notes.db')) as index:
+        yield index
+
+
+def casenums(results):
+    return sorted(r['casenum'] for r in results)
+
+
+def assert_fts_in_sync(index):
+    """The FTS index matches case_notes row for row"""
+    index.conn.execute("INSERT INTO case_notes_fts(case_notes_fts, rank) VALUES ('integrity-check', 1)")
+    rows = index.conn.execute('SELECT count(*) FROM case_notes').fetchone()[0]
+    indexed = index.conn.execute('SELECT count(*) FROM case_notes_fts').fetchone()[0]
+    assert rows == indexed
+
+
+def test_upsert_replaces_indexed_text(index):
+    assert index.add_records([
+        make_record('1', note='administrative processing since March'),
+        make_record('2', details='name check cleared'),
+        make_record('3'),  # no text: not indexed
+    ], month='2025-01') == 2
+    assert_fts_in_sync(index)
+    assert casenums(index.search_notes('administrative processing')) == ['1']
+
+    # The same case with a new note: the old words no longer match it
+    index.add_records([make_record('1', note='visa issued after interview')], month='2025-01')
+    assert_fts_in_sync(index)
+    assert index.search_notes('administrative') == []
+    assert casenums(index.search_notes('issued')) == ['1']
+    assert index.conn.execute('SELECT count(*) FROM case_notes').fetchone()[0] == 2
+
+    # Deleting a row takes it out of the FTS index too
+    with index.conn:
+        index.conn.execute("DELETE FROM case_notes WHERE casenum = '2'")
+    assert_fts_in_sync(index)
+    assert index.search_notes('name check') == []
+
+
+def test_search_filters(index):
+    index.add_records([
+        make_record('1', note='waiting for clearance'),
+        make_record('2', note='waiting for clearance', consulate='ShangHai'),
+        make_record('3', note='waiting for clearance', status='Clear', visa_type='H1'),
+    ], month='2025-01')
+    index.add_records([make_record('4', note='still waiting')], month='2025-02')
+
+    assert casenums(index.search_notes('waiting')) == ['1', '2', '3', '4']
+    assert casenums(index.search_notes('waiting', {'consulate': 'BeiJing'})) == ['1', '3', '4']
+    assert casenums(index.search_notes('waiting', {'status': 'Clear'})) == ['3']
+    assert casenums(index.search_notes('waiting', {'visa_type': 'F1', 'month': '2025-01'})) == ['1', '2']
+    assert casenums(index.search_notes('waiting', {'consulate': 'BeiJing', 'status': 'Clear', 'month': '2025-02'})) == []
+    # Empty filters are ignored, unknown ones rejected
+    assert casenums(index.search_notes('waiting', {'status': ''})) == ['1', '2', '3', '4']
+    assert len(index.search_notes('waiting', limit=2)) == 2
+    with pytest.raises(ValueError):
+        index.search_notes('waiting', {'user_id': 'user1'})
+
+    # A status change re-indexes the case's filter columns
+    changes = [{'casenum': '1', 'change_type': 'status_change'}]
+    index.save_case_notes(note_rows([make_record('1', note='waiting for clearance', status='Clear')], changes, '2025-01'))
+    assert casenums(index.search_notes('waiting', {'status': 'Clear'})) == ['1', '3']
+
+
+def test_fts_query_is_safe(index):
+    index.add_records([make_record('1', note='AND OR NOT "quoted" (x)')], month='2025-01')
+    assert fts_query('') == ''
+    assert fts_query('name che') == '"name" "che"*'
+    assert index.search_notes('"') == []
+    assert casenums(index.search_notes('quoted) OR')) == ['1']
+
+
+def test_cleared_text_is_reindexed(index):
+    index.add_records([
+        make_record('1', note='administrative processing'),
+        make_record('2', details='name check cleared'),
+    ], month='2025-01')
+
+    # The note was cleared: the detector reports it and the emptied row replaces the old text
+    detector = ChangeDetector(None)
+    old = [normalize_record(make_record('1', note='administrative processing'))]
+    changes = detector.diff_records(old, [normalize_record(make_record('1'))], 'snap-1')
+    assert [c['change_type'] for c in changes] == ['note_removed']
+    index.save_case_notes(note_rows([make_record('1')], changes, '2025-01'))
+    assert index.search_notes('administrative') == []
+
+    # details are not diffed: a record scraped with them is re-indexed without any change
+    index.save_case_notes(note_rows([make_record('2', details='visa issued')], [], '2025-01'))
+    assert index.search_notes('name check') == []
+    assert casenums(index.search_notes('issued')) == ['2']
+    # Unchanged records scraped without details are left alone
+    assert note_rows([{k: v for k, v in make_record('3', note='x').items() if k != 'details'}], [], '2025-01') == []
+    assert_fts_in_sync(index)
+
+
+class FakeRpc:
+    def __init__(self):
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return self
+
+    def execute(self):
+        return type('Result', (), {'data': []})()
+
+
+def test_supabase_backend_applies_same_filters():
+    db = SupabaseClient.__new__(SupabaseClient)
+    db.client = FakeRpc()
+
+    db.search_notes('waiting', {'consulate': 'BeiJing', 'status': ''}, limit=5)
+    _, params = db.client.calls[-1]
+    assert params == {
+        'p_query': 'waiting', 'p_month': None, 'p_consulate': 'BeiJing',
+        'p_visa_type': None, 'p_status': None, 'p_limit': 5,
+    }
+    with pytest.raises(ValueError):
+        db.search_notes('waiting', {'user_id': 'user1'})
+    assert search_filters({'status': '', 'month': '2025-01'}) == {'month': '2025-01'}
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+save_month / save_month_async tests: both run the same save sequence and
+recover from the same failures
+
+Run with pytest
+"""
+
+import asyncio
+
+import pytest
+
+from change_detector import ChangeDetector
+from update_and_detect import save_month, save_month_async
+
+RECORDS = [
+    {'id': 'u1', 'status': 'Pending', 'waiting_days': 10, 'consulate': 'BeiJing', 'visa_type': 'F1',
+     'note': 'admin processing', 'details_link': 'https://www.checkee.info/personal_detail.php?casenum=1'},
+    {'id': 'u2', 'status': 'Clear', 'waiting_days': 20, 'consulate': 'ShangHai', 'visa_type': 'H1',
+     'note': '', 'details_link': 'https://www.checkee.info/personal_detail.php?casenum=2'},
+]
+
+METHODS = (
+    'save_snapshot', 'update_case_index', 'save_waiting_sketches',
+    'save_case_notes', 'save_changes', 'save_case_events',
+)
+
+
+class FakeDb:
+    """Records the calls; methods listed in `failing` raise"""
+
+    def __init__(self, failing=()):
+        self.calls = []
+        for name in METHODS:
+            setattr(self, name, self._method(name, name in failing))
+
+    def _method(self, name, fails):
+        def method(*args):
+            self.calls.append(name)
+            if fails:
+                raise RuntimeError(f'{name} failed')
+            return 'snap-0001' if name == 'save_snapshot' else None
+        return method
+
+
+class FakeAsyncDb(FakeDb):
+    def _method(self, name, fails):
+        sync_method = super()._method(name, fails)
+
+        async def method(*args):
+            return sync_method(*args)
+        return method
+
+
+def make_changes():
+    return [{'casenum': '1', 'change_type': 'status_change', 'field_name': 'status',
+             'old_value': 'Pending', 'new_value': 'Clear', 'month': '2025-01'}]
+
+
+def save_both(failing=(), changes=make_changes):
+    """Run both paths; returns [(result, calls, detector)] for sync and async"""
+    results = []
+    for db in (FakeDb(failing), FakeAsyncDb(failing)):
+        detector = ChangeDetector(None, cache_baselines=True)
+        saved_changes = changes()
+        if isinstance(db, FakeAsyncDb):
+            result = asyncio.run(save_month_async(db, detector, '2025-01', RECORDS, saved_changes))
+        else:
+            result = save_month(db, detector, '2025-01', RECORDS, saved_changes)
+        results.append((result, db.calls, detector))
+    return results
+
+
+def test_same_sequence():
+    (sync_result, sync_calls, detector), (async_result, async_calls, _) = save_both()
+    assert sync_calls == async_calls == list(METHODS)
+    assert sync_result == async_result
+    snapshot_id, changes = sync_result
+    assert snapshot_id == 'snap-0001'
+    assert [c['snapshot_id_new'] for c in changes] == ['snap-0001']
+    assert detector.cached_baselines == 1
+    assert len(detector.case_index) == 2
+
+
+@pytest.mark.parametrize('failing, expected_calls, saved_changes', [
+    # No snapshot: nothing else is written
+    (('save_snapshot',), ['save_snapshot'], False),
+    # Derived data failures are reported and skipped
+    (('update_case_index', 'save_waiting_sketches', 'save_case_notes'), list(METHODS), True),
+    # Changes not saved: none are returned
+    (('save_changes',), list(METHODS[:5]), False),
+])
+def test_same_failure_handling(failing, expected_calls, saved_changes):
+    results = save_both(failing)
+    for (snapshot_id, changes), calls, _ in results:
+        assert calls == expected_calls
+        assert snapshot_id == (None if 'save_snapshot' in failing else 'snap-0001')
+        assert bool(changes) == saved_changes
+
+
+def test_detection_skipped():
+    for (snapshot_id, changes), calls, _ in save_both(changes=lambda: None):
+        assert snapshot_id == 'snap-0001' and changes == []
+        assert calls == list(METHODS[:4])
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Compaction test: after compacting a snapshot chain, records_as_of and
+get_record_history must return exactly the rows stored before compaction
+
+Needs a local Postgres (like check_query_plans.py): set DATABASE_URL and
+have psql on PATH. The migrations are applied to a scratch schema that is
+dropped afterwards.
+
+Run with pytest, or directly: DATABASE_URL=... python test_snapshot_compaction.py
+"""
+
+import os
+import shutil
+
+import pytest
+
+from check_query_plans import MIGRATIONS_DIR, run_psql
+
+SCHEMA = 'compaction_check'
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get('DATABASE_URL') or not shutil.which('psql'),
+    reason='needs DATABASE_URL (a local Postgres) and psql'
+)
+
+# Two months of eight daily snapshots. In 2025-01:
+#   c1  pending, waiting_days grows with the calendar (compacted away)
+#   c2  pending, waiting_days jumps by more than the days between scrapes
+#   c3  missing from snapshots 3-4, back from 5 on (removal + reappearance)
+#   c4  Pending -> Clear at snapshot 4
+#   c5  note added at snapshot 2, changed at snapshot 6
+#   c6  only from snapshot 3 on
+#   c7  missing from snapshot 5 on (removed for good)
+# 2025-02 reuses c1 and c3 with other data, so reads must stay in their month.
+DATA_SQL = """
+INSERT INTO snapshots (id, scrape_date, month, total_records, created_at)
+SELECT ('00000000-0000-0000-0000-' || lpad((m * 100 + k)::text, 12, '0'))::uuid,
+       timestamptz '2025-03-01 00:00+00' + (k || ' days')::interval,
+       '2025-0' || m,
+       0,
+       timestamptz '2025-03-01 00:00+00' + (k || ' days')::interval
+FROM generate_series(1, 2) AS m, generate_series(0, 7) AS k;
+
+SELECT ensure_month_partitions(ARRAY['2025-01', '2025-02']);
+
+WITH snaps AS (
+    SELECT id, month, scrape_date,
+           (row_number() OVER (PARTITION BY month ORDER BY scrape_date) - 1)::int AS k
+    FROM snapshots
+),
+cases AS (
+    SELECT * FROM (VALUES
+        ('2025-01', 'c1'), ('2025-01', 'c2'), ('2025-01', 'c3'), ('2025-01', 'c4'),
+        ('2025-01', 'c5'), ('2025-01', 'c6'), ('2025-01', 'c7'),
+        ('2025-02', 'c1'), ('2025-02', 'c3')
+    ) AS c(month, casenum)
+)
+INSERT INTO records (snapshot_id, casenum, user_id, visa_type, consulate, status,
+                     check_date, complete_date, waiting_days, note, month, created_at)
+SELECT s.id, c.casenum, 'user_' || c.casenum, 'H1', 'BeiJing',
+       CASE WHEN c.casenum = 'c4' AND s.k >= 4 THEN 'Clear' ELSE 'Pending' END,
+       date '2025-01-10',
+       CASE WHEN c.casenum = 'c4' AND s.k >= 4 THEN date '2025-03-05' END,
+       CASE
+           WHEN c.casenum = 'c4' AND s.k >= 4 THEN 54
+           WHEN c.casenum = 'c2' THEN 10 + 3 * s.k
+           WHEN c.month = '2025-02' THEN 100 + s.k
+           ELSE 50 + s.k
+       END,
+       CASE
+           WHEN c.casenum = 'c5' AND s.k >= 6 THEN 'second note'
+           WHEN c.casenum = 'c5' AND s.k >= 2 THEN 'first note'
+           ELSE ''
+       END,
+       s.month, s.scrape_date
+FROM snaps s
+JOIN cases c ON c.month = s.month
+WHERE NOT (c.month = '2025-01' AND c.casenum = 'c3' AND s.k IN (3, 4))
+  AND NOT (c.casenum = 'c6' AND s.k < 3)
+  AND NOT (c.casenum = 'c7' AND s.k >= 5);
+
+CREATE TABLE stored AS
+SELECT r.snapshot_id, r.casenum, r.user_id, r.status, r.complete_date, r.waiting_days, r.note, r.month
+FROM records r;
+"""
+
+COLUMNS = 'snapshot_id, casenum, user_id, status, complete_date, waiting_days, note, month'
+
+
+def psql(sql):
+    return run_psql(os.environ['DATABASE_URL'], sql, schema=SCHEMA)
+
+
+@pytest.fixture(scope='module')
+def compacted():
+    """Apply the migrations, load the chain and compact every candidate snapshot"""
+    dsn = os.environ['DATABASE_URL']
+    run_psql(dsn, f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA};', schema=None)
+    try:
+        for name in sorted(os.listdir(MIGRATIONS_DIR)):
+            if name.endswith('.sql'):
+                with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+                    psql(f.read())
+        psql(DATA_SQL)
+
+        # Keep the latest 2 of each month and every 4th as a checkpoint;
+        # small batches so rows are deleted across several calls
+        snapshot_ids = psql('SELECT id FROM snapshot_compaction_candidates(2, 4)').split()
+        deleted = 0
+        for snapshot_id in snapshot_ids:
+            psql(f"SELECT begin_snapshot_compaction('{snapshot_id}')")
+            after = 'NULL'
+            while True:
+                last_id, rows, _ = psql(
+                    f"SELECT last_id, deleted_rows, freed_bytes FROM compact_snapshot_batch('{snapshot_id}', {after}, 3)"
+                ).strip().split('|')
+                deleted += int(rows)
+                if not last_id:
+                    break
+                after = f"'{last_id}'"
+        yield {'snapshots': len(snapshot_ids), 'deleted': deleted}
+    finally:
+        run_psql(dsn, f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;', schema=None)
+
+
+def count(sql):
+    return int(psql(sql).strip())
+
+
+def test_compaction_removed_rows(compacted):
+    assert compacted['snapshots'] > 0
+    assert compacted['deleted'] > 0
+    assert count("SELECT count(*) FROM snapshots WHERE storage = 'delta'") == compacted['snapshots']
+    # Cases that left 2025-01 are recorded as removals of the compacted snapshots
+    assert count("SELECT count(*) FROM snapshot_removals WHERE casenum IN ('c3', 'c7')") >= 1
+
+
+def test_records_as_of_matches_stored_rows(compacted):
+    rebuilt = (
+        f"SELECT s.id, a.casenum, a.user_id, a.status, a.complete_date, a.waiting_days, a.note, a.month "
+        f"FROM snapshots s, records_as_of(s.id) a"
+    )
+    assert count(f"SELECT count(*) FROM ({rebuilt} EXCEPT ALL SELECT {COLUMNS} FROM stored) d") == 0
+    assert count(f"SELECT count(*) FROM (SELECT {COLUMNS} FROM stored EXCEPT ALL {rebuilt}) d") == 0
+
+
+def test_record_history_matches_stored_rows(compacted):
+    history = (
+        "SELECT h.snapshot_id, h.casenum, h.user_id, h.status, h.complete_date, h.waiting_days, h.note, h.month "
+        "FROM (SELECT DISTINCT casenum FROM stored) c, get_record_history(c.casenum) h"
+    )
+    assert count(f"SELECT count(*) FROM ({history} EXCEPT ALL SELECT {COLUMNS} FROM stored) d") == 0
+    assert count(f"SELECT count(*) FROM (SELECT {COLUMNS} FROM stored EXCEPT ALL {history}) d") == 0
+
+
+def test_rebuilt_cases(compacted):
+    """Spot checks of the cases the chain was built for"""
+    def as_of(month, k, casenum, column):
+        snapshot_id = f"00000000-0000-0000-0000-{int(month[-1]) * 100 + k:012d}"
+        return psql(
+            f"SELECT {column} FROM records_as_of('{snapshot_id}') WHERE casenum = '{casenum}'"
+        ).strip()
+
+    # waiting_days re-derived from the calendar for rows that were deleted
+    assert [as_of('2025-01', k, 'c1', 'waiting_days') for k in range(8)] == [str(50 + k) for k in range(8)]
+    assert [as_of('2025-01', k, 'c2', 'waiting_days') for k in range(8)] == [str(10 + 3 * k) for k in range(8)]
+    # Removal and reappearance
+    assert [as_of('2025-01', k, 'c3', 'casenum') for k in range(8)] == ['c3', 'c3', 'c3', '', '', 'c3', 'c3', 'c3']
+    assert [as_of('2025-01', k, 'c7', 'casenum') for k in range(8)] == ['c7'] * 5 + [''] * 3
+    # The same casenum in the other month keeps its own values
+    assert [as_of('2025-02', k, 'c3', 'waiting_days') for k in range(8)] == [str(100 + k) for k in range(8)]
+    assert as_of('2025-01', 5, 'c4', 'status') == 'Clear'
+    assert as_of('2025-01', 5, 'c5', 'note') == 'first note'
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, '-q']))
@@ -5,128 +5,586 @@ Orchestrates scraping, saving to Supabase, and change detection
 """
 
 import argparse
+import re
 import sys
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 from scraper import CheckeeScraper
 from supabase_client import SupabaseClient
 from change_detector import ChangeDetector
+from case_timeline import build_case_events
+from wait_sketch import build_sketches
+from note_search import note_rows
+from refresh_scheduler import parse_budget, plan_refresh
 
+# numpy (clearance_model), http.server (daemon), asyncio/httpx
+# (--async-writes), sqlite3/threading (--worker) and cProfile/tracemalloc
+# (--profile) are imported where they are used, so --help and --dry-run
+# start without them
 
-def main():
+
+def build_parser():
     parser = argparse.ArgumentParser(description='Scrape data, save to Supabase, and detect changes')
     parser.add_argument('--months', type=int, help='Limit number of months to scrape (default: all)')
     parser.add_argument('--month', type=str, help='Scrape specific month (YYYY-MM format)')
     parser.add_argument('--skip-changes', action='store_true', help='Skip change detection')
     parser.add_argument('--dry-run', action='store_true', help='Run without saving to database')
-    
-    args = parser.parse_args()
-    
-    # Initialize clients
-    try:
-        db_client = SupabaseClient()
-        print("✓ Connected to Supabase")
-    except Exception as e:
-        print(f"✗ Error connecting to Supabase: {e}")
-        print("Make sure SUPABASE_URL and SUPABASE_SECRET_KEY are set in .env file")
-        sys.exit(1)
-    
-    scraper = CheckeeScraper()
-    detector = ChangeDetector(db_client)
-    
-    # Determine which months to scrape
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Only scrape months that are due, busiest/most overdue first')
+    parser.add_argument('--budget', type=str,
+                        help='Per-run budget for adaptive mode: max requests (e.g. 20) or time (300s, 5m); implies --adaptive')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='Detect changes with the pandas engine (same output, faster on large months)')
+    parser.add_argument('--async-writes', action='store_true',
+                        help='Save all scraped months concurrently with pipelined, adaptively sized batch inserts')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep running and refresh every --interval seconds with warm session, DB client and baselines')
+    parser.add_argument('--interval', type=int, default=3600,
+                        help='Seconds between refresh cycles in daemon mode (default: 3600)')
+    parser.add_argument('--metrics-port', type=int, default=8765,
+                        help='Port for the daemon /health and /metrics endpoint (default: 8765, 0 disables)')
+    parser.add_argument('--metrics-host', type=str, default='127.0.0.1',
+                        help='Interface for the metrics endpoint (default: 127.0.0.1)')
+    parser.add_argument('--worker', action='store_true',
+                        help='Enqueue the selected months as jobs and process leased jobs until the queue drains '
+                             '(run several workers to share the work)')
+    parser.add_argument('--queue', type=str,
+                        help='SQLite file for a single-host work queue (default: the month_jobs table in Supabase)')
+    parser.add_argument('--run-id', type=str,
+                        help='Work queue run the jobs belong to (default: today\'s UTC date)')
+    parser.add_argument('--lease', type=int, default=300,
+                        help='Seconds a claimed month stays leased without a heartbeat (default: 300)')
+    parser.add_argument('--max-attempts', type=int, default=3,
+                        help='Claims of a month before the queue gives up on it (default: 3)')
+    parser.add_argument('--feed-file', type=str,
+                        help='Also append saved changes to this JSON Lines change feed (offline consumers, see change_feed.py)')
+    parser.add_argument('--profile', nargs='?', const='', metavar='DIR',
+                        help='Profile each stage (CPU, allocations, sampled stacks) into DIR '
+                             '(default: profiles/run-<UTC time>)')
+    parser.add_argument('--profile-sample-ms', type=float, default=5.0,
+                        help='Stack sampling interval for --profile in milliseconds (default: 5, 0 disables)')
+    return parser
+
+
+def select_month_links(scraper, db_client, args, budget):
+    """Decide which months to scrape this run"""
     if args.month:
-        # Scrape specific month
-        month_links = scraper.parse_homepage()
-        target_month = None
+        # Scrape specific month straight from its URL; no homepage request needed
+        if not re.fullmatch(r'\d{4}-\d{2}', args.month):
+            print(f"Error: Month {args.month} is not in YYYY-MM format")
+            return None
+        return [{'month': args.month, 'url': scraper.month_url(args.month)}]
+
+    # Scrape multiple months
+    print("Fetching homepage...")
+    month_links = scraper.parse_homepage()
+
+    if args.months:
+        month_links = month_links[:args.months]
+
+    if args.adaptive or budget:
+        if budget and 'requests' in budget:
+            # The homepage fetch above already used one request
+            budget = {'requests': budget['requests'] - 1}
+        month_stats = db_client.get_month_refresh_stats()
+        month_links = plan_refresh(month_links, month_stats, budget)
+        print(f"Adaptive schedule: {len(month_links)} months due")
         for link in month_links:
-            if link['month'] == args.month:
-                target_month = link
-                break
-        
-        if not target_month:
-            print(f"Error: Month {args.month} not found")
-            sys.exit(1)
-        
-        print(f"Scraping {args.month}...")
-        records = scraper.parse_monthly_page(target_month['url'])
-        for record in records:
-            record['month'] = args.month
-        
-        months_to_process = [(args.month, records)]
+            print(f"  {link['month']}: priority {link['priority']:.2f}, interval {link['interval_hours']:.0f}h")
     else:
-        # Scrape multiple months
-        print("Fetching homepage...")
-        month_links = scraper.parse_homepage()
-        
-        if args.months:
-            month_links = month_links[:args.months]
-        
         print(f"Found {len(month_links)} months to scrape")
-        
-        months_to_process = []
-        for i, month_info in enumerate(month_links, 1):
-            print(f"Scraping {month_info['month']} ({i}/{len(month_links)})...")
-            records = scraper.parse_monthly_page(month_info['url'])
-            for record in records:
-                record['month'] = month_info['month']
-            months_to_process.append((month_info['month'], records))
-    
-    # Process each month
-    all_changes = []
-    
-    for month, records in months_to_process:
-        if not records:
-            print(f"  No records found for {month}, skipping...")
-            continue
-        
-        print(f"\nProcessing {month}: {len(records)} records")
-        
-        if args.dry_run:
-            print("  [DRY RUN] Would save snapshot and detect changes")
-            continue
-        
-        # Save snapshot
-        try:
-            snapshot_id = db_client.save_snapshot(records, month)
-            print(f"  ✓ Saved snapshot {snapshot_id[:8]}... with {len(records)} records")
-        except Exception as e:
-            print(f"  ✗ Error saving snapshot: {e}")
-            continue
-        
-        # Detect changes
-        if not args.skip_changes:
+
+    return month_links
+
+
+# Months whose partitions this process has already ensured (daemon cycles)
+_partitioned_months = set()
+
+
+def ensure_partitions(db_client, month_links):
+    """Create the records/changes partitions of months seen for the first time"""
+    months = [link['month'] for link in month_links if link['month'] not in _partitioned_months]
+    if not months:
+        return
+    try:
+        created = db_client.ensure_month_partitions(months)
+    except Exception as e:
+        # Rows of a month without a partition go to the default partition
+        print(f"✗ Error creating month partitions: {e}")
+        return
+    _partitioned_months.update(months)
+    if created:
+        print(f"✓ Created {created} month partitions")
+
+
+def scrape_months(scraper, month_links, budget):
+    """Scrape each month page; returns a list of (month, records)"""
+    started = time.monotonic()
+    months_to_process = []
+    for i, month_info in enumerate(month_links, 1):
+        if budget and 'seconds' in budget and time.monotonic() - started >= budget['seconds']:
+            print(f"Time budget of {budget['seconds']:.0f}s used up, stopping after {i - 1} months")
+            break
+        print(f"Scraping {month_info['month']} ({i}/{len(month_links)})...")
+        records = scraper.parse_monthly_page(month_info['url'])
+        for record in records:
+            record['month'] = month_info['month']
+        months_to_process.append((month_info['month'], records))
+    return months_to_process
+
+
+def detect_month(detector, month, records, args):
+    """
+    Detect changes against the previous snapshot, before the new one becomes the latest
+
+    Returns:
+        List of changes, or None when detection was skipped or failed
+    """
+    if args.skip_changes:
+        return None
+    try:
+        return detector.detect_changes(records, month)
+    except Exception as e:
+        print(f"  ✗ Error detecting changes: {e}")
+        return None
+
+
+def _save_month_steps(detector, month, records, changes):
+    """
+    The save sequence of one month and its derived data
+
+    A generator shared by save_month and save_month_async: it yields each
+    database call as (method name, args) and is sent the call's result, or
+    has its exception thrown in, so both clients run the same steps.
+
+    Returns:
+        Tuple of (snapshot_id or None, list of saved changes)
+    """
+    # Save snapshot
+    try:
+        snapshot_id = yield 'save_snapshot', (records, month)
+        print(f"  ✓ Saved snapshot {snapshot_id[:8]}... for {month} with {len(records)} records")
+    except Exception as e:
+        print(f"  ✗ Error saving snapshot for {month}: {e}")
+        return None, []
+
+    detector.remember_baseline(month, snapshot_id, records)
+    detector.case_index.record(month, records, datetime.now(timezone.utc).isoformat())
+
+    # Cross-month case index: every case on the page is listed under this month now
+    try:
+        yield 'update_case_index', (snapshot_id,)
+    except Exception as e:
+        print(f"  ✗ Error updating case index for {month}: {e}")
+
+    # Waiting-day quantile sketches for percentile queries
+    try:
+        sketches = build_sketches(records)
+        yield 'save_waiting_sketches', (month, snapshot_id, sketches)
+    except Exception as e:
+        print(f"  ✗ Error saving waiting-day sketches for {month}: {e}")
+
+    # Note search index: only cases that are new or whose text/status changed
+    try:
+        yield 'save_case_notes', (note_rows(records, changes, month),)
+    except Exception as e:
+        print(f"  ✗ Error updating note search index for {month}: {e}")
+
+    if changes is None:
+        return snapshot_id, []
+
+    try:
+        # Update snapshot_id_new in changes
+        for change in changes:
+            change['snapshot_id_new'] = snapshot_id
+
+        if changes:
+            yield 'save_changes', (changes,)
+            print(f"  ✓ Detected {len(changes)} changes in {month}")
+
+            events = build_case_events(changes, records, month, snapshot_id)
+            yield 'save_case_events', (events,)
+        else:
+            print(f"  ✓ No changes detected in {month}")
+    except Exception as e:
+        print(f"  ✗ Error saving changes for {month}: {e}")
+        return snapshot_id, []
+
+    return snapshot_id, changes
+
+
+def save_month(db_client, detector, month, records, changes):
+    """
+    Save the snapshot of one month and its derived data
+
+    Returns:
+        Tuple of (snapshot_id or None, list of saved changes)
+    """
+    steps = _save_month_steps(detector, month, records, changes)
+    try:
+        name, args = next(steps)
+        while True:
             try:
-                changes = detector.detect_changes(records, month)
-                
-                # Update snapshot_id_new in changes
-                for change in changes:
-                    change['snapshot_id_new'] = snapshot_id
-                
-                if changes:
-                    db_client.save_changes(changes)
-                    print(f"  ✓ Detected {len(changes)} changes")
-                    all_changes.extend(changes)
-                else:
-                    print(f"  ✓ No changes detected")
+                result = getattr(db_client, name)(*args)
             except Exception as e:
-                print(f"  ✗ Error detecting changes: {e}")
-    
-    # Summary
+                name, args = steps.throw(e)
+            else:
+                name, args = steps.send(result)
+    except StopIteration as done:
+        return done.value
+
+
+async def save_month_async(db_client, detector, month, records, changes):
+    """save_month() for an AsyncSupabaseClient"""
+    steps = _save_month_steps(detector, month, records, changes)
+    try:
+        name, args = next(steps)
+        while True:
+            try:
+                result = await getattr(db_client, name)(*args)
+            except Exception as e:
+                name, args = steps.throw(e)
+            else:
+                name, args = steps.send(result)
+    except StopIteration as done:
+        return done.value
+
+
+async def save_months_async(detector, detected):
+    """
+    Save several months at once over one pipelined async client
+
+    All months share the client's in-flight limit, so batches from every
+    month keep the connection busy instead of waiting on each round trip.
+
+    Args:
+        detector: ChangeDetector to hand the new baselines to
+        detected: List of (month, records, changes) tuples
+
+    Returns:
+        List of (month, snapshot_id or None, changes) tuples
+    """
+    import asyncio
+    from async_supabase_client import AsyncSupabaseClient
+
+    async with AsyncSupabaseClient() as db_client:
+        results = await asyncio.gather(*(
+            save_month_async(db_client, detector, month, records, changes)
+            for month, records, changes in detected
+        ))
+    return [(month, snapshot_id, changes) for (month, _, _), (snapshot_id, changes) in zip(detected, results)]
+
+
+def refresh_derived_data(db_client, saved_months):
+    """Refresh rollups and the clearance model after new snapshots were saved"""
+    if not saved_months:
+        return
+
+    # Refresh dashboard rollups for the months that got a new snapshot
+    try:
+        rows = db_client.refresh_monthly_rollup(saved_months)
+        print(f"\n✓ Refreshed monthly rollup ({rows} rows for {len(saved_months)} months)")
+    except Exception as e:
+        print(f"\n✗ Error refreshing monthly rollup: {e}")
+
+    # Refit the clearance-time lookup table on the new data
+    try:
+        from clearance_model import fit_from_db
+        predictor = fit_from_db(db_client)
+        predictor.save()
+        print(f"✓ Refreshed clearance model ({len(predictor.keys)} strata)")
+    except Exception as e:
+        print(f"✗ Error refreshing clearance model: {e}")
+
+
+def append_feed(args, changes):
+    """Append saved changes to the offline change feed file, if one is configured"""
+    if not args.feed_file or not changes:
+        return
+    from change_feed import FileChangeFeed
+    try:
+        seq = FileChangeFeed(args.feed_file).append(changes)
+        print(f"  ✓ Appended {len(changes)} changes to {args.feed_file} (seq {seq})")
+    except Exception as e:
+        print(f"  ✗ Error appending to change feed {args.feed_file}: {e}")
+
+
+def print_summary(months_to_process, all_changes):
     print("\n" + "="*50)
     print("Summary:")
     print(f"  Months processed: {len(months_to_process)}")
     print(f"  Total changes detected: {len(all_changes)}")
-    
+
     if all_changes:
         change_types = {}
         for change in all_changes:
             change_type = change['change_type']
             change_types[change_type] = change_types.get(change_type, 0) + 1
-        
+
         print("\n  Change breakdown:")
         for change_type, count in sorted(change_types.items()):
             print(f"    {change_type}: {count}")
 
 
+def run_cycle(scraper, db_client, detector, args, budget):
+    """
+    One full refresh: pick months, scrape, process and refresh derived data
+
+    Returns:
+        Dictionary with 'months', 'records' and 'changes' counts
+    """
+    month_links = select_month_links(scraper, db_client, args, budget)
+    if month_links is None:
+        raise LookupError(f"Invalid month {args.month}")
+    if not args.dry_run:
+        ensure_partitions(db_client, month_links)
+
+    months_to_process = scrape_months(scraper, month_links, budget)
+    if detector and not args.dry_run:
+        # Every page is known before the first diff, so cases that moved
+        # between two of them are resolved whichever month comes first
+        detector.case_index.begin_run(months_to_process)
+
+    # Process each month
+    all_changes = []
+    saved_months = []
+
+    results = []
+    detected = []
+
+    for month, records in months_to_process:
+        if not records:
+            print(f"  No records found for {month}, skipping...")
+            continue
+
+        print(f"\nProcessing {month}: {len(records)} records")
+        if args.dry_run:
+            print("  [DRY RUN] Would save snapshot and detect changes")
+            continue
+
+        changes = detect_month(detector, month, records, args)
+        if args.async_writes:
+            detected.append((month, records, changes))
+        else:
+            snapshot_id, changes = save_month(db_client, detector, month, records, changes)
+            results.append((month, snapshot_id, changes))
+
+    if detected:
+        import asyncio
+        print(f"\nSaving {len(detected)} months with pipelined writes...")
+        results.extend(asyncio.run(save_months_async(detector, detected)))
+
+    for month, snapshot_id, changes in results:
+        if snapshot_id:
+            saved_months.append(month)
+        all_changes.extend(changes)
+
+    append_feed(args, all_changes)
+    refresh_derived_data(db_client, saved_months)
+    print_summary(months_to_process, all_changes)
+
+    return {
+        'months': len(saved_months),
+        'records': sum(len(records) for _, records in months_to_process),
+        'changes': len(all_changes),
+    }
+
+
+def process_job(scraper, db_client, detector, queue, job, worker_id, args):
+    """
+    Scrape, detect and save one leased month
+
+    Returns:
+        Tuple of (snapshot_id or None, records, saved changes)
+
+    Raises:
+        LeaseLost: The lease expired before the snapshot was written
+        RuntimeError: The snapshot could not be saved
+    """
+    from month_queue import LeaseKeeper, LeaseLost
+
+    month = job['month']
+    with LeaseKeeper(queue, job, worker_id) as lease:
+        records = scraper.parse_monthly_page(job['url'])
+        for record in records:
+            record['month'] = month
+        if not records:
+            print(f"  No records found for {month}, skipping...")
+            return None, records, []
+
+        print(f"  {len(records)} records")
+        # Other months belong to other jobs: moves out of this month are
+        # resolved from the case index as saved so far
+        detector.case_index.begin_run([(month, records)])
+        changes = detect_month(detector, month, records, args)
+
+        # Never write a snapshot for a month another worker has taken over
+        if not lease.renew():
+            raise LeaseLost(f"Lease on {month} expired before saving")
+        snapshot_id, changes = save_month(db_client, detector, month, records, changes)
+        if snapshot_id is None:
+            raise RuntimeError(f"Snapshot for {month} was not saved")
+    return snapshot_id, records, changes
+
+
+def run_worker(scraper, db_client, detector, args, budget):
+    """
+    Worker mode: enqueue the selected months, then process leased jobs until none are left
+
+    Every worker of a run enqueues the same months (duplicates are ignored),
+    so workers can be started in any order and on any host.
+
+    Returns:
+        Dictionary with 'months', 'records' and 'changes' counts
+    """
+    from month_queue import SqliteMonthQueue, SupabaseMonthQueue, default_run_id, default_worker_id
+
+    options = {'lease_seconds': args.lease, 'max_attempts': args.max_attempts}
+    if args.queue:
+        queue = SqliteMonthQueue(args.queue, **options)
+    else:
+        queue = SupabaseMonthQueue(db_client, **options)
+    run_id = args.run_id or default_run_id()
+    worker_id = default_worker_id()
+
+    month_links = select_month_links(scraper, db_client, args, budget)
+    if month_links is None:
+        raise LookupError(f"Invalid month {args.month}")
+    ensure_partitions(db_client, month_links)
+    added = queue.enqueue(run_id, month_links)
+    print(f"Run {run_id}: {added} of {len(month_links)} months added to the queue, working as {worker_id}")
+
+    started = time.monotonic()
+    months_processed = []
+    all_changes = []
+    saved_months = []
+
+    while True:
+        if budget and 'seconds' in budget and time.monotonic() - started >= budget['seconds']:
+            print(f"Time budget of {budget['seconds']:.0f}s used up, leaving the rest to other workers")
+            break
+        job = queue.claim(run_id, worker_id)
+        if job is None:
+            break
+
+        month = job['month']
+        print(f"\nProcessing {month} (attempt {job['attempts']}/{job['max_attempts']})")
+        try:
+            snapshot_id, records, changes = process_job(scraper, db_client, detector, queue, job, worker_id, args)
+        except Exception as e:
+            status = queue.fail(job, worker_id, str(e))
+            print(f"  ✗ {month} failed: {e} ({status or 'lease lost'})")
+            continue
+
+        if not queue.complete(job, worker_id, snapshot_id, len(records), len(changes)):
+            print(f"  ✗ Lease on {month} was lost before it was marked done")
+        append_feed(args, changes)
+        months_processed.append((month, records))
+        all_changes.extend(changes)
+        if snapshot_id:
+            saved_months.append(month)
+
+    refresh_derived_data(db_client, saved_months)
+    print_summary(months_processed, all_changes)
+
+    counts = queue.counts(run_id)
+    print("\n  Queue: " + ", ".join(f"{status} {count}" for status, count in counts.items()))
+
+    return {
+        'months': len(saved_months),
+        'records': sum(len(records) for _, records in months_processed),
+        'changes': len(all_changes),
+    }
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if args.worker and (args.dry_run or args.daemon or args.async_writes):
+        parser.error('--worker cannot be combined with --dry-run, --daemon or --async-writes')
+    if args.profile is not None and (args.daemon or args.async_writes):
+        # Stages are measured on the main thread; the daemon never ends and
+        # --async-writes saves on an event loop
+        parser.error('--profile cannot be combined with --daemon or --async-writes')
+
+    budget = None
+    if args.budget:
+        try:
+            budget = parse_budget(args.budget)
+        except ValueError as e:
+            parser.error(str(e))
+
+    # Initialize clients; a dry run only needs the database to plan adaptive runs
+    db_client = None
+    detector = None
+    if not args.dry_run or args.adaptive or budget:
+        try:
+            db_client = SupabaseClient()
+            print("✓ Connected to Supabase")
+        except Exception as e:
+            print(f"✗ Error connecting to Supabase: {e}")
+            print("Make sure SUPABASE_URL and SUPABASE_SECRET_KEY are set in .env file")
+            sys.exit(1)
+
+        detector_class = ChangeDetector
+        if args.vectorized:
+            from vectorized_detector import VectorizedChangeDetector
+            detector_class = VectorizedChangeDetector
+        # In daemon mode baselines stay in memory between cycles
+        detector = detector_class(db_client, cache_baselines=args.daemon)
+
+    scraper = CheckeeScraper()
+
+    profiler = None
+    if args.profile is not None:
+        from profiling import StageProfiler, instrument_pipeline
+        profiler = StageProfiler(args.profile or None, sample_interval=args.profile_sample_ms / 1000)
+        instrument_pipeline(profiler, scraper, db_client, detector)
+        profiler.start()
+
+    if not args.daemon:
+        try:
+            if args.worker:
+                run_worker(scraper, db_client, detector, args, budget)
+            else:
+                run_cycle(scraper, db_client, detector, args, budget)
+        except LookupError:
+            sys.exit(1)
+        finally:
+            if profiler:
+                profiler.stop()
+                profiler.write()
+                profiler.print_summary()
+        return
+
+    from daemon import PipelineMetrics, run_daemon, start_metrics_server
+
+    metrics = PipelineMetrics()
+
+    def cycle():
+        result = run_cycle(scraper, db_client, detector, args, budget)
+        if detector:
+            metrics.set('baselines_cached', detector.cached_baselines)
+        return result
+
+    server = None
+    if args.metrics_port:
+        server = start_metrics_server(
+            metrics,
+            host=args.metrics_host,
+            port=args.metrics_port,
+            max_cycle_age=3 * args.interval
+        )
+        print(f"✓ Metrics at http://{args.metrics_host}:{args.metrics_port}/metrics (health: /health)")
+
+    print(f"Daemon mode: refreshing every {args.interval}s (Ctrl+C to stop)")
+    try:
+        run_daemon(cycle, args.interval, metrics)
+    finally:
+        if server:
+            server.shutdown()
+
+
 if __name__ == '__main__':
     main()
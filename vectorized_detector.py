@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Vectorized change detection
+Same output as ChangeDetector, computed over column arrays: old and new
+typed records (normalize.py) are outer-joined on the case key once (pandas
+factorize) and every change type is a boolean mask, so large months diff in
+seconds instead of a Python loop per field
+"""
+
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from change_detector import CASE_CHANGE_LABELS, ChangeDetector
+from visa_record import VisaRecord, case_key
+
+# Columns compared between snapshots
+FRAME_FIELDS = ('status', 'complete_date', 'waiting_days', 'note')
+
+# Notes are truncated to this many characters in change values
+NOTE_LIMIT = 200
+
+
+def _case_keys(records: List[Dict]) -> np.ndarray:
+    """case_key() of every record: the typed casenum, computed only where it is missing"""
+    keys = _column(records, 'casenum', '')
+    for i in np.flatnonzero(~_truthy(keys)):
+        keys[i] = case_key(records[i])
+    return keys
+
+
+def _column(records: List[Dict], name: str, default=None) -> np.ndarray:
+    """One field of every record as an object array (values keep their Python types)"""
+    if records and isinstance(records[0], VisaRecord):
+        # Slot reads skip VisaRecord.get's field check
+        values = [getattr(r, name, default) for r in records]
+    else:
+        values = [r.get(name, default) for r in records]
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def _columns(records: List[Dict]) -> Dict[str, np.ndarray]:
+    """Compared fields, id and case key of every record that has a case key"""
+    casenums = _case_keys(records)
+    keep = casenums != ''
+    columns = {name: _column(records, name)[keep] for name in FRAME_FIELDS}
+    columns['id'] = _column(records, 'id', 'Unknown')[keep]
+    columns['casenum'] = casenums[keep]
+    return columns
+
+
+def _page_order(codes: np.ndarray) -> np.ndarray:
+    """Distinct codes in order of their first occurrence"""
+    unique, first = np.unique(codes, return_index=True)
+    return unique[np.argsort(first, kind='stable')]
+
+
+def _last_index(codes: np.ndarray, size: int) -> np.ndarray:
+    """Index of the last occurrence of each code in 0..size-1 (-1 if absent)"""
+    last = np.full(size, -1, dtype=np.int64)
+    reversed_codes = codes[::-1]
+    unique, first_in_reversed = np.unique(reversed_codes, return_index=True)
+    last[unique] = len(codes) - 1 - first_in_reversed
+    return last
+
+
+def _truthy(values: np.ndarray) -> np.ndarray:
+    return values.astype(bool)
+
+
+def _text(values: np.ndarray) -> np.ndarray:
+    """str(value) if value else '' for every element, as an object array"""
+    result = np.full(len(values), '', dtype=object)
+    truthy = _truthy(values)
+    result[truthy] = [str(v) for v in values[truthy]]
+    return result
+
+
+def _days(values: np.ndarray) -> np.ndarray:
+    """Typed waiting_days (int or None) as int64, None counting as 0"""
+    days = values.copy()
+    days[pd.isna(values)] = 0
+    return days.astype(np.int64)
+
+
+def _null_dates(values: np.ndarray) -> np.ndarray:
+    """Missing complete dates (typed records hold None, never '0000-00-00')"""
+    return pd.isna(values)
+
+
+def _not_equal(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Elementwise a != b with Python semantics (None == None)"""
+    return np.not_equal(a, b).astype(bool)
+
+
+class VectorizedChangeDetector(ChangeDetector):
+    """ChangeDetector whose diff runs over column arrays (needs pandas)"""
+
+    def diff_records(
+        self,
+        old_records: Optional[List[Dict]],
+        new_records: List[Dict],
+        snapshot_id_old: Optional[str],
+        removed_keys: Optional[Set[str]] = None
+    ) -> List[Dict]:
+        """
+        Diff two versions of a month's records (see ChangeDetector.diff_records)
+
+        Args:
+            old_records: Records of the previous snapshot (None if there is none)
+            new_records: Newly scraped records
+            snapshot_id_old: ID of the previous snapshot
+            removed_keys: Keys of cases currently marked removed in this month
+
+        Returns:
+            List of change dictionaries, equal to ChangeDetector's and in the same order
+        """
+        new = _columns(new_records)
+
+        if old_records is None:
+            # First scrape of the month: every keyed record is new, duplicates included
+            parts = [self._case_changes(new['casenum'], new['id'], 'new_record', -1)]
+            return self._to_changes(parts, None)
+
+        old = _columns(old_records)
+
+        # Outer join on the case key through integer codes: one hashing pass
+        # over both sides, then everything else is array indexing
+        codes, uniques = pd.factorize(np.concatenate([new['casenum'], old['casenum']]))
+        new_codes = codes[:len(new['casenum'])]
+        old_codes = codes[len(new['casenum']):]
+        new_last = _last_index(new_codes, len(uniques))
+        old_last = _last_index(old_codes, len(uniques))
+
+        # Same as building a dict per key: position of the first
+        # occurrence, values of the last one
+        page_order = _page_order(new_codes)
+        new_rows = new_last[page_order]
+        old_rows = old_last[page_order]
+        in_old = old_rows >= 0
+
+        added = new_rows[~in_old]
+        added_keys = new['casenum'][added]
+        reappeared = np.isin(added_keys, list(removed_keys or ()))
+        change_types = np.where(reappeared, 'reappeared', 'new_record').astype(object)
+        parts = [self._case_changes(added_keys, new['id'][added], change_types, -1)]
+
+        new_common = new_rows[in_old]
+        old_common = old_rows[in_old]
+        common = {}
+        for name in FRAME_FIELDS:
+            common[f'{name}_new'] = new[name][new_common]
+            common[f'{name}_old'] = old[name][old_common]
+        parts.extend(self._field_changes(new['casenum'][new_common], common))
+
+        # Old keys missing from the new page, after every case still on it
+        old_order = _page_order(old_codes)
+        gone = old_last[old_order[new_last[old_order] < 0]]
+        positions = len(new_common) + np.arange(len(gone))
+        parts.append(self._case_changes(old['casenum'][gone], old['id'][gone], 'removed', positions))
+        return self._to_changes(parts, snapshot_id_old)
+
+    def _case_changes(self, casenums: np.ndarray, ids: np.ndarray, change_types, positions) -> Dict:
+        """Whole-case changes (new_record, reappeared or removed) as one part"""
+        types = np.broadcast_to(np.asarray(change_types, dtype=object), len(casenums))
+        values = np.array(
+            [f"{CASE_CHANGE_LABELS[t]}: {user_id}" for t, user_id in zip(types, ids)],
+            dtype=object
+        )
+        removed = types == 'removed'
+        empty = np.full(len(casenums), None, dtype=object)
+        return {
+            'casenum': casenums,
+            'change_type': types,
+            'field_name': None,
+            'old_value': np.where(removed, values, empty),
+            'new_value': np.where(removed, empty, values),
+            'position': np.broadcast_to(np.asarray(positions, dtype=np.int64), len(casenums)),
+            'rank': 0,
+        }
+
+    def _field_changes(self, casenums: np.ndarray, common: Dict[str, np.ndarray]) -> List[Dict]:
+        """Field-level changes of the cases present in both snapshots, one part per rule"""
+        parts = []
+        position = np.arange(len(casenums))
+
+        def add(mask, rank, change_type, field_name, old_values, new_values):
+            if not mask.any():
+                return
+            parts.append({
+                'casenum': casenums[mask],
+                'change_type': change_type,
+                'field_name': field_name,
+                'old_value': old_values(mask),
+                'new_value': new_values(mask),
+                'position': position[mask],
+                'rank': rank,
+            })
+
+        # status: any difference, compared as the raw values
+        old_status = common['status_old']
+        new_status = common['status_new']
+        add(
+            _not_equal(old_status, new_status), 1,
+            'status_change', 'status',
+            lambda m: _text(old_status[m]), lambda m: _text(new_status[m])
+        )
+
+        # complete_date: set for the first time, or changed between two dates
+        old_date = common['complete_date_old']
+        new_date = common['complete_date_new']
+        old_null = _null_dates(old_date)
+        new_null = _null_dates(new_date)
+        add(
+            ~new_null & (old_null | _not_equal(old_date, new_date)), 2,
+            'date_update', 'complete_date',
+            lambda m: np.array(['None' if null else str(v) for v, null in zip(old_date[m], old_null[m])], dtype=object),
+            lambda m: np.array([str(v) for v in new_date[m]], dtype=object)
+        )
+
+        # waiting_days: only increases count
+        old_days = _days(common['waiting_days_old'])
+        new_days = _days(common['waiting_days_new'])
+        add(
+            new_days > old_days, 3,
+            'waiting_days_update', 'waiting_days',
+            lambda m: old_days[m].astype(str).astype(object), lambda m: new_days[m].astype(str).astype(object)
+        )
+
+        # note: added, replaced by a different one, or cleared
+        old_note = common['note_old']
+        new_note = common['note_new']
+        old_empty = ~_truthy(old_note)
+        new_empty = ~_truthy(new_note)
+        add(
+            old_empty & ~new_empty, 4,
+            'note_added', 'note',
+            lambda m: np.full(m.sum(), '', dtype=object),
+            lambda m: np.array([str(v)[:NOTE_LIMIT] for v in new_note[m]], dtype=object)
+        )
+        both = ~old_empty & ~new_empty
+        updated = both.copy()
+        if both.any():
+            updated[both] = [str(a) != str(b) for a, b in zip(old_note[both], new_note[both])]
+        add(
+            updated, 4,
+            'note_updated', 'note',
+            lambda m: np.array([str(v)[:NOTE_LIMIT] for v in old_note[m]], dtype=object),
+            lambda m: np.array([str(v)[:NOTE_LIMIT] for v in new_note[m]], dtype=object)
+        )
+        add(
+            ~old_empty & new_empty, 4,
+            'note_removed', 'note',
+            lambda m: np.array([str(v)[:NOTE_LIMIT] for v in old_note[m]], dtype=object),
+            lambda m: np.full(m.sum(), '', dtype=object)
+        )
+
+        return parts
+
+    def _to_changes(self, parts: List[Dict], snapshot_id_old: Optional[str]) -> List[Dict]:
+        """Order the change parts like ChangeDetector and turn them into dictionaries"""
+        parts = [part for part in parts if len(part['casenum'])]
+        if not parts:
+            return []
+
+        def column(name):
+            return np.concatenate([
+                np.broadcast_to(np.asarray(part[name], dtype=object), len(part['casenum']))
+                for part in parts
+            ])
+
+        position = np.concatenate([part['position'] for part in parts])
+        rank = np.concatenate([np.full(len(part['casenum']), part['rank']) for part in parts])
+        # New records first, then per case in page order, fields in rule order,
+        # then removed cases
+        order = np.lexsort((rank, position))
+
+        return [
+            {
+                'casenum': casenum,
+                'snapshot_id_old': snapshot_id_old,
+                'snapshot_id_new': None,  # Will be set after snapshot is created
+                'change_type': change_type,
+                'field_name': field_name,
+                'old_value': old_value,
+                'new_value': new_value,
+            }
+            for casenum, change_type, field_name, old_value, new_value in zip(
+                column('casenum')[order].tolist(),
+                column('change_type')[order].tolist(),
+                column('field_name')[order].tolist(),
+                column('old_value')[order].tolist(),
+                column('new_value')[order].tolist(),
+            )
+        ]
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Compact record representation
+A slotted replacement for the per-row dicts used by the scraper, the
+Supabase client and the change detector. Repeated categorical values
+(visa type, consulate, status, ...) are interned so each distinct string is
+stored once no matter how many rows share it.
+"""
+
+import hashlib
+import re
+import sys
+from datetime import date, datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+# Field order follows the export schema (record_writers.RECORD_FIELDS);
+# casenum is derived (the case key, see normalize.normalize_record) and not exported
+FIELDS = (
+    'month',
+    'id',
+    'visa_type',
+    'visa_entry',
+    'consulate',
+    'major',
+    'status',
+    'check_date',
+    'complete_date',
+    'waiting_days',
+    'details_link',
+    'has_notes',
+    'note',
+    'details',
+    'casenum',
+)
+
+# Low-cardinality string fields worth interning
+CATEGORICAL_FIELDS = frozenset({
+    'month',
+    'visa_type',
+    'visa_entry',
+    'consulate',
+    'major',
+    'status',
+    'check_date',
+    'complete_date',
+})
+
+_FIELD_SET = frozenset(FIELDS)
+
+
+class VisaRecord:
+    """
+    One visa application row
+
+    Behaves like the dict it replaces for reads and writes (record['status'],
+    record.get('note', ''), 'details' in record, record.items()), so existing
+    callers keep working. Fields that were never set are absent, exactly like
+    missing dict keys. Use to_dict() at API boundaries (JSON, database rows).
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            self[name] = value
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'VisaRecord':
+        """Build a record from a scraper-style dict, ignoring unknown keys"""
+        record = cls()
+        for name in FIELDS:
+            if name in data:
+                record[name] = data[name]
+        return record
+
+    @classmethod
+    def from_row(cls, row: Dict) -> 'VisaRecord':
+        """Build a record from a `records` table row (user_id maps back to id)"""
+        record = cls()
+        for name in FIELDS:
+            # The table's own `id` is the row UUID, not the checkee user id
+            if name != 'id' and name in row:
+                record[name] = row[name]
+        if 'user_id' in row:
+            record['id'] = row['user_id']
+        return record
+
+    def to_dict(self) -> Dict:
+        """Plain dict with the fields that are set, in schema order"""
+        return dict(self.items())
+
+    def __getitem__(self, name: str):
+        if name not in _FIELD_SET:
+            raise KeyError(name)
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __setitem__(self, name: str, value) -> None:
+        if name not in _FIELD_SET:
+            raise KeyError(f"Unknown record field: {name}")
+        if name in CATEGORICAL_FIELDS and type(value) is str:
+            value = sys.intern(value)
+        setattr(self, name, value)
+
+    def __contains__(self, name) -> bool:
+        return name in _FIELD_SET and hasattr(self, name)
+
+    def get(self, name: str, default=None):
+        if name not in _FIELD_SET:
+            return default
+        return getattr(self, name, default)
+
+    def keys(self) -> Iterator[str]:
+        return (name for name in FIELDS if hasattr(self, name))
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        return ((name, getattr(self, name)) for name in FIELDS if hasattr(self, name))
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, VisaRecord):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"VisaRecord({self.to_dict()!r})"
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state: Dict) -> None:
+        for name, value in state.items():
+            self[name] = value
+
+
+def as_record(data) -> Optional[VisaRecord]:
+    """Return data as a VisaRecord (records pass through, dicts are converted)"""
+    if data is None or isinstance(data, VisaRecord):
+        return data
+    return VisaRecord.from_dict(data)
+
+
+_CASENUM_RE = re.compile(r'casenum=(\d+)')
+
+# Synthetic case keys start with this; real casenums are all digits
+SYNTHETIC_KEY_PREFIX = 'x'
+
+
+def extract_casenum(details_link) -> str:
+    """Extract casenum from details_link URL ('' if there is none)"""
+    if not details_link:
+        return ''
+    match = _CASENUM_RE.search(details_link)
+    return match.group(1) if match else ''
+
+
+def _key_date(value) -> str:
+    """A check date as stored in the database (YYYY-MM-DD), '' when invalid"""
+    if isinstance(value, date):
+        return value.isoformat()
+    if not value:
+        return ''
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return ''
+
+
+def synthetic_key(user_id, check_date, consulate) -> str:
+    """Hash of the fields that identify a case without a casenum"""
+    raw = f"{user_id or ''}|{_key_date(check_date)}|{consulate or ''}"
+    return SYNTHETIC_KEY_PREFIX + hashlib.sha1(raw.encode('utf-8')).hexdigest()[:15]
+
+
+def case_key(record) -> str:
+    """
+    Stable identity of a case across snapshots
+
+    The casenum when the record links to a details page, otherwise a hash of
+    user id, check date and consulate, so rows without a link are diffed and
+    kept in history too. Scraped records and database rows (via
+    VisaRecord.from_row) of the same case get the same key.
+
+    Returns:
+        The key, or '' when the record has neither a casenum nor a user id
+    """
+    # Typed records and database rows carry it already
+    key = record.get('casenum')
+    if key:
+        return key
+    casenum = extract_casenum(record.get('details_link'))
+    if casenum:
+        return casenum
+    if not record.get('id'):
+        return ''
+    return synthetic_key(record.get('id'), record.get('check_date'), record.get('consulate'))
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Waiting-day quantile sketches
+Mergeable, serializable quantile sketches of waiting_days per
+(month, consulate, visa_type), built at snapshot ingest so percentiles over
+any month range can be answered without reading raw records
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Statuses whose waiting_days is a finished processing time; pending cases
+# are still counting up and would bias every percentile downwards
+COMPLETED_STATUSES = {'Clear', 'Reject'}
+
+
+class WaitingDaysSketch:
+    """
+    Log-bucketed quantile sketch (DDSketch style)
+
+    Every quantile estimate is within `relative_accuracy` of the true value,
+    sketches of the same accuracy merge exactly by adding bucket counts, and
+    the state is a small dict that serializes to JSON.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        """
+        Args:
+            relative_accuracy: Maximum relative error of quantile estimates
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float, count: int = 1) -> None:
+        """Add a non-negative value (negative values are ignored)"""
+        if value is None or value < 0 or count <= 0:
+            return
+        if value == 0:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: 'WaitingDaysSketch') -> 'WaitingDaysSketch':
+        """Merge another sketch into this one (in place) and return self"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the q-quantile
+
+        Args:
+            q: Quantile in [0, 1] (e.g. 0.9 for p90)
+
+        Returns:
+            Estimated value, or None for an empty sketch
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                estimate = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable state"""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'count': self.count,
+            'zero_count': self.zero_count,
+            'min': self.min,
+            'max': self.max,
+            # JSON object keys must be strings
+            'bins': {str(index): count for index, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'WaitingDaysSketch':
+        """Rebuild a sketch from to_dict() output"""
+        sketch = cls(data.get('relative_accuracy', 0.01))
+        sketch.bins = {int(index): count for index, count in data.get('bins', {}).items()}
+        sketch.zero_count = data.get('zero_count', 0)
+        sketch.count = data.get('count', 0)
+        sketch.min = data.get('min')
+        sketch.max = data.get('max')
+        return sketch
+
+
+def build_sketches(records: Iterable[Dict]) -> Dict[Tuple[str, str], WaitingDaysSketch]:
+    """
+    Build one sketch per (consulate, visa_type) from a snapshot's records
+
+    Only completed cases (Clear/Reject) with a numeric waiting_days are
+    included.
+
+    Args:
+        records: Scraped records of one month
+
+    Returns:
+        Dictionary mapping (consulate, visa_type) to its sketch
+    """
+    sketches: Dict[Tuple[str, str], WaitingDaysSketch] = {}
+    for record in records:
+        if record.get('status') not in COMPLETED_STATUSES:
+            continue
+        try:
+            days = int(record.get('waiting_days'))
+        except (ValueError, TypeError):
+            continue
+        key = (record.get('consulate') or 'Unknown', record.get('visa_type') or 'Unknown')
+        if key not in sketches:
+            sketches[key] = WaitingDaysSketch()
+        sketches[key].add(days)
+    return sketches
+
+
+def merge_rows(rows: Iterable[Dict]) -> WaitingDaysSketch:
+    """Merge sketches stored in waiting_sketches rows into a single sketch"""
+    merged = WaitingDaysSketch()
+    for row in rows:
+        merged.merge(WaitingDaysSketch.from_dict(row['sketch']))
+    return merged
+
+
+def get_wait_percentiles(
+    db,
+    start_month: str,
+    end_month: str,
+    consulate: Optional[str] = None,
+    visa_type: Optional[str] = None,
+    percentiles: List[float] = (50, 75, 90, 99)
+) -> Dict:
+    """
+    Waiting-day percentiles over a month range, from stored sketches only
+
+    Sketches are kept per month, so YYYY-MM-DD dates (or date objects) are
+    widened to the months that contain them.
+
+    Args:
+        db: SupabaseClient
+        start_month: First month of the range (YYYY-MM or a date, inclusive)
+        end_month: Last month of the range (YYYY-MM or a date, inclusive)
+        consulate: Optional consulate filter (default: all consulates)
+        visa_type: Optional visa type filter (default: all visa types)
+        percentiles: Percentiles to return (0-100)
+
+    Returns:
+        Dictionary with 'count', 'min', 'max' and 'p<N>' for each percentile
+    """
+    start_month = str(start_month)[:7]
+    end_month = str(end_month)[:7]
+    rows = db.get_waiting_sketches(start_month, end_month, consulate=consulate, visa_type=visa_type)
+    sketch = merge_rows(rows)
+
+    result = {'count': sketch.count, 'min': sketch.min, 'max': sketch.max}
+    for p in percentiles:
+        value = sketch.quantile(p / 100)
+        result[f'p{p:g}'] = round(value, 1) if value is not None else None
+    return result
@@ -1,49 +1,101 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { supabase } from '@/lib/supabase'
 
+// A cursor is spliced into the or() filter grammar, so only a timestamp as
+// PostgREST returns it and a UUID may get through
+const CURSOR_TIMESTAMP = /^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d{1,6})?(Z|[+-]\d{2}(:?\d{2})?)?$/
+const UUID = /^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$/i
+
 export async function GET(request: NextRequest) {
   try {
     const searchParams = request.nextUrl.searchParams
     const since = searchParams.get('since') // ISO date string
     const month = searchParams.get('month')
     const changeType = searchParams.get('change_type')
+    const cursor = searchParams.get('cursor') // next_cursor from the previous page
+    const after = searchParams.get('after') // change feed: seq of the last change already read
     const limit = parseInt(searchParams.get('limit') || '100')
 
+    if (after !== null) {
+      // Change feed: oldest first from a seq, so consumers read every change once
+      const afterSeq = parseInt(after)
+      if (isNaN(afterSeq) || afterSeq < 0) {
+        return NextResponse.json({ error: 'Invalid after' }, { status: 400 })
+      }
+
+      let feedQuery = supabase
+        .from('changes')
+        .select('*')
+        .gt('seq', afterSeq)
+        .order('seq', { ascending: true })
+        .limit(limit)
+
+      if (month) {
+        feedQuery = feedQuery.eq('month', month)
+      }
+
+      if (changeType) {
+        feedQuery = feedQuery.eq('change_type', changeType)
+      }
+
+      const { data: feed, error: feedError } = await feedQuery
+
+      if (feedError) {
+        return NextResponse.json({ error: feedError.message }, { status: 500 })
+      }
+
+      const rows = feed || []
+      const nextAfter = rows.length ? rows[rows.length - 1].seq : afterSeq
+
+      return NextResponse.json({ changes: rows, next_after: nextAfter })
+    }
+
+    // Filtering, ordering and keyset pagination all happen in SQL
     let changesQuery = supabase
       .from('changes')
       .select('*')
       .order('detected_at', { ascending: false })
+      .order('id', { ascending: false })
       .limit(limit)
 
     if (since) {
       changesQuery = changesQuery.gte('detected_at', since)
     }
 
+    if (month) {
+      changesQuery = changesQuery.eq('month', month)
+    }
+
     if (changeType) {
       changesQuery = changesQuery.eq('change_type', changeType)
     }
 
+    if (cursor) {
+      const separator = cursor.lastIndexOf('|')
+      if (separator <= 0) {
+        return NextResponse.json({ error: 'Invalid cursor' }, { status: 400 })
+      }
+      const detectedAt = cursor.slice(0, separator)
+      const changeId = cursor.slice(separator + 1)
+      if (!CURSOR_TIMESTAMP.test(detectedAt) || !UUID.test(changeId)) {
+        return NextResponse.json({ error: 'Invalid cursor' }, { status: 400 })
+      }
+      changesQuery = changesQuery.or(
+        `detected_at.lt."${detectedAt}",and(detected_at.eq."${detectedAt}",id.lt.${changeId})`
+      )
+    }
+
     const { data: changes, error } = await changesQuery
 
     if (error) {
       return NextResponse.json({ error: error.message }, { status: 500 })
     }
 
-    // Filter by month if specified (requires checking snapshot month)
-    let filteredChanges = changes || []
-    if (month) {
-      const { data: snapshots } = await supabase
-        .from('snapshots')
-        .select('id')
-        .eq('month', month)
-
-      const snapshotIds = new Set(snapshots?.map(s => s.id) || [])
-      filteredChanges = filteredChanges.filter(
-        c => snapshotIds.has(c.snapshot_id_new)
-      )
-    }
+    const rows = changes || []
+    const last = rows[rows.length - 1]
+    const nextCursor = rows.length === limit && last ? `${last.detected_at}|${last.id}` : null
 
-    return NextResponse.json({ changes: filteredChanges })
+    return NextResponse.json({ changes: rows, next_cursor: nextCursor })
   } catch (error: any) {
     return NextResponse.json({ error: error.message }, { status: 500 })
   }
@@ -13,7 +13,7 @@ export async function GET(request: NextRequest) {
     // Get latest snapshot for the month (or overall)
     let snapshotQuery = supabase
       .from('snapshots')
-      .select('id')
+      .select('id, month')
       .order('scrape_date', { ascending: false })
       .limit(1)
 
@@ -29,11 +29,12 @@ export async function GET(request: NextRequest) {
 
     const snapshotId = snapshots[0].id
 
-    // Get records for this snapshot
+    // Get records for this snapshot (month limits the scan to its partition)
     let recordsQuery = supabase
       .from('records')
       .select('*')
       .eq('snapshot_id', snapshotId)
+      .eq('month', snapshots[0].month)
       .limit(limit)
 
     if (consulate) {
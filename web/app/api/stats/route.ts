@@ -26,11 +26,12 @@ export async function GET(request: NextRequest) {
     const snapshot = snapshots[0]
     const snapshotId = snapshot.id
 
-    // Get all records for this snapshot
+    // Get all records for this snapshot (month limits the scan to its partition)
     const { data: records, error: recordsError } = await supabase
       .from('records')
       .select('*')
       .eq('snapshot_id', snapshotId)
+      .eq('month', snapshot.month)
 
     if (recordsError) {
       return NextResponse.json({ error: recordsError.message }, { status: 500 })
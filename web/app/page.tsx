@@ -3,77 +3,74 @@ import { Suspense } from 'react'
 import StatsCard from '@/components/StatsCard'
 import RecentChanges from '@/components/RecentChanges'
 import StatusDistribution from '@/components/charts/StatusDistribution'
-import { supabase } from '@/lib/supabase'
+import { fetchAllRows, supabase } from '@/lib/supabase'
 
 export const dynamic = 'force-dynamic'
 
 async function getStats() {
   try {
-    // First, get the latest snapshot for each month
-    // We'll use a raw SQL query since Supabase JS doesn't support DISTINCT ON directly
-    const { data: latestSnapshots, error: snapshotsError } = await supabase
-      .from('snapshots')
-      .select('id, month, scrape_date, total_records')
-      .order('scrape_date', { ascending: false })
-
-    if (snapshotsError || !latestSnapshots) {
-      console.error('Snapshots error:', snapshotsError)
+    // Precomputed by update_and_detect.py from the latest snapshot of each month:
+    // month totals (ALL/ALL), per-consulate rows (visa_type = ALL) and
+    // per-visa-type rows (consulate = ALL). That is more rows than one
+    // response holds once many months are covered, so read every page.
+    const { data: rollup, error: rollupError } = await fetchAllRows(() =>
+      supabase
+        .from('monthly_rollup')
+        .select('month, consulate, visa_type, snapshot_id, snapshot_date, total, pending, clear, reject, waiting_days_count, waiting_days_sum, min_waiting_days, max_waiting_days')
+        .or('consulate.eq.ALL,visa_type.eq.ALL')
+        .order('month')
+        .order('consulate')
+        .order('visa_type')
+    )
+
+    if (rollupError || !rollup) {
+      console.error('Rollup error:', rollupError)
       return null
     }
 
-    // Group by month and keep only the latest snapshot for each month
-    const latestByMonth = new Map<string, typeof latestSnapshots[0]>()
-    for (const snapshot of latestSnapshots) {
-      if (!latestByMonth.has(snapshot.month)) {
-        latestByMonth.set(snapshot.month, snapshot)
-      }
-    }
-
-    const latestSnapshotIds = Array.from(latestByMonth.values()).map(s => s.id)
-    const months = Array.from(latestByMonth.keys()).sort()
+    const monthRows = rollup.filter(row => row.consulate === 'ALL' && row.visa_type === 'ALL')
 
-    if (latestSnapshotIds.length === 0) {
+    if (monthRows.length === 0) {
       return null
     }
 
-    // Get all records from only the latest snapshots for each month
-    const { data: records, error: recordsError } = await supabase
-      .from('records')
-      .select('*')
-      .in('snapshot_id', latestSnapshotIds)
-
-    if (recordsError) {
-      console.error('Records error:', recordsError)
-      return null
-    }
-
-    if (!records || records.length === 0) {
-      return null
-    }
-
-    // Get the most recent snapshot date for metadata
-    const mostRecentSnapshot = Array.from(latestByMonth.values())
-      .sort((a, b) => new Date(b.scrape_date).getTime() - new Date(a.scrape_date).getTime())[0]
+    const months = monthRows.map(row => row.month).sort()
+
+    // Most recent snapshot for metadata
+    const mostRecent = monthRows
+      .slice()
+      .sort((a, b) => new Date(b.snapshot_date).getTime() - new Date(a.snapshot_date).getTime())[0]
+
+    let total = 0
+    let waitingCount = 0
+    let waitingSum = 0
+    let minWaiting: number | null = null
+    let maxWaiting: number | null = null
+    const statusCounts: Record<string, number> = { Pending: 0, Clear: 0, Reject: 0 }
+
+    monthRows.forEach(row => {
+      total += row.total
+      statusCounts.Pending += row.pending
+      statusCounts.Clear += row.clear
+      statusCounts.Reject += row.reject
+      waitingCount += row.waiting_days_count
+      waitingSum += row.waiting_days_sum
+      if (row.min_waiting_days !== null && (minWaiting === null || row.min_waiting_days < minWaiting)) {
+        minWaiting = row.min_waiting_days
+      }
+      if (row.max_waiting_days !== null && (maxWaiting === null || row.max_waiting_days > maxWaiting)) {
+        maxWaiting = row.max_waiting_days
+      }
+    })
 
-    // Calculate statistics from records in latest snapshots only
-    const total = records.length
-    const statusCounts: Record<string, number> = {}
     const visaTypeCounts: Record<string, number> = {}
     const consulateCounts: Record<string, number> = {}
-    const waitingDays: number[] = []
-
-    records.forEach(record => {
-      const status = record.status || 'Unknown'
-      statusCounts[status] = (statusCounts[status] || 0) + 1
-
-      const visaType = record.visa_type || 'Unknown'
-      visaTypeCounts[visaType] = (visaTypeCounts[visaType] || 0) + 1
-
-      const consulate = record.consulate || 'Unknown'
-      consulateCounts[consulate] = (consulateCounts[consulate] || 0) + 1
 
-      if (record.waiting_days !== null && record.waiting_days !== undefined) {
-        waitingDays.push(record.waiting_days)
+    rollup.forEach(row => {
+      if (row.consulate === 'ALL' && row.visa_type !== 'ALL') {
+        visaTypeCounts[row.visa_type] = (visaTypeCounts[row.visa_type] || 0) + row.total
+      } else if (row.visa_type === 'ALL' && row.consulate !== 'ALL') {
+        consulateCounts[row.consulate] = (consulateCounts[row.consulate] || 0) + row.total
       }
     })
 
@@ -82,15 +79,13 @@ async function getStats() {
       status_counts: statusCounts,
       visa_type_counts: visaTypeCounts,
       consulate_counts: consulateCounts,
-      snapshot_id: mostRecentSnapshot?.id || null,
-      snapshot_date: mostRecentSnapshot?.scrape_date || null,
-      month: mostRecentSnapshot?.month || null,
+      snapshot_id: mostRecent?.snapshot_id || null,
+      snapshot_date: mostRecent?.snapshot_date || null,
+      month: mostRecent?.month || null,
       months_covered: months,
-      avg_waiting_days: waitingDays.length > 0
-        ? waitingDays.reduce((a, b) => a + b, 0) / waitingDays.length
-        : null,
-      min_waiting_days: waitingDays.length > 0 ? Math.min(...waitingDays) : null,
-      max_waiting_days: waitingDays.length > 0 ? Math.max(...waitingDays) : null,
+      avg_waiting_days: waitingCount > 0 ? waitingSum / waitingCount : null,
+      min_waiting_days: minWaiting,
+      max_waiting_days: maxWaiting,
     }
   } catch (error) {
     console.error('Error fetching stats:', error)
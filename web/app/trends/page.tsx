@@ -2,27 +2,25 @@ import Link from 'next/link'
 import StatusChart from '@/components/charts/StatusChart'
 import ProcessingTimeChart from '@/components/charts/ProcessingTimeChart'
 import VisaTypeFilter from '@/components/VisaTypeFilter'
-import { supabase } from '@/lib/supabase'
+import { fetchAllRows, supabase } from '@/lib/supabase'
 
 export const dynamic = 'force-dynamic'
 
 async function getAvailableVisaTypes() {
   try {
-    const { data: records } = await supabase
-      .from('records')
-      .select('visa_type')
-      .not('visa_type', 'is', null)
-
-    if (!records) return []
-
-    const visaTypes = new Set<string>()
-    records.forEach(record => {
-      if (record.visa_type) {
-        visaTypes.add(record.visa_type)
-      }
-    })
-
-    return Array.from(visaTypes).sort()
+    const { data: rows } = await fetchAllRows(() =>
+      supabase
+        .from('monthly_rollup')
+        .select('visa_type')
+        .eq('consulate', 'ALL')
+        .neq('visa_type', 'ALL')
+        .order('visa_type')
+        .order('month')
+    )
+
+    if (!rows) return []
+
+    return Array.from(new Set(rows.map(row => row.visa_type as string))).sort()
   } catch (error) {
     console.error('Error fetching visa types:', error)
     return []
@@ -31,56 +29,32 @@ async function getAvailableVisaTypes() {
 
 async function getMonthlyStats(visaTypeFilter: string | null = null) {
   try {
-    // Get the latest snapshot for each month
-    const { data: snapshots, error: snapshotError } = await supabase
-      .from('snapshots')
-      .select('id, month, scrape_date, total_records')
-      .order('scrape_date', { ascending: false })
-
-    if (snapshotError || !snapshots) {
+    // Precomputed per-month and per-consulate aggregates of the latest
+    // snapshot of each month (refreshed by update_and_detect.py)
+    const { data: rollup, error: rollupError } = await fetchAllRows(() =>
+      supabase
+        .from('monthly_rollup')
+        .select('month, consulate, total, pending, clear, reject, waiting_days_count, waiting_days_sum')
+        .eq('visa_type', visaTypeFilter || 'ALL')
+        .order('month')
+        .order('consulate')
+    )
+
+    if (rollupError || !rollup) {
       return null
     }
 
-    // Group by month and keep only the latest snapshot for each month
-    const latestByMonth = new Map<string, typeof snapshots[0]>()
-    for (const snapshot of snapshots) {
-      if (!latestByMonth.has(snapshot.month)) {
-        latestByMonth.set(snapshot.month, snapshot)
-      }
-    }
-
-    const latestSnapshotIds = Array.from(latestByMonth.values()).map(s => s.id)
-
-    if (latestSnapshotIds.length === 0) {
-      return null
-    }
-
-    // Get all records from only the latest snapshots for each month
-    let recordsQuery = supabase
-      .from('records')
-      .select('*')
-      .in('snapshot_id', latestSnapshotIds)
-
-    // Apply visa type filter if specified
-    if (visaTypeFilter) {
-      recordsQuery = recordsQuery.eq('visa_type', visaTypeFilter)
-    }
-
-    const { data: records, error: recordsError } = await recordsQuery
-
-    if (recordsError) {
-      return null
-    }
-
-    // Group records by month and calculate stats per month
-    const monthlyStats = new Map<string, {
-      month: string
-      pending: number
-      clear: number
-      reject: number
-      total: number
-      avgWaitingDays: number
-    }>()
+    const monthlyData = rollup
+      .filter(row => row.consulate === 'ALL')
+      .map(row => ({
+        month: row.month,
+        pending: row.pending,
+        clear: row.clear,
+        reject: row.reject,
+        total: row.total,
+        avgWaitingDays: row.waiting_days_count > 0 ? row.waiting_days_sum / row.waiting_days_count : 0,
+      }))
+      .sort((a, b) => a.month.localeCompare(b.month))
 
     const consulateStats = new Map<string, {
       consulate: string
@@ -89,66 +63,22 @@ async function getMonthlyStats(visaTypeFilter: string | null = null) {
       recordCount: number
     }>()
 
-    records?.forEach(record => {
-      const month = record.month || 'Unknown'
-      const status = record.status || 'Unknown'
-      const consulate = record.consulate || 'Unknown'
-
-      // Initialize month stats if not exists
-      if (!monthlyStats.has(month)) {
-        monthlyStats.set(month, {
-          month,
-          pending: 0,
-          clear: 0,
-          reject: 0,
-          total: 0,
-          avgWaitingDays: 0,
-        })
-      }
-
-      const monthStat = monthlyStats.get(month)!
-      monthStat.total++
-
-      if (status === 'Pending') monthStat.pending++
-      else if (status === 'Clear') monthStat.clear++
-      else if (status === 'Reject') monthStat.reject++
-
-      // Track waiting days for average calculation
-      if (record.waiting_days !== null && record.waiting_days !== undefined) {
-        monthStat.avgWaitingDays += record.waiting_days
-      }
-
-      // Consulate stats
-      if (!consulateStats.has(consulate)) {
-        consulateStats.set(consulate, {
-          consulate,
-          totalCount: 0,
-          totalWaitingDays: 0,
-          recordCount: 0,
-        })
-      }
-
-      const consulateStat = consulateStats.get(consulate)!
-      consulateStat.totalCount++
-      if (record.waiting_days !== null && record.waiting_days !== undefined) {
-        consulateStat.totalWaitingDays += record.waiting_days
-        consulateStat.recordCount++
-      }
-    })
-
-    // Calculate averages
-    monthlyStats.forEach(stat => {
-      const monthRecords = records?.filter(r => r.month === stat.month) || []
-      const waitingDays = monthRecords
-        .map(r => r.waiting_days)
-        .filter((d): d is number => d !== null && d !== undefined)
-      stat.avgWaitingDays = waitingDays.length > 0
-        ? waitingDays.reduce((a, b) => a + b, 0) / waitingDays.length
-        : 0
-    })
-
-    const monthlyData = Array.from(monthlyStats.values())
-      .sort((a, b) => a.month.localeCompare(b.month))
+    rollup
+      .filter(row => row.consulate !== 'ALL')
+      .forEach(row => {
+        if (!consulateStats.has(row.consulate)) {
+          consulateStats.set(row.consulate, {
+            consulate: row.consulate,
+            totalCount: 0,
+            totalWaitingDays: 0,
+            recordCount: 0,
+          })
+        }
+        const consulateStat = consulateStats.get(row.consulate)!
+        consulateStat.totalCount += row.total
+        consulateStat.totalWaitingDays += row.waiting_days_sum
+        consulateStat.recordCount += row.waiting_days_count
+      })
 
     const consulateData = Array.from(consulateStats.values())
       .map(c => ({
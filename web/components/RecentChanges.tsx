@@ -21,7 +21,11 @@ const changeTypeLabels: Record<string, string> = {
   date_update: 'Date Updated',
   note_added: 'Note Added',
   note_updated: 'Note Updated',
+  note_removed: 'Note Removed',
   new_record: 'New Record',
+  reappeared: 'Reappeared',
+  case_moved: 'Moved Month',
+  removed: 'Removed',
   waiting_days_update: 'Waiting Days Updated',
 }
 
@@ -9,6 +9,32 @@ if (!supabaseUrl || !supabaseAnonKey) {
 
 export const supabase = createClient(supabaseUrl, supabaseAnonKey)
 
+// PostgREST returns at most this many rows per response
+export const PAGE_SIZE = 1000
+
+type RangeQuery<T> = {
+  range: (from: number, to: number) => PromiseLike<{ data: T[] | null; error: unknown }>
+}
+
+// Read every row of a query, one range() page at a time until a short page
+// comes back. buildQuery must return a fresh query with a total order
+// (e.g. the primary key) so pages neither overlap nor skip rows.
+export async function fetchAllRows<T>(
+  buildQuery: () => RangeQuery<T>
+): Promise<{ data: T[] | null; error: unknown }> {
+  const rows: T[] = []
+  for (let offset = 0; ; offset += PAGE_SIZE) {
+    const { data, error } = await buildQuery().range(offset, offset + PAGE_SIZE - 1)
+    if (error || !data) {
+      return { data: null, error }
+    }
+    rows.push(...data)
+    if (data.length < PAGE_SIZE) {
+      return { data: rows, error: null }
+    }
+  }
+}
+
 // Type definitions for our tables
 export interface Snapshot {
   id: string
@@ -48,4 +74,5 @@ export interface Change {
   old_value: string | null
   new_value: string | null
   detected_at: string
+  seq: number
 }